@@ -0,0 +1,201 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import game_state_tree as gtree
+import text_ui
+import parallel
+from extended_debug import error_test as err
+
+KNOWN = {command_class.KEYWORD:command_class for command_class in (text_ui.Close, text_ui.Help, text_ui.Start, text_ui.Insert, text_ui.Compute)} #commands a script may use
+COMMENT = '#' #lines starting with this are skipped
+
+class Script():
+    '''One independent game read from the input: the lines from one start command up to the next, or one line of moves.
+            a line of moves is a string of column digits, such as 3342, played from an empty board with the player first'''
+    def __init__(self, source: str, lines: list):
+        self.source = source #name of the file the game came from, or - for stdin
+        self.lines = lines #(line number, text) of each line of the game
+        return
+    def __repr__(self) -> str:
+        return 'Script(' + repr(self.source) + ',' + repr(self.lines) + ')'
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Script):
+            raise TypeError('Script instances must only be compared to other Script instances, not ' + str(type(other)))
+        return self.source == other.source and self.lines == other.lines
+
+def scripts(file, source: str = '-'):
+    '''Yields the Scripts in an open text file, one game at a time.
+            a close command ends the file early; blank lines and comments are skipped'''
+    lines = []
+    line_i = 0
+    for text in file:
+        line_i += 1
+        text = text.strip()
+        if not text or text.startswith(COMMENT):
+            continue
+        keyword = text.split()[0].lower()
+        if text.isdigit():
+            if lines:
+                yield Script(source, lines)
+                lines = []
+            yield Script(source, [(line_i, text)])
+            continue
+        if keyword == text_ui.Close.KEYWORD:
+            break
+        if keyword == text_ui.Start.KEYWORD and lines:
+            yield Script(source, lines)
+            lines = []
+        lines.append((line_i, text))
+    if lines:
+        yield Script(source, lines)
+    return
+
+class ReplayMove(text_ui.Compute):
+    '''A computer move read from a line of moves rather than searched for.'''
+    def __init__(self, col_i: int):
+        text_ui.Compute.__init__(self)
+        self.col_i = col_i
+        return
+    def __repr__(self) -> str:
+        return 'ReplayMove(' + str(self.col_i) + ')'
+    def run(self, state: gtree.DecisionNode) -> gtree.DecisionNode:
+        if self.col_i < 0 or self.col_i >= state.board.geometry.width:
+            raise ValueError(text_ui.Insert.RANGE_ERROR)
+        if state.board.heights[self.col_i] >= state.board.geometry.height:
+            raise ValueError('that column is full')
+        return state.traverse(self.col_i)
+
+def play(script: Script, time_ms: int = None) -> dict:
+    '''Plays one Script without ever prompting, returning a record of the game ready to be written as JSON.
+            result is the final VictoryState.state, or -2 for a game left unfinished; error says what stopped a game early
+            time_ms is the thinking time of think commands that do not give one'''
+    record = {'source':script.source, 'line':script.lines[0][0], 'player_first':None, 'moves':'', 'result':None}
+    node = None
+    moves = []
+    for line_i, text in script.lines:
+        try:
+            if text.isdigit():
+                node = gtree.RootNode().traverse(True)
+                record['player_first'] = True
+                for move in text:
+                    node = text_ui.apply(node, text_ui.Insert(int(move)) if node.player_turn else ReplayMove(int(move)))
+                    moves.append(move)
+                continue
+            command = text_ui.parse(text, KNOWN)
+            if isinstance(command, text_ui.Help):
+                continue
+            if isinstance(command, text_ui.Compute) and len(text.split()) == 1 and time_ms is not None:
+                command = text_ui.Compute(time_ms)
+            following = text_ui.apply(node, command)
+            if isinstance(command, text_ui.Start):
+                record['player_first'] = command.player_first
+            else:
+                moves.append(str(next(col_i for col_i in range(following.board.geometry.width) if following.board.heights[col_i] != node.board.heights[col_i])))
+            node = following
+        except Exception as error:
+            record['error'] = 'line ' + str(line_i) + ': ' + str(error)
+            break
+    record['moves'] = ''.join(moves)
+    if node is not None:
+        record['result'] = node.state.state
+    return record
+
+def play_many(batch: list, time_ms: int = None) -> list:
+    '''Plays a list of Scripts in one worker task.'''
+    return [play(script, time_ms) for script in batch]
+
+def generate(paths: list, workers: int = 1, time_ms: int = None, batch: int = 16):
+    '''Yields the record of every game in a list of files, in input order, playing them across worker processes.
+            a path of - reads stdin; inputs of any length stream in constant memory, as parallel.stream_batches plays them'''
+    if not isinstance(paths, list):
+        raise TypeError('\'paths\' must be a list, not a ' + str(type(paths)))
+    if not isinstance(workers, int):
+        raise TypeError('\'workers\' must be an integer, not a ' + str(type(workers)))
+    if workers < 1:
+        raise ValueError('\'workers\' must be greater than 0, not ' + str(workers))
+    for record in parallel.stream_batches(play_many, batched(paths, batch), (time_ms,), workers):
+        yield record
+    return
+
+def batched(paths: list, batch: int):
+    '''Yields lists of up to batch Scripts read from each path in turn.'''
+    scripts_batch = []
+    for path in paths:
+        if path == '-':
+            file = sys.stdin
+        else:
+            file = open(path)
+        try:
+            for script in scripts(file, path):
+                scripts_batch.append(script)
+                if len(scripts_batch) >= batch:
+                    yield scripts_batch
+                    scripts_batch = []
+        finally:
+            if file is not sys.stdin:
+                file.close()
+    if scripts_batch:
+        yield scripts_batch
+    return
+
+def run(paths: list, out = None, workers: int = 1, time_ms: int = None) -> dict:
+    '''Plays every game in a list of files, writing one JSON record per line to out as each finishes.
+            returns a summary of the run'''
+    if out is None:
+        out = sys.stdout
+    start = time.perf_counter()
+    summary = {'games':0, 'errors':0, 'player_wins':0, 'computer_wins':0, 'draws':0, 'unfinished':0}
+    for record in generate(paths, workers, time_ms):
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+        summary['games'] += 1
+        if 'error' in record:
+            summary['errors'] += 1
+        elif record['result'] == 1:
+            summary['player_wins'] += 1
+        elif record['result'] == -1:
+            summary['computer_wins'] += 1
+        elif record['result'] == 0:
+            summary['draws'] += 1
+        else:
+            summary['unfinished'] += 1
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    x = list(scripts(io.StringIO('# corpus\n3342\n\nstart y\ndrop 3\nthink 20\nstart n\nthink 20\nclose\ndrop 1\n'), 'x'))
+    assert x == [Script('x', [(2, '3342')]), Script('x', [(4, 'start y'), (5, 'drop 3'), (6, 'think 20')]), Script('x', [(7, 'start n'), (8, 'think 20')])]
+    assert play(x[0]) == {'source':'x', 'line':2, 'player_first':True, 'moves':'3342', 'result':-2}
+    assert len(play(x[1])['moves']) == 2 and play(x[2])['player_first'] is False and 'error' not in play(x[2])
+    del x
+    assert play(Script('x', [(1, '0101010')]))['result'] == 1
+    assert play(Script('x', [(1, '01010101')]))['error'] == 'line 1: the game is over, use start to play again'
+    assert play(Script('x', [(1, '0000000')]))['error'] == 'line 1: that column is full'
+    assert play(Script('x', [(1, 'drop 3')]))['error'].startswith('line 1: no game yet')
+    assert play(Script('x', [(1, 'start')]))['error'].startswith('line 1: say who goes first')
+    assert play(Script('x', [(1, 'start y'), (2, 'drop 3 4')]))['error'].startswith('line 2: \'drop\' takes')
+    assert play(Script('x', [(1, 'start y'), (2, 'jump')]))['error'].startswith('line 2: ' + text_ui.UNKNOWN_ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.txt')
+        with open(path, 'w') as file:
+            file.write('3342\n0101010\n0000000\nstart y\ndrop 3\n01234\n')
+        x = list(generate([path], 1, None, 2))
+        assert len(x) == 5 and list(generate([path], 2, None, 2)) == x
+    del x
+    assert err.expect('list(generate([], 0))', ValueError, global_variables={'generate':generate})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Play scripted games of connect-4 without prompting, writing one JSON record per game.')
+    parser.add_argument('paths', nargs = '*', default = ['-'], help = 'files of commands or lines of moves, - for stdin (the default)')
+    parser.add_argument('--workers', type = int, default = os.cpu_count() or 1, help = 'processes playing games at once')
+    parser.add_argument('--time-ms', type = int, help = 'thinking time of think commands that do not give one')
+    args = parser.parse_args()
+    summary = run(args.paths, sys.stdout, args.workers, args.time_ms)
+    print(json.dumps(summary), file = sys.stderr)
+    if summary['errors']:
+        sys.exit(1)
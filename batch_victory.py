@@ -0,0 +1,92 @@
+import numpy as np
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+#bit index of each space of the standard geometry, laid out like the arrays: [row, column] with row 0 at the bottom
+BIT_INDEX = np.array([[col_i * gtree.Board.stride + row_i for col_i in range(gtree.Board.width)] for row_i in range(gtree.BoardColumn.height)], dtype = np.uint64)
+BIT_WEIGHT = np.left_shift(np.uint64(1), BIT_INDEX) #value of each space's bit in a mask
+
+def check_array(array: np.ndarray) -> np.ndarray:
+    '''Checks that an array holds a batch of boards, returning it as int8.'''
+    if not isinstance(array, np.ndarray):
+        raise TypeError('\'array\' must be a numpy array, not a ' + str(type(array)))
+    if array.ndim != 3 or array.shape[1:] != (gtree.BoardColumn.height, gtree.Board.width):
+        raise ValueError('\'array\' must have shape (N, ' + str(gtree.BoardColumn.height) + ', ' + str(gtree.Board.width) + '), not ' + str(array.shape))
+    #checked before the cast, which would wrap values such as 257 round to 1
+    if array.size and (array.min() < -1 or array.max() > 1):
+        raise ValueError('\'array\' must only hold -1, 0 and 1, as BoardPos states')
+    return array.astype(np.int8, copy = False)
+
+def boards_to_array(boards: list, out: np.ndarray = None) -> np.ndarray:
+    '''Packs boards into an (N, height, width) int8 array of BoardPos states, row 0 at the bottom.
+            out, if given, is filled instead of a new array'''
+    if not isinstance(boards, list):
+        raise TypeError('\'boards\' must be a list, not a ' + str(type(boards)))
+    for board in boards:
+        if not isinstance(board, gtree.Board):
+            raise TypeError('\'boards\' must only hold Boards, not a ' + str(type(board)))
+        if board.geometry is not gtree.Geometry.standard:
+            raise ValueError('\'boards\' must only hold boards of the standard geometry, not ' + repr(board.geometry))
+    if out is None:
+        out = np.empty((len(boards), gtree.BoardColumn.height, gtree.Board.width), dtype = np.int8)
+    elif not isinstance(out, np.ndarray) or out.shape != (len(boards), gtree.BoardColumn.height, gtree.Board.width) or out.dtype != np.int8:
+        raise ValueError('\'out\' must be an int8 array of shape (' + str(len(boards)) + ', ' + str(gtree.BoardColumn.height) + ', ' + str(gtree.Board.width) + ')')
+    player = np.fromiter((board.player_mask for board in boards), dtype = np.uint64, count = len(boards))
+    computer = np.fromiter((board.computer_mask for board in boards), dtype = np.uint64, count = len(boards))
+    player_bits = np.right_shift(player[:, None, None], BIT_INDEX[None]) & np.uint64(1)
+    computer_bits = np.right_shift(computer[:, None, None], BIT_INDEX[None]) & np.uint64(1)
+    np.subtract(player_bits.astype(np.int8), computer_bits.astype(np.int8), out = out)
+    return out
+
+def array_to_masks(array: np.ndarray) -> tuple:
+    '''Packs an (N, height, width) array of BoardPos states into (player masks, computer masks) uint64 arrays, laid out as in Board.'''
+    array = check_array(array)
+    flat = array.reshape(len(array), gtree.BoardColumn.height * gtree.Board.width)
+    weights = BIT_WEIGHT.reshape(-1)
+    return ((flat == 1).astype(np.uint64) @ weights, (flat == -1).astype(np.uint64) @ weights)
+
+def array_to_boards(array: np.ndarray) -> list:
+    '''Unpacks an (N, height, width) array of BoardPos states into a list of N Boards.'''
+    player, computer = array_to_masks(array)
+    return [gtree.Board.fromMasks(int(player[i]), int(computer[i])) for i in range(len(player))]
+
+def mask_wins(masks: np.ndarray) -> np.ndarray:
+    '''Finds which of a uint64 array of one side's masks hold a line of VictoryState.length tokens, using the same shifted ANDs as VictoryState.win.'''
+    result = np.zeros(len(masks), dtype = bool)
+    for direction in gtree.VictoryState.directions:
+        line = masks.copy()
+        i = 1
+        while i < gtree.VictoryState.length:
+            line &= np.right_shift(masks, np.uint64(direction * i))
+            i += 1
+        result |= line != 0
+    return result
+
+def victory_states(array: np.ndarray) -> np.ndarray:
+    '''Finds the VictoryState.state of every board in a batch at once, matching VictoryState(board) for each.'''
+    player, computer = array_to_masks(array)
+    return mask_victory_states(player, computer)
+
+def mask_victory_states(player: np.ndarray, computer: np.ndarray) -> np.ndarray:
+    '''Finds the VictoryState.state of every board in a batch given as uint64 arrays of player and computer masks.'''
+    result = np.full(len(player), -2, dtype = np.int8)
+    result[(player | computer) == np.uint64(gtree.Board.full_mask)] = 0
+    result[mask_wins(computer)] = -1
+    result[mask_wins(player)] = 1
+    return result
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    x = [gtree.Board(), gtree.Board([[1] * 4]), gtree.Board([[-1]] * 4), gtree.Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]]), gtree.Board([[-1,-1,-1,1],[-1,-1,1],[-1,1],[1]]), gtree.Board([[1,-1]])]
+    assert boards_to_array(x)[5, 1, 0] == -1
+    assert array_to_boards(boards_to_array(x)) == x
+    assert list(victory_states(boards_to_array(x))) == [gtree.VictoryState(board).state for board in x]
+    assert victory_states(np.zeros((0, gtree.BoardColumn.height, gtree.Board.width), dtype = np.int8)).shape == (0,)
+    del x
+    assert err.expect('boards_to_array([gtree.Board([], gtree.Geometry.get(8, 7, 5))])', ValueError, global_variables={'boards_to_array':boards_to_array,'gtree':gtree})
+    assert err.expect('victory_states(np.zeros((1, 2, 3)))', ValueError, global_variables={'victory_states':victory_states,'np':np})
+    assert err.expect('victory_states(np.full((1, gtree.BoardColumn.height, gtree.Board.width), 2))', ValueError, global_variables={'victory_states':victory_states,'np':np,'gtree':gtree})
+    assert err.expect('victory_states(np.full((1, gtree.BoardColumn.height, gtree.Board.width), 257))', ValueError, global_variables={'victory_states':victory_states,'np':np,'gtree':gtree})
+
+if __name__ == '__main__':
+    selfcheck()
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import subprocess
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+import game_state_tree as gtree
+import solver
+
+class Metric():
+    '''One measured value of a benchmark.
+            better is 'higher', 'lower', or 'equal' for counts that must not change at all'''
+    def __init__(self, value: float, unit: str, better: str):
+        if better not in ('higher', 'lower', 'equal'):
+            raise ValueError('\'better\' must be \'higher\', \'lower\' or \'equal\', not ' + repr(better))
+        self.value = value
+        self.unit = unit
+        self.better = better
+        return
+    def __repr__(self) -> str:
+        return 'Metric(' + repr(self.value) + ',' + repr(self.unit) + ',' + repr(self.better) + ')'
+    def to_json(self) -> dict:
+        return {'value':self.value, 'unit':self.unit, 'better':self.better}
+
+def positions(count: int, seed: int = 0) -> list:
+    '''Makes a fixed set of (board, last column, last row) from random games, the same for the same count and seed.'''
+    rng = random.Random(seed)
+    result = []
+    while len(result) < count:
+        board = gtree.Board()
+        state = gtree.VictoryState(board)
+        player_turn = rng.random() < 0.5
+        while state.state == -2 and len(result) < count:
+            col_i = rng.choice([i for i in range(gtree.Board.width) if board.heights[i] < gtree.BoardColumn.height])
+            board = gtree.Board._play(board.copy(), col_i, player_turn)
+            state = gtree.VictoryState._next(board, col_i, board.heights[col_i] - 1, state)
+            result.append((board, col_i, board.heights[col_i] - 1))
+            player_turn = not player_turn
+    return result
+
+def perft(node: gtree.DecisionNode, depth: int, counts: list, ply: int = 0):
+    '''Counts the nodes at each ply below a node, adding to counts, and drops the children again to save memory.'''
+    counts[ply] += 1
+    if ply < depth:
+        for child in node.dependents.values():
+            perft(child, depth, counts, ply + 1)
+        node.children.clear()
+    return
+
+def bench_perft(depth: int) -> dict:
+    '''Times perft from the RootNode, one more ply at a time.'''
+    metrics = {}
+    total = 0.0
+    ply = 1
+    while ply <= depth:
+        counts = [0] * (ply + 1)
+        start = time.perf_counter()
+        perft(gtree.RootNode().traverse(True), ply, counts)
+        seconds = time.perf_counter() - start
+        metrics['perft.' + str(ply) + '.nodes'] = Metric(counts[ply], 'nodes', 'equal')
+        metrics['perft.' + str(ply) + '.seconds'] = Metric(seconds, 's', 'lower')
+        total += seconds
+        ply += 1
+    metrics['perft.nodes_per_second'] = Metric(sum(metrics['perft.' + str(i) + '.nodes'].value for i in range(1, depth + 1)) / total, 'nodes/s', 'higher')
+    return metrics
+
+def bench_victory(count: int) -> dict:
+    '''Measures VictoryState evaluations per second over a fixed set of positions.'''
+    boards = positions(count)
+    metrics = {}
+    start = time.perf_counter()
+    for board, col_i, row_i in boards:
+        gtree.VictoryState(board)
+    metrics['victory.full.per_second'] = Metric(count / (time.perf_counter() - start), 'evals/s', 'higher')
+    start = time.perf_counter()
+    for board, col_i, row_i in boards:
+        gtree.VictoryState.fromMove(board, col_i, row_i)
+    metrics['victory.from_move.per_second'] = Metric(count / (time.perf_counter() - start), 'evals/s', 'higher')
+    try:
+        import batch_victory
+    except ImportError:
+        return metrics
+    array = batch_victory.boards_to_array([board for board, col_i, row_i in boards])
+    start = time.perf_counter()
+    batch_victory.victory_states(array)
+    metrics['victory.batch.per_second'] = Metric(count / (time.perf_counter() - start), 'evals/s', 'higher')
+    return metrics
+
+def bench_nodes(count: int) -> dict:
+    '''Measures DecisionNode construction rate and the memory each node takes.'''
+    metrics = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    root = gtree.RootNode().traverse(True)
+    layer = [root]
+    built = 0
+    while built < count:
+        following = []
+        for node in layer:
+            for child in node.dependents.values():
+                following.append(child)
+                built += 1
+                if built >= count:
+                    break
+            if built >= count:
+                break
+        layer = following
+    seconds = time.perf_counter() - start
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del root, layer
+    metrics['nodes.per_second'] = Metric(built / seconds, 'nodes/s', 'higher')
+    metrics['nodes.bytes_each'] = Metric((after - before) / built, 'bytes', 'lower')
+    return metrics
+
+def bench_search(depth: int) -> dict:
+    '''Measures a depth limited search from the start of the game.'''
+    result = solver.Searcher().search(gtree.RootNode().traverse(True), depth)
+    return {'search.nodes':Metric(result.nodes, 'nodes', 'lower'), 'search.nodes_per_second':Metric(result.nodes / result.seconds, 'nodes/s', 'higher')}
+
+def import_seconds(module: str = 'text_ui') -> float:
+    '''Times importing a module in a fresh interpreter, so nothing is already loaded.'''
+    code = 'import time\nstart = time.perf_counter()\nimport ' + module + '\nprint(time.perf_counter() - start)'
+    return float(subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout)
+
+def bench_import() -> dict:
+    '''Measures how long the engine takes to import.'''
+    return {'import.game_state_tree.seconds':Metric(import_seconds('game_state_tree'), 's', 'lower'), 'import.text_ui.seconds':Metric(import_seconds('text_ui'), 's', 'lower')}
+
+def run(perft_depth: int = 5, victory_count: int = 20000, node_count: int = 20000, search_depth: int = 8) -> dict:
+    '''Runs every benchmark, returning a dictionary ready to be written as JSON.'''
+    metrics = {}
+    metrics.update(bench_import())
+    metrics.update(bench_perft(perft_depth))
+    metrics.update(bench_victory(victory_count))
+    metrics.update(bench_nodes(node_count))
+    metrics.update(bench_search(search_depth))
+    return {'meta':{'python':platform.python_version(), 'machine':platform.machine(), 'time':time.time(), 'settings':{'perft_depth':perft_depth, 'victory_count':victory_count, 'node_count':node_count, 'search_depth':search_depth}}, 'metrics':{name:metric.to_json() for name, metric in sorted(metrics.items())}}
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1) -> list:
+    '''Lists the metrics of current that are worse than baseline by more than tolerance, as a fraction of the baseline.
+            metrics marked 'equal' are listed if they changed at all'''
+    regressions = []
+    for name, old in baseline['metrics'].items():
+        new = current['metrics'].get(name)
+        if new is None:
+            continue
+        if old['better'] == 'equal':
+            worse = new['value'] != old['value']
+        elif old['better'] == 'higher':
+            worse = new['value'] < old['value'] * (1 - tolerance)
+        else:
+            worse = new['value'] > old['value'] * (1 + tolerance)
+        if worse:
+            regressions.append({'metric':name, 'baseline':old['value'], 'current':new['value'], 'unit':old['unit'], 'better':old['better']})
+    return regressions
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert len(positions(50)) == 50
+    assert positions(20, 3) == positions(20, 3)
+    x = [0] * 4
+    perft(gtree.RootNode().traverse(True), 3, x)
+    assert x == [1, gtree.Board.width, gtree.Board.width ** 2, gtree.Board.width ** 3]
+    del x
+    x = {'metrics':{'a':{'value':100, 'unit':'n/s', 'better':'higher'}, 'b':{'value':1.0, 'unit':'s', 'better':'lower'}, 'c':{'value':7, 'unit':'n', 'better':'equal'}}}
+    assert compare(x, x) == []
+    assert [item['metric'] for item in compare(x, {'metrics':{'a':{'value':80}, 'b':{'value':1.05}, 'c':{'value':8}}})] == ['a', 'c']
+    del x
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the connect-4 engine and optionally compare against a saved baseline.')
+    parser.add_argument('--output', help = 'write the results to this JSON file as well as printing them')
+    parser.add_argument('--compare', metavar = 'BASELINE', help = 'JSON file of earlier results to check for regressions')
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'fraction a rate or time may get worse before it counts as a regression')
+    parser.add_argument('--perft-depth', type = int, default = 5)
+    parser.add_argument('--victory-count', type = int, default = 20000)
+    parser.add_argument('--node-count', type = int, default = 20000)
+    parser.add_argument('--search-depth', type = int, default = 8)
+    args = parser.parse_args()
+    results = run(args.perft_depth, args.victory_count, args.node_count, args.search_depth)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent = 2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        results['regressions'] = compare(baseline, results, args.tolerance)
+    print(json.dumps(results, indent = 2))
+    if results.get('regressions'):
+        sys.exit(1)
@@ -0,0 +1,274 @@
+import os
+import mmap
+import struct
+import argparse
+import tempfile
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+class Tablebase():
+    '''Exact results for every position with at most max_empty empty spaces reachable from one seed position, looked up in constant time.
+            the file is a header followed by a hash table of records, found by open addressing with linear probing:
+                header = magic, board width, column height, line length, max_empty, record count, table size
+                record = Board.canonicalKey of the side to move, best column as seen from that key, score for the side to move
+            the table is at most half full, so a lookup reads one or two records; a key of 0, which no position has, marks an empty slot
+            scores are as Searcher gives them: empty + 1 after the winning token for a win, 0 for a draw, negative for a loss
+            like an OpeningBook, the file is memory-mapped, so processes using the same tablebase share its pages'''
+    MAGIC = b'C4TB'
+    HEADER = struct.Struct('<4sBBBBQQ') #magic, width, height, length, max_empty, count, size
+    RECORD = struct.Struct('<Qbb') #key, move, score
+    MULTIPLIER = 0x9E3779B97F4A7C15 #odd constant spreading keys over the table, from Knuth's multiplicative hashing
+    def __init__(self, path: str):
+        if not isinstance(path, str):
+            raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError('\'' + path + '\' is empty, not a tablebase')
+        magic, width, height, length, self.max_empty, self.count, self.size = Tablebase.HEADER.unpack_from(self.data, 0)
+        if magic != Tablebase.MAGIC:
+            self.close()
+            raise ValueError('\'' + path + '\' is not a tablebase')
+        try:
+            self.geometry = gtree.Geometry.get(width, height, length) #shape of the boards in this tablebase
+        except ValueError:
+            self.close()
+            raise ValueError('\'' + path + '\' is a tablebase for ' + str(width) + 'x' + str(height) + ' connect-' + str(length) + ', which is not a valid board')
+        if len(self.data) != Tablebase.HEADER.size + self.size * Tablebase.RECORD.size:
+            self.close()
+            raise ValueError('\'' + path + '\' is truncated')
+        self.shift = 64 - (self.size.bit_length() - 1) #turns a 64 bit hash into a slot index
+        return
+    def __repr__(self) -> str:
+        return 'Tablebase(' + repr(self.path) + ')'
+    def __len__(self) -> int:
+        return self.count
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+    def close(self):
+        '''Unmaps and closes the file.'''
+        if not self.data.closed:
+            self.data.close()
+        self.file.close()
+        return
+    @staticmethod
+    def slot(key: int, shift: int) -> int:
+        '''Finds the first slot to probe for a key in a table of 1 << (64 - shift) slots.'''
+        return (key * Tablebase.MULTIPLIER & 0xFFFFFFFFFFFFFFFF) >> shift
+    def find(self, key: int) -> tuple:
+        '''Finds the (move, score) stored for a canonical key, or None if it is not in the tablebase.'''
+        mask = self.size - 1
+        slot_i = Tablebase.slot(key, self.shift)
+        while True:
+            record_key, move, score = Tablebase.RECORD.unpack_from(self.data, Tablebase.HEADER.size + slot_i * Tablebase.RECORD.size)
+            if record_key == key:
+                return (move, score)
+            if record_key == 0:
+                return None
+            slot_i = (slot_i + 1) & mask
+    def probe(self, board: gtree.Board, player_turn: bool, empty: int) -> tuple:
+        '''Finds the (move, score) for the side to move on a board with empty spaces left, or None if it is not in the tablebase.
+                boards of another geometry, with more than max_empty spaces left, or with gaps are never in it'''
+        if empty > self.max_empty or board.geometry != self.geometry or not board.gapless():
+            return None
+        key, mirrored = board.canonicalKey(player_turn)
+        found = self.find(key)
+        if found is not None and mirrored:
+            return (self.geometry.mirrorMove(found[0]), found[1])
+        return found
+    def lookup(self, node: gtree.DecisionNode) -> tuple:
+        '''Finds the (move, score) for the side to move at an undecided node, or None if it is not in the tablebase.'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if node.state.state != -2:
+            return None
+        state = node.state
+        if state.empty is None:
+            state = gtree.VictoryState(node.board)
+        return self.probe(node.board, node.player_turn, state.empty)
+    def distance(self, node: gtree.DecisionNode) -> int:
+        '''Counts the tokens, both sides', until the side to move at a node wins or loses with best play, or None for a draw or a node not in the tablebase.'''
+        found = self.lookup(node)
+        if found is None or found[1] == 0:
+            return None
+        state = node.state
+        if state.empty is None:
+            state = gtree.VictoryState(node.board)
+        return state.empty - abs(found[1]) + 1
+
+def solve(node: gtree.DecisionNode, max_empty: int) -> dict:
+    '''Works out the canonical key -> (move, score) of every undecided position with at most max_empty empty spaces reachable from a node.
+            positions are found forwards one token at a time, keeping one of each mirror pair, then scored backwards from the fullest,
+            each from the scores of its children, which the previous layer has already worked out'''
+    geometry = node.board.geometry
+    stride = geometry.stride
+    height = geometry.height
+    bottom = geometry.bottom_mask
+    mirror = geometry.mirror
+    connects = geometry.connects
+    state = node.state
+    if state.empty is None:
+        state = gtree.VictoryState(node.board)
+    if state.state != -2:
+        return {}
+    #each position is (own, other): the masks of the side to move and its opponent, so colours do not matter
+    if node.player_turn:
+        own, other = node.board.player_mask, node.board.computer_mask
+    else:
+        own, other = node.board.computer_mask, node.board.player_mask
+    layer = {min(own + (own | other) + bottom, mirror(own + (own | other) + bottom)):(own, other)}
+    empty = state.empty
+    layers = {} #empty spaces -> layer, for the layers that are kept
+    while empty > 0 and layer:
+        if empty <= max_empty:
+            layers[empty] = layer
+        following = {}
+        if empty > 1:
+            for own, other in layer.values():
+                occupied = own | other
+                for col_i in range(geometry.width):
+                    top = (occupied >> (col_i * stride)) & ((1 << stride) - 1)
+                    row_i = top.bit_length()
+                    if row_i >= height:
+                        continue
+                    bit_i = col_i * stride + row_i
+                    mover = own | 1 << bit_i
+                    if connects(mover, bit_i):
+                        continue
+                    key = other + (occupied | 1 << bit_i) + bottom
+                    following.setdefault(min(key, mirror(key)), (other, mover))
+        layer = following
+        empty -= 1
+    results = {}
+    scores = {} #canonical key -> score of the layer below the one being scored
+    for empty in sorted(layers):
+        layer_scores = {}
+        for key, (own, other) in layers[empty].items():
+            occupied = own | other
+            best_score = None
+            best_move = None
+            for col_i in geometry.order:
+                row_i = ((occupied >> (col_i * stride)) & ((1 << stride) - 1)).bit_length()
+                if row_i >= height:
+                    continue
+                bit_i = col_i * stride + row_i
+                mover = own | 1 << bit_i
+                if connects(mover, bit_i):
+                    score = empty
+                elif empty == 1:
+                    score = 0
+                else:
+                    child_key = other + (occupied | 1 << bit_i) + bottom
+                    score = -scores[min(child_key, mirror(child_key))]
+                if best_score is None or score > best_score:
+                    best_score = score
+                    best_move = col_i
+            if own + occupied + bottom != key:
+                best_move = geometry.mirrorMove(best_move)
+            layer_scores[key] = best_score
+            results[key] = (best_move, best_score)
+        scores = layer_scores
+    return results
+
+def build(path: str, max_empty: int, node: gtree.DecisionNode = None, geometry: gtree.Geometry = None) -> int:
+    '''Solves every position with at most max_empty empty spaces reachable from a node and writes them to a tablebase at path.
+            the node defaults to the empty board of the geometry with the player to move, which reaches every position
+            returns the number of records written'''
+    if not isinstance(path, str):
+        raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+    if not isinstance(max_empty, int):
+        raise TypeError('\'max_empty\' must be an integer, not a ' + str(type(max_empty)))
+    if not isinstance(node, (gtree.DecisionNode, type(None))):
+        raise TypeError('\'node\' must be a DecisionNode or None, not a ' + str(type(node)))
+    if max_empty < 1 or max_empty > 255:
+        raise ValueError('\'max_empty\' must be between 1 and 255, not ' + str(max_empty))
+    if node is None:
+        node = gtree.DecisionNode(gtree.Board([], geometry), True)
+    elif not node.board.gapless():
+        raise ValueError('\'node\' must be a board without gaps, which every reachable position has')
+    geometry = node.board.geometry
+    if geometry.width * geometry.stride > 64:
+        raise ValueError('keys of a ' + str(geometry.width) + 'x' + str(geometry.height) + ' board do not fit the 64 bits stored for each record')
+    results = solve(node, max_empty)
+    size = 1
+    while size < 2 * len(results):
+        size <<= 1
+    shift = 64 - (size.bit_length() - 1)
+    table = bytearray(size * Tablebase.RECORD.size)
+    for key, (move, score) in results.items():
+        slot_i = Tablebase.slot(key, shift)
+        while Tablebase.RECORD.unpack_from(table, slot_i * Tablebase.RECORD.size)[0] != 0:
+            slot_i = (slot_i + 1) & (size - 1)
+        Tablebase.RECORD.pack_into(table, slot_i * Tablebase.RECORD.size, key, move, score)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(Tablebase.HEADER.pack(Tablebase.MAGIC, geometry.width, geometry.height, geometry.length, max_empty, len(results), size))
+        file.write(table)
+    os.replace(temp_path, path)
+    return len(results)
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    import solver
+    small = gtree.Geometry.get(4, 4, 3)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'small.tb')
+        assert build(path, 16, None, small) == len(solve(gtree.DecisionNode(gtree.Board([], small), True), 16))
+        with Tablebase(path) as x:
+            y = gtree.DecisionNode(gtree.Board([], small), True)
+            assert x.lookup(y) == (solver.Searcher().search(y).move, solver.Searcher().search(y).score)
+            for moves in ('0', '3', '12', '1203', '2211', '01230'):
+                z = y
+                for move in moves:
+                    z = z.traverse(int(move))
+                assert x.lookup(z)[1] == solver.Searcher().search(z).score
+                assert z.traverse(x.lookup(z)[0]).state.state != -2 or x.lookup(z.traverse(x.lookup(z)[0]))[1] == -x.lookup(z)[1]
+            assert x.lookup(y.traverse(0)) == (3 - x.lookup(y.traverse(3))[0], x.lookup(y.traverse(3))[1])
+            #the first player wins connect-3 on a 4x4 board with their fifth token, the ninth in all
+            assert x.lookup(y)[1] == 16 - 9 + 1 and x.distance(y) == 9 and x.distance(y.traverse(1)) == 8
+            assert x.lookup(gtree.DecisionNode(gtree.Board())) is None
+        path = os.path.join(directory, 'standard.tb')
+        y = gtree.DecisionNode(gtree.Board.fromMoves('1466602036335361030634504215'), True)
+        assert build(path, 12, y) == len(solve(y, 12))
+        with Tablebase(path) as x:
+            assert x.lookup(y) is None and x.max_empty == 12
+            for moves in ('21', '01', '0121', '2144', '2212'):
+                z = y
+                for move in moves:
+                    z = z.traverse(int(move))
+                assert x.lookup(z)[1] == solver.Searcher().search(z).score
+    del x, y, z
+    assert err.expect('build("x.tb", 0)', ValueError, global_variables={'build':build})
+    assert err.expect('Tablebase(0)', TypeError, global_variables={'Tablebase':Tablebase})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Build or query an endgame tablebase.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    build_parser = commands.add_parser('build', help = 'solve every position with few enough empty spaces and write the tablebase')
+    build_parser.add_argument('path')
+    build_parser.add_argument('--max-empty', type = int, default = 12, help = 'most empty spaces of a tablebase position')
+    build_parser.add_argument('--moves', default = '', help = 'columns played from the start to reach the seed position, such as 3342; every position is reachable from the empty board, but only small boards can be enumerated from it')
+    build_parser.add_argument('--width', type = int, default = gtree.Geometry.standard.width, help = 'number of columns on the board')
+    build_parser.add_argument('--height', type = int, default = gtree.Geometry.standard.height, help = 'number of spaces in each column')
+    build_parser.add_argument('--length', type = int, default = gtree.Geometry.standard.length, help = 'number of tokens in a line needed to win')
+    query_parser = commands.add_parser('query', help = 'look up the position reached by a sequence of columns')
+    query_parser.add_argument('path')
+    query_parser.add_argument('moves', nargs = '?', default = '', help = 'columns played from the start, such as 3342')
+    args = parser.parse_args()
+    if args.command == 'build':
+        node = gtree.DecisionNode(gtree.Board([], gtree.Geometry.get(args.width, args.height, args.length)), True)
+        for move in args.moves:
+            node = node.traverse(int(move))
+        print(build(args.path, args.max_empty, node), 'positions written to', args.path)
+    else:
+        with Tablebase(args.path) as tablebase:
+            node = gtree.DecisionNode(gtree.Board([], tablebase.geometry), True)
+            for move in args.moves:
+                node = node.traverse(int(move))
+            print(tablebase.lookup(node), tablebase.distance(node))
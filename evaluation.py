@@ -0,0 +1,172 @@
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+class ThreatEvaluator():
+    '''A static evaluation of undecided positions, for searches that stop before the end of the game.
+            it keeps how many tokens each side has in every line of the geometry, updated by play and unplay in O(lines through the space)
+            a line held by one side alone is worth more the more of its tokens it holds, and nothing once both sides are in it
+            a line one token short of a win is a threat, worth extra if its empty space is on a row that suits its side:
+                odd rows, counting the bottom as row 1, for the side that moved first, and even rows for the other
+            tokens nearer the center column are worth a little more, as they take part in more lines'''
+    WEIGHTS = (0, 1, 5, 20) #value of a line held by one side alone, indexed by its number of tokens, for lines of 4; longer lines continue by 4 times
+    PARITY = 20 #extra value of a threat on a row that suits its side
+    CENTER = 3 #value of a token per column closer to the center than the edge
+    SCALE = 100 #a value this size becomes 0.5 after squashing into (-1, 1)
+    tables = {} #Geometry -> (lines of each space by index, weights, center value of each space), filled as geometries are first used
+    def __init__(self, geometry: gtree.Geometry = None):
+        if geometry is None:
+            geometry = gtree.Geometry.standard
+        elif not isinstance(geometry, gtree.Geometry):
+            raise TypeError('\'geometry\' must be a Geometry or None, not a ' + str(type(geometry)))
+        self.reset(gtree.Board([], geometry))
+        return
+    def __repr__(self) -> str:
+        return 'ThreatEvaluator(' + repr(self.geometry) + ')'
+    @staticmethod
+    def table(geometry: gtree.Geometry) -> tuple:
+        '''Finds the tables for a geometry, working them out the first time it is used.'''
+        result = ThreatEvaluator.tables.get(geometry)
+        if result is None:
+            index = {line:line_i for line_i, line in enumerate(geometry.lines)}
+            cell_lines = tuple(tuple(index[line] for line in lines) for lines in geometry.cell_lines)
+            weights = ThreatEvaluator.WEIGHTS[:geometry.length]
+            while len(weights) < geometry.length:
+                weights += (weights[-1] * 4,)
+            center = tuple(ThreatEvaluator.CENTER * ((geometry.width - 1) // 2 - abs(2 * (bit_i // geometry.stride) - geometry.width + 1) // 2) for bit_i in range(geometry.width * geometry.stride))
+            result = (cell_lines, weights + (0,), center)
+            ThreatEvaluator.tables[geometry] = result
+        return result
+    def reset(self, board: gtree.Board):
+        '''Sets the counts to those of a board, ready for play and unplay to follow the moves made on it.'''
+        if not isinstance(board, gtree.Board):
+            raise TypeError('\'board\' must be a Board, not a ' + str(type(board)))
+        self.geometry = board.geometry
+        self.cell_lines, self.weights, self.center = ThreatEvaluator.table(board.geometry)
+        self.player_mask = 0
+        self.computer_mask = 0
+        self.counts = [[0] * len(board.geometry.lines), [0] * len(board.geometry.lines)] #(computer, player) tokens in each line, by index
+        self.value = 0 #lines and center from the player's side, not counting parity
+        self.tokens = 0
+        self.threats = [[0, 0], [0, 0]] #(computer, player) threats with their empty space on (odd, even) rows
+        for bit_i in range(board.geometry.width * board.geometry.stride):
+            if board.player_mask >> bit_i & 1:
+                self.play(bit_i, True)
+            elif board.computer_mask >> bit_i & 1:
+                self.play(bit_i, False)
+        return
+    def play(self, bit_i: int, player: bool):
+        '''Adds a token of one side at one bit index.'''
+        side = 1 if player else 0
+        own_counts = self.counts[side]
+        other_counts = self.counts[1 - side]
+        weights = self.weights
+        threat = self.geometry.length - 1
+        occupied = self.player_mask | self.computer_mask
+        change = self.center[bit_i]
+        for line_i in self.cell_lines[bit_i]:
+            own = own_counts[line_i]
+            other = other_counts[line_i]
+            own_counts[line_i] = own + 1
+            if other == 0:
+                change += weights[own + 1] - weights[own]
+                if own == threat:
+                    self.threats[side][bit_i % self.geometry.stride & 1] -= 1
+                elif own + 1 == threat:
+                    self.addThreat(side, self.geometry.lines[line_i] & ~occupied & ~(1 << bit_i), 1)
+            elif own == 0:
+                change += weights[other]
+                if other == threat:
+                    self.threats[1 - side][bit_i % self.geometry.stride & 1] -= 1
+        if player:
+            self.player_mask |= 1 << bit_i
+            self.value += change
+        else:
+            self.computer_mask |= 1 << bit_i
+            self.value -= change
+        self.tokens += 1
+        return
+    def unplay(self, bit_i: int, player: bool):
+        '''Takes away a token of one side at one bit index, undoing play.'''
+        side = 1 if player else 0
+        own_counts = self.counts[side]
+        other_counts = self.counts[1 - side]
+        weights = self.weights
+        threat = self.geometry.length - 1
+        if player:
+            self.player_mask ^= 1 << bit_i
+        else:
+            self.computer_mask ^= 1 << bit_i
+        occupied = self.player_mask | self.computer_mask
+        change = self.center[bit_i]
+        for line_i in self.cell_lines[bit_i]:
+            own = own_counts[line_i] - 1
+            other = other_counts[line_i]
+            own_counts[line_i] = own
+            if other == 0:
+                change += weights[own + 1] - weights[own]
+                if own == threat:
+                    self.threats[side][bit_i % self.geometry.stride & 1] += 1
+                elif own + 1 == threat:
+                    self.addThreat(side, self.geometry.lines[line_i] & ~occupied & ~(1 << bit_i), -1)
+            elif own == 0:
+                change += weights[other]
+                if other == threat:
+                    self.threats[1 - side][bit_i % self.geometry.stride & 1] += 1
+        if player:
+            self.value -= change
+        else:
+            self.value += change
+        self.tokens -= 1
+        return
+    def addThreat(self, side: int, empty: int, sign: int):
+        '''Counts a threat of one side whose empty space is the single bit of empty, or takes it away with sign -1.'''
+        self.threats[side][(empty.bit_length() - 1) % self.geometry.stride & 1] += sign
+        return
+    def evaluate(self, player_turn: bool) -> float:
+        '''Scores the position for the side to move, between -1 and 1 exclusive, so it never reaches the score of a win or loss.'''
+        #with an even number of tokens the side to move went first, and its good threats are on odd rows, which have even row indexes
+        first = 1 if (self.tokens & 1 == 0) == player_turn else 0
+        player_good = self.threats[1][1 - first]
+        computer_good = self.threats[0][first]
+        value = self.value + ThreatEvaluator.PARITY * (player_good - computer_good)
+        if not player_turn:
+            value = -value
+        return value / (abs(value) + ThreatEvaluator.SCALE)
+    def score(self, board: gtree.Board, player_turn: bool) -> float:
+        '''Scores a board for the side to move from scratch, as evaluate would after following its moves.'''
+        self.reset(board)
+        return self.evaluate(player_turn)
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    x = ThreatEvaluator()
+    assert x.value == 0 and x.evaluate(True) == 0.0
+    assert x.score(gtree.Board([[],[],[],[1]]), False) < 0 < x.score(gtree.Board([[],[],[],[1]]), True)
+    assert x.score(gtree.Board([[],[],[],[1]]), True) > x.score(gtree.Board([[1]]), True)
+    assert x.score(gtree.Board([[],[1],[1],[1]]), True) > x.score(gtree.Board([[],[1],[1]]), True) > 0
+    assert -1 < x.score(gtree.Board([[1,1,1],[1,1,1],[1,1,1]]), True) < 1
+    x.reset(gtree.Board([[],[-1,1],[-1,1],[-1,1]]))
+    assert x.threats == [[2, 0], [0, 2]]
+    #with five tokens and the computer to move, the player went first, and their threat on the bottom row suits them
+    x.reset(gtree.Board([[1],[1],[1],[],[-1,-1]]))
+    assert x.threats == [[0, 0], [1, 0]] and x.evaluate(False) == -(x.value + ThreatEvaluator.PARITY) / (x.value + ThreatEvaluator.PARITY + ThreatEvaluator.SCALE)
+    y = gtree.Board.fromMoves('3342256614')
+    x.reset(y)
+    z = (list(map(list, x.counts)), x.value, list(map(list, x.threats)))
+    x.play(gtree.Board.stride * 4 + y.heights[4], True)
+    x.play(gtree.Board.stride * 5 + y.heights[5], False)
+    x.unplay(gtree.Board.stride * 5 + y.heights[5], False)
+    x.unplay(gtree.Board.stride * 4 + y.heights[4], True)
+    assert (list(map(list, x.counts)), x.value, list(map(list, x.threats))) == z
+    for moves in ('33422566140', '334225661405', '3342256614055'):
+        y = gtree.Board.fromMoves(moves)
+        x.play(gtree.Board.stride * int(moves[-1]) + y.heights[int(moves[-1])] - 1, len(moves) % 2 == 1)
+        z = ThreatEvaluator()
+        z.reset(y)
+        assert (x.counts, x.value, x.threats) == (z.counts, z.value, z.threats)
+    del x, y, z
+    assert ThreatEvaluator(gtree.Geometry.get(5, 4, 3)).score(gtree.Board([[],[1,1]], gtree.Geometry.get(5, 4, 3)), True) > 0
+    assert err.expect('ThreatEvaluator(1)', TypeError, global_variables={'ThreatEvaluator':ThreatEvaluator})
+
+if __name__ == '__main__':
+    selfcheck()
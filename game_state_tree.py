@@ -1,5 +1,10 @@
+import os
+import random
+import transposition
 from extended_debug import error_test as err
 
+CHECKED = os.environ.get('CONNECT4_CHECKED', '') not in ('', '0') #whether internal calls also go through the validated entry points, set by the CONNECT4_CHECKED environment variable
+
 class BoardPos():
     '''An enumeration representing a single space on a connect-4 board.
             -1 = belongs to computer
@@ -46,42 +51,31 @@ class BoardPos():
         else:
             self.state = -1
         return self
-assert BoardPos().state == 0
-assert err.expect('BoardPos(\'0\')', TypeError, global_variables={'BoardPos':BoardPos})
-assert err.expect('BoardPos(2)', ValueError, global_variables={'BoardPos':BoardPos})
-assert err.expect('BoardPos(-2)', ValueError, global_variables={'BoardPos':BoardPos})
-assert BoardPos() == BoardPos()
-assert err.expect('BoardPos() == 0', TypeError, global_variables={'BoardPos':BoardPos})
-assert repr(BoardPos()) == 'BoardPos(0)'
-assert str(BoardPos()) == BoardPos.empty_symbol
-assert str(BoardPos(1)) == BoardPos.player_symbol
-assert str(BoardPos(-1)) == BoardPos.computer_symbol
-assert BoardPos().full() == False
-assert BoardPos(1).full() == True
-assert BoardPos(-1).full() == True
-assert BoardPos().capture().state == -1
-assert BoardPos().capture(True).state == 1
-assert err.expect('BoardPos(1).capture()', Exception, global_variables={'BoardPos':BoardPos})
 
 class BoardColumn():
     '''A list representing a single column on a connect-4 board.
             0th index is bottom
             last index is top'''
-    height = 6 #number of spaces in a column on the board
-    def __init__(self, spaces: list = []):
+    height = 6 #number of spaces in a column on the standard board
+    def __init__(self, spaces: list = [], height: int = None):
         if not isinstance(spaces, list):
             raise TypeError('\'spaces\' must be a list, not a ' + repr(type(spaces)))
-        if len(spaces) > BoardColumn.height:
-            raise IndexError('\'spaces\' must be no longer than ' + repr(BoardColumn.height) + ', ' + repr(len(spaces)) + ' is too long')
+        if height is None:
+            height = BoardColumn.height
+        elif not isinstance(height, int):
+            raise TypeError('\'height\' must be an integer or None, not a ' + repr(type(height)))
+        if len(spaces) > height:
+            raise IndexError('\'spaces\' must be no longer than ' + repr(height) + ', ' + repr(len(spaces)) + ' is too long')
         column = []
         for item in spaces:
             if isinstance(item, BoardPos):
                 column.append(item)
             else:
                 column.append(BoardPos(item))
-        while len(column) < BoardColumn.height:
+        while len(column) < height:
             column.append(BoardPos())
         self.items = tuple(column)
+        self.height = height #number of spaces in this column
         return
     def __eq__(self, other) -> bool:
         if not isinstance(other, BoardColumn):
@@ -90,14 +84,14 @@ class BoardColumn():
     def __repr__(self) -> str:
         result = 'BoardColumn(['
         i = 0
-        while i < BoardColumn.height:
+        while i < self.height:
             result += repr(self.items[i]) + ','
             i += 1
         return result[0:-1] + '])'
     def __str__(self) -> str:
         result = ''
         i = 0
-        while i < BoardColumn.height:
+        while i < self.height:
             result += str(self.items[i])
             i += 1
         return result
@@ -114,104 +108,412 @@ class BoardColumn():
         if self.full():
             raise Exception('cannot add token to full column')
         i = 0
-        while i < BoardColumn.height:
+        while i < self.height:
             if not self.items[i].full():
                 self.items[i].capture(player)
                 return self
             i += 1
         raise IndexError('could not find an empty BoardPos to put a token into')
-assert len(BoardColumn().items) == BoardColumn.height
-assert BoardColumn().items == tuple([BoardPos()] * BoardColumn.height)
-assert BoardColumn([1,1,1,-1]).items == (BoardPos(1),BoardPos(1),BoardPos(1),BoardPos(-1),BoardPos(),BoardPos())
-assert err.expect('BoardColumn(0)', TypeError, global_variables={'BoardColumn':BoardColumn})
-assert err.expect('BoardColumn(' + repr([0] * (BoardColumn.height + 1)) + ')', IndexError, global_variables={'BoardColumn':BoardColumn})
-assert BoardColumn() == BoardColumn()
-assert err.expect('BoardColumn() == 0', TypeError, global_variables={'BoardColumn':BoardColumn,'BoardPos':BoardPos})
-assert BoardColumn() != BoardColumn([1])
-assert repr(BoardColumn()) == 'BoardColumn(' + repr([BoardPos(0)] * BoardColumn.height).replace(' ','') + ')'
-assert str(BoardColumn([1,-1,1])) == BoardPos.player_symbol + BoardPos.computer_symbol + BoardPos.player_symbol + BoardPos.empty_symbol + BoardPos.empty_symbol + BoardPos.empty_symbol
-assert BoardColumn([1]).full() == False
-assert BoardColumn([1,1,1,-1,-1,-1]).full() == True
-assert BoardColumn().addToken() == BoardColumn([-1])
-assert BoardColumn([-1,1]).addToken(True) == BoardColumn([-1,1,1])
-assert err.expect('BoardColumn([1,1,1,-1,-1,-1]).addToken()', Exception, global_variables={'BoardColumn':BoardColumn,'BoardPos':BoardPos})
+
+class Geometry():
+    '''The shape of a game: number of columns, spaces per column, and tokens in a line needed to win.
+            every table that follows from the shape is worked out once, so use Geometry.get to share one instance per shape between boards'''
+    cache = {} #(width, height, length) -> Geometry, filled by get
+    def __init__(self, width: int = 7, height: int = 6, length: int = 4):
+        if not isinstance(width, int):
+            raise TypeError('\'width\' must be an integer, not a ' + str(type(width)))
+        if not isinstance(height, int):
+            raise TypeError('\'height\' must be an integer, not a ' + str(type(height)))
+        if not isinstance(length, int):
+            raise TypeError('\'length\' must be an integer, not a ' + str(type(length)))
+        if width < 1:
+            raise ValueError('\'width\' must be greater than 0, not ' + str(width))
+        if height < 1:
+            raise ValueError('\'height\' must be greater than 0, not ' + str(height))
+        if length < 2:
+            raise ValueError('\'length\' must be greater than 1, not ' + str(length))
+        if length > max(width, height):
+            raise ValueError('\'length\' must not be greater than both \'width\' and \'height\', not ' + str(length))
+        self.width = width
+        self.height = height
+        self.length = length
+        self.stride = height + 1 #number of bits used by each column in the masks, the spare top bit keeps lines from wrapping between columns
+        self.size = width * height #number of spaces on the board
+        self.full_mask = sum(((1 << height) - 1) << (i * self.stride) for i in range(width)) #mask of every space on the board
+        self.bottom_mask = sum(1 << (i * self.stride) for i in range(width)) #mask of the bottom space of each column
+        self.directions = (1, self.stride, self.stride + 1, self.stride - 1) #bit offsets along vertical, horizontal, rising and falling lines
+        self.order = tuple(sorted(range(width), key = lambda col_i: abs(2 * col_i - width + 1))) #column indexes, center first
+        self.key_bytes = (width * self.stride + 7) // 8 #number of bytes Board.toBytes uses for a key
+        lines = []
+        cell_lines = [[] for i in range(width * self.stride)]
+        for step_x, step_y in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for col_i in range(width):
+                for row_i in range(height):
+                    end_x = col_i + step_x * (length - 1)
+                    end_y = row_i + step_y * (length - 1)
+                    if end_x >= width or end_y < 0 or end_y >= height:
+                        continue
+                    bits = [(col_i + step_x * i) * self.stride + row_i + step_y * i for i in range(length)]
+                    line = sum(1 << bit_i for bit_i in bits)
+                    lines.append(line)
+                    for bit_i in bits:
+                        cell_lines[bit_i].append(line)
+        self.lines = tuple(lines) #mask of every line of length spaces a player could win with
+        self.cell_lines = tuple(tuple(item) for item in cell_lines) #masks of the lines through each space, indexed by bit
+        zobrist_random = random.Random(repr((0x4c4, width, height))) #fixed seed so hashes agree between processes and runs
+        self.zobrist_keys = (tuple(zobrist_random.getrandbits(64) for i in range(width * self.stride)), tuple(zobrist_random.getrandbits(64) for i in range(width * self.stride))) #random keys for (computer, player) tokens, indexed by bit
+        self.zobrist_turn = zobrist_random.getrandbits(64) #random key mixed in when it is the player's turn
+        self.mirror_bits = tuple((width - 1 - bit_i // self.stride) * self.stride + bit_i % self.stride for bit_i in range(width * self.stride)) #bit index of the same space seen in a mirror, indexed by bit
+        self.zobrist_mirror_keys = tuple(tuple(keys[self.mirror_bits[bit_i]] for bit_i in range(width * self.stride)) for keys in self.zobrist_keys) #keys of the mirrored space, so a board can hash its mirror image as it goes
+        return
+    @staticmethod
+    def get(width: int = 7, height: int = 6, length: int = 4):
+        '''Finds the shared Geometry for a shape, building its tables the first time the shape is asked for.'''
+        result = Geometry.cache.get((width, height, length))
+        if result is None:
+            result = Geometry(width, height, length)
+            Geometry.cache[(width, height, length)] = result
+        return result
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Geometry):
+            raise TypeError('Geometry instances must only be compared to other Geometry instances, not ' + str(type(other)))
+        return self is other or (self.width, self.height, self.length) == (other.width, other.height, other.length)
+    def __hash__(self) -> int:
+        return hash((self.width, self.height, self.length))
+    def __repr__(self) -> str:
+        return 'Geometry(' + repr(self.width) + ',' + repr(self.height) + ',' + repr(self.length) + ')'
+    def __reduce__(self):
+        #pickles as the shape alone, so boards sent to other processes share that process's cached tables
+        return (Geometry.get, (self.width, self.height, self.length))
+    def mirror(self, mask: int) -> int:
+        '''Reverses the order of the columns of a mask or key, giving the same spaces reflected across the center column.'''
+        result = 0
+        column_mask = (1 << self.stride) - 1
+        col_i = 0
+        while mask:
+            result |= (mask & column_mask) << ((self.width - 1 - col_i) * self.stride)
+            mask >>= self.stride
+            col_i += 1
+        return result
+    def mirrorMove(self, col_i: int) -> int:
+        '''Finds the column a move into one indexed column becomes when the board is mirrored; mirroring it again gives it back.'''
+        return self.width - 1 - col_i
+    def connects(self, mask: int, bit_i: int) -> bool:
+        '''Tests whether the token at one bit index of a side's mask completes any of the lines through it.'''
+        for line in self.cell_lines[bit_i]:
+            if mask & line == line:
+                return True
+        return False
+Geometry.standard = Geometry.get(7, BoardColumn.height, 4) #the usual 7 by 6 board with lines of 4
 
 class Board():
     '''2D tuple representing a whole connect-4 board.
             0th index is far left
-            last index is far right'''
-    width = 7 #number of columns on the board
+            last index is far right
+            each side is stored as a bitmask with bit (col_i * stride + row_i) set for each of its tokens
+            the spare top bit of each column keeps lines from wrapping between columns
+            the class attributes describe the standard geometry, each board's own is kept in its geometry attribute'''
+    width = Geometry.standard.width #number of columns on the standard board
     sep = '|' #string used to separate each column
-    def __init__(self, columns: list = []):
+    stride = Geometry.standard.stride #number of bits used by each column in the masks of the standard board
+    full_mask = Geometry.standard.full_mask #mask of every space on the standard board
+    bottom_mask = Geometry.standard.bottom_mask #mask of the bottom space of each column on the standard board
+    zobrist_keys = Geometry.standard.zobrist_keys #random keys for (computer, player) tokens on the standard board, indexed by bit
+    zobrist_turn = Geometry.standard.zobrist_turn #random key mixed in when it is the player's turn on the standard board
+    def __init__(self, columns: list = [], geometry: Geometry = None):
         if not isinstance(columns, list):
             raise TypeError('\'columns\' must be a list, not a ' + repr(type(columns)))
-        if len(columns) > Board.width:
-            raise IndexError('\'columns\' must be no longer than ' + repr(Board.width) + ', not ' + repr(len(columns)))
-        board = []
+        if geometry is None:
+            geometry = Geometry.standard
+        elif not isinstance(geometry, Geometry):
+            raise TypeError('\'geometry\' must be a Geometry or None, not a ' + repr(type(geometry)))
+        if len(columns) > geometry.width:
+            raise IndexError('\'columns\' must be no longer than ' + repr(geometry.width) + ', not ' + repr(len(columns)))
+        self.geometry = geometry #shape of this board and its precomputed tables
+        self.player_mask = 0 #bitmask of the player's tokens
+        self.computer_mask = 0 #bitmask of the computer's tokens
+        heights = []
+        col_i = 0
         for item in columns:
-            if isinstance(item, BoardColumn):
-                board.append(item)
-            else:
-                board.append(BoardColumn(item))
-        while len(board) < Board.width:
-            board.append(BoardColumn())
-        self.columns = tuple(board)
+            if not isinstance(item, BoardColumn):
+                item = BoardColumn(item, geometry.height)
+            elif item.height != geometry.height:
+                raise ValueError('columns must have ' + repr(geometry.height) + ' spaces, not ' + repr(item.height))
+            height = 0
+            row_i = 0
+            while row_i < geometry.height:
+                state = item.items[row_i].state
+                if state == 1:
+                    self.player_mask |= 1 << (col_i * geometry.stride + row_i)
+                elif state == -1:
+                    self.computer_mask |= 1 << (col_i * geometry.stride + row_i)
+                if state != 0:
+                    height = row_i + 1
+                row_i += 1
+            heights.append(height)
+            col_i += 1
+        while len(heights) < geometry.width:
+            heights.append(0)
+        self.heights = heights #number of spaces filled in each column, counting any gaps below the top token; changed in place by moves
+        self.zobrist = Board.hashMasks(self.player_mask, self.computer_mask, geometry) #Zobrist hash of the tokens on this board, kept up to date by addToken and removeToken
+        self.mirror_zobrist = Board.hashMasks(geometry.mirror(self.player_mask), geometry.mirror(self.computer_mask), geometry) #Zobrist hash of this board's mirror image, kept up to date alongside zobrist
         return
+    @staticmethod
+    def hashMasks(player_mask: int, computer_mask: int, geometry: Geometry = None) -> int:
+        '''Calculates the Zobrist hash of a pair of masks from scratch.'''
+        if geometry is None:
+            geometry = Geometry.standard
+        result = 0
+        i = 0
+        while player_mask >> i or computer_mask >> i:
+            if player_mask >> i & 1:
+                result ^= geometry.zobrist_keys[1][i]
+            elif computer_mask >> i & 1:
+                result ^= geometry.zobrist_keys[0][i]
+            i += 1
+        return result
+    @property
+    def columns(self) -> tuple:
+        '''Builds a tuple of BoardColumns matching this board.
+                the columns are copies, so changing them does not change the board'''
+        columns = []
+        col_i = 0
+        while col_i < self.geometry.width:
+            spaces = []
+            row_i = 0
+            while row_i < self.geometry.height:
+                spaces.append(self.tokenAt(col_i, row_i))
+                row_i += 1
+            columns.append(BoardColumn(spaces, self.geometry.height))
+            col_i += 1
+        return tuple(columns)
     def __eq__(self, other) -> bool:
         if not isinstance(other, Board):
             raise TypeError('Board instances must only be compared to other Board instances, not ' + repr(type(other)))
-        return self.columns == other.columns
+        return self.player_mask == other.player_mask and self.computer_mask == other.computer_mask and self.geometry == other.geometry
+    def __hash__(self) -> int:
+        #changes when a token is added, so a board must not be changed while it is a key
+        return self.zobrist
     def __repr__(self) -> str:
         result = 'Board(['
         for column in self.columns:
             result += repr(column) + ','
-        return result[0:-1] + '])'
+        result = result[0:-1] + ']'
+        if self.geometry is not Geometry.standard:
+            result += ',' + repr(self.geometry)
+        return result + ')'
     def __str__(self) -> str:
-        strings = []
-        for col in self.columns:
-            strings.append(str(col))
+        symbols = {1:BoardPos.player_symbol, 0:BoardPos.empty_symbol, -1:BoardPos.computer_symbol}
         result = ''
-        i = BoardColumn.height - 1
+        i = self.geometry.height - 1
         while i >= 0:
             j = 0
-            while j < Board.width:
-                result += Board.sep + str(strings[j][i])
+            while j < self.geometry.width:
+                result += Board.sep + symbols[self.tokenAt(j, i)]
                 j += 1
             result += Board.sep + '\n'
             i -= 1
         return result 
+    def tokenAt(self, col_i: int, row_i: int) -> int:
+        '''Finds the state of one space, as used by BoardPos.'''
+        if not isinstance(col_i, int):
+            raise TypeError('\'col_i\' must an integer, not a ' + repr(type(col_i)))
+        if not isinstance(row_i, int):
+            raise TypeError('\'row_i\' must an integer, not a ' + repr(type(row_i)))
+        if col_i < 0 or col_i >= self.geometry.width:
+            raise IndexError('\'col_i\' must be greater than -1 and lesser than ' + repr(self.geometry.width) + ', not ' + repr(col_i))
+        if row_i < 0 or row_i >= self.geometry.height:
+            raise IndexError('\'row_i\' must be greater than -1 and lesser than ' + repr(self.geometry.height) + ', not ' + repr(row_i))
+        bit = 1 << (col_i * self.geometry.stride + row_i)
+        if self.player_mask & bit:
+            return 1
+        elif self.computer_mask & bit:
+            return -1
+        return 0
     def full(self) ->  bool:
         '''Tests occupacy of this board'''
-        for col in self.columns:
-            if not col.full():
-                return False
-        return True
+        return self.player_mask | self.computer_mask == self.geometry.full_mask
     def addToken(self, col_i: int, player: bool = False):
         '''Attempts to slide a token into one indexed column.'''
         if not isinstance(col_i, int):
             raise TypeError('\'col_i\' must an integer, not a ' + repr(type(col_i)))
         if not isinstance(player, bool):
-            raise TypeError('\'player\' must be a boolean, not a ' + repr(type(coll_i)))
+            raise TypeError('\'player\' must be a boolean, not a ' + repr(type(player)))
         if col_i < 0:
             raise IndexError('\'col_i\' must be greater than -1, not ' + repr(col_i))
-        if col_i >= Board.width:
-            raise IndexError('\'col_i\' must be lesser than ' + repr(Board.width) + ', not ' + repr(col_i))
-        self.columns[col_i].addToken(player)
+        if col_i >= self.geometry.width:
+            raise IndexError('\'col_i\' must be lesser than ' + repr(self.geometry.width) + ', not ' + repr(col_i))
+        if self.heights[col_i] >= self.geometry.height:
+            raise Exception('cannot add token to full column')
+        return self._place(col_i, player)
+    def _place(self, col_i: int, player: bool):
+        '''Slides a token into one indexed column without checking the arguments or that the column has room.
+                the kernel behind addToken, for callers that only pass moves they have already checked'''
+        height = self.heights[col_i]
+        bit_i = col_i * self.geometry.stride + height
+        if player:
+            self.player_mask |= 1 << bit_i
+            self.zobrist ^= self.geometry.zobrist_keys[1][bit_i]
+            self.mirror_zobrist ^= self.geometry.zobrist_mirror_keys[1][bit_i]
+        else:
+            self.computer_mask |= 1 << bit_i
+            self.zobrist ^= self.geometry.zobrist_keys[0][bit_i]
+            self.mirror_zobrist ^= self.geometry.zobrist_mirror_keys[0][bit_i]
+        self.heights[col_i] = height + 1
         return self
-assert Board().columns == tuple([BoardColumn()] * Board.width)
-assert Board([[1,1],[-1,-1]]).columns == (BoardColumn([1,1]),BoardColumn([-1,-1]),BoardColumn(),BoardColumn(),BoardColumn(),BoardColumn(),BoardColumn())
-assert err.expect('Board(1)', TypeError, global_variables={'Board':Board})
-assert err.expect('Board([1,-1])', TypeError, global_variables={'Board':Board,'BoardColumn':BoardColumn})
-assert err.expect('Board([1,1,1,-1,-1,-1,1,-1])', IndexError, global_variables={'Board':Board})
-assert Board() == Board()
-assert Board([[1,1],[-1,-1]]) != Board()
-assert err.expect('Board() == 0', TypeError, global_variables={'Board':Board})
-assert repr(Board()) == 'Board(' + repr([BoardColumn()] * Board.width).replace(' ','') + ')'
-assert Board().full() == False
-assert Board([[1]]).full() == False
-assert Board([[1] * BoardColumn.height] * Board.width).full() == True
-assert Board().addToken(0) == Board([[-1]])
-assert Board([[-1]]).addToken(2,True) == Board([[-1],[],[1]])
+    def removeToken(self, col_i: int):
+        '''Takes back the top token of one indexed column, undoing addToken in constant time.
+                the Zobrist hash is restored with it; the VictoryState of the board before the move is the caller's to keep'''
+        if not isinstance(col_i, int):
+            raise TypeError('\'col_i\' must an integer, not a ' + repr(type(col_i)))
+        if col_i < 0:
+            raise IndexError('\'col_i\' must be greater than -1, not ' + repr(col_i))
+        if col_i >= self.geometry.width:
+            raise IndexError('\'col_i\' must be lesser than ' + repr(self.geometry.width) + ', not ' + repr(col_i))
+        if self.heights[col_i] == 0:
+            raise Exception('cannot remove token from empty column')
+        return self._lift(col_i)
+    def _lift(self, col_i: int):
+        '''Takes back the top token of one indexed column without checking the arguments or that the column has a token.
+                the kernel behind removeToken, so a search can make and unmake moves on one board instead of copying it'''
+        height = self.heights[col_i] - 1
+        bit_i = col_i * self.geometry.stride + height
+        bit = 1 << bit_i
+        if self.player_mask & bit:
+            self.player_mask ^= bit
+            self.zobrist ^= self.geometry.zobrist_keys[1][bit_i]
+            self.mirror_zobrist ^= self.geometry.zobrist_mirror_keys[1][bit_i]
+        else:
+            self.computer_mask ^= bit
+            self.zobrist ^= self.geometry.zobrist_keys[0][bit_i]
+            self.mirror_zobrist ^= self.geometry.zobrist_mirror_keys[0][bit_i]
+        self.heights[col_i] = height
+        return self
+    @staticmethod
+    def fromMasks(player_mask: int, computer_mask: int, geometry: Geometry = None):
+        '''Makes a board straight from a pair of masks, as stored in player_mask and computer_mask.'''
+        if not isinstance(player_mask, int):
+            raise TypeError('\'player_mask\' must be an integer, not a ' + repr(type(player_mask)))
+        if not isinstance(computer_mask, int):
+            raise TypeError('\'computer_mask\' must be an integer, not a ' + repr(type(computer_mask)))
+        if geometry is None:
+            geometry = Geometry.standard
+        elif not isinstance(geometry, Geometry):
+            raise TypeError('\'geometry\' must be a Geometry or None, not a ' + repr(type(geometry)))
+        if (player_mask | computer_mask) & ~geometry.full_mask:
+            raise ValueError('masks must only contain bits for spaces on the board')
+        if player_mask & computer_mask:
+            raise ValueError('masks must not both contain a token in the same space')
+        result = Board.__new__(Board)
+        result.geometry = geometry
+        result.player_mask = player_mask
+        result.computer_mask = computer_mask
+        mask = player_mask | computer_mask
+        result.heights = [(mask >> (i * geometry.stride) & ((1 << geometry.height) - 1)).bit_length() for i in range(geometry.width)]
+        result.zobrist = Board.hashMasks(player_mask, computer_mask, geometry)
+        result.mirror_zobrist = Board.hashMasks(geometry.mirror(player_mask), geometry.mirror(computer_mask), geometry)
+        return result
+    def key(self, player: bool = True) -> int:
+        '''Calculates a compact integer identifying this position from one side's point of view.
+                the side's tokens plus every token plus the bottom row puts one marker bit above each column's tokens
+                so keys are unique for boards without gaps and two boards with colours swapped share a key from opposite sides'''
+        if not isinstance(player, bool):
+            raise TypeError('\'player\' must be a boolean, not a ' + repr(type(player)))
+        if player:
+            own = self.player_mask
+        else:
+            own = self.computer_mask
+        return own + (self.player_mask | self.computer_mask) + self.geometry.bottom_mask
+    def mirror(self):
+        '''Makes the mirror image of this board, reflected across the center column.'''
+        return Board.fromMasks(self.geometry.mirror(self.player_mask), self.geometry.mirror(self.computer_mask), self.geometry)
+    def canonicalKey(self, player: bool = True) -> tuple:
+        '''Finds the smaller of the keys of this board and its mirror image from one side's point of view, and whether it is the mirror's.
+                a position and its mirror share a canonical key, so anything stored under it serves both;
+                moves stored with it must go through Geometry.mirrorMove when mirrored is True'''
+        key = self.key(player)
+        mirror_key = self.geometry.mirror(key)
+        if mirror_key < key:
+            return (mirror_key, True)
+        return (key, False)
+    def copy(self):
+        '''Makes a copy of this board.
+                the masks are immutable and shared, but the heights list is changed in place by moves, so the copy gets its own'''
+        result = Board.__new__(Board)
+        result.geometry = self.geometry
+        result.player_mask = self.player_mask
+        result.computer_mask = self.computer_mask
+        result.heights = self.heights.copy()
+        result.zobrist = self.zobrist
+        result.mirror_zobrist = self.mirror_zobrist
+        return result
+    def gapless(self) -> bool:
+        '''Tests that no column has an empty space below a token, as in every board reached by dropping tokens.'''
+        mask = self.player_mask | self.computer_mask
+        return (mask + self.geometry.bottom_mask) & mask == 0
+    def toBytes(self) -> bytes:
+        '''Encodes this board as the width, height and length of its geometry followed by its key from the player's side, little-endian.
+                10 bytes for the standard board, and fromBytes decodes it again'''
+        if not self.gapless():
+            raise ValueError('boards with an empty space below a token have no key to encode')
+        geometry = self.geometry
+        return bytes((geometry.width, geometry.height, geometry.length)) + self.key(True).to_bytes(geometry.key_bytes, 'little')
+    @staticmethod
+    def fromBytes(data: bytes):
+        '''Decodes a board encoded by toBytes.'''
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError('\'data\' must be bytes, not a ' + repr(type(data)))
+        if len(data) < 3:
+            raise ValueError('\'data\' is too short to hold a board')
+        geometry = Geometry.get(data[0], data[1], data[2])
+        if len(data) != 3 + geometry.key_bytes:
+            raise ValueError('\'data\' must be ' + repr(3 + geometry.key_bytes) + ' bytes long for a ' + repr(geometry) + ' board, not ' + repr(len(data)))
+        return Board.fromKey(int.from_bytes(data[3:], 'little'), True, geometry)
+    @staticmethod
+    def fromKey(key: int, player: bool = True, geometry: Geometry = None):
+        '''Makes the board a key from one side's point of view was calculated from, the inverse of key.
+                the highest bit of each column of a key is its marker bit, so the tokens are the bits below it'''
+        if not isinstance(key, int):
+            raise TypeError('\'key\' must be an integer, not a ' + repr(type(key)))
+        if not isinstance(player, bool):
+            raise TypeError('\'player\' must be a boolean, not a ' + repr(type(player)))
+        if geometry is None:
+            geometry = Geometry.standard
+        elif not isinstance(geometry, Geometry):
+            raise TypeError('\'geometry\' must be a Geometry or None, not a ' + repr(type(geometry)))
+        if key < 0 or key >> (geometry.width * geometry.stride):
+            raise ValueError('\'key\' must only contain bits for columns of the board')
+        markers = 0
+        col_i = 0
+        while col_i < geometry.width:
+            column = key >> (col_i * geometry.stride) & ((1 << geometry.stride) - 1)
+            if column == 0:
+                raise ValueError('\'key\' has no marker bit for column ' + repr(col_i))
+            markers |= 1 << (col_i * geometry.stride + column.bit_length() - 1)
+            col_i += 1
+        own = key - markers
+        other = (markers - geometry.bottom_mask) ^ own
+        if player:
+            return Board.fromMasks(own, other, geometry)
+        return Board.fromMasks(other, own, geometry)
+    @staticmethod
+    def fromMoves(moves, player_first: bool = True, geometry: Geometry = None):
+        '''Makes the board reached by dropping tokens into a sequence of columns from an empty board, taking turns.
+                moves may be a string of digits such as '3342', bytes, or a list of column indexes'''
+        if isinstance(moves, str):
+            if not moves.isdigit() and moves != '':
+                raise ValueError('a string of moves must only hold digits, not ' + repr(moves))
+            moves = [int(move) for move in moves]
+        elif not isinstance(moves, (bytes, bytearray, list, tuple)):
+            raise TypeError('\'moves\' must be a string, bytes or a list, not a ' + repr(type(moves)))
+        if not isinstance(player_first, bool):
+            raise TypeError('\'player_first\' must be a boolean, not a ' + repr(type(player_first)))
+        result = Board([], geometry)
+        player = player_first
+        for col_i in moves:
+            result.addToken(col_i, player)
+            player = not player
+        return result
 
 class VictoryState():
     '''An enumeration representing the victory condition of a connect-4 board.
@@ -219,8 +521,10 @@ class VictoryState():
             0 = stalemate
             -1 = computer victory
             -2 = no victory yet'''
-    length = 4 #number of tokens in a line a player must have to win (should be >2)
+    length = Geometry.standard.length #number of tokens in a line a player must have to win on the standard board, each board's own is in its geometry
+    directions = Geometry.standard.directions #bit offsets along vertical, horizontal, rising and falling lines on the standard board
     def __init__(self, state: (int, Board, list) = -2):
+        self.empty = None #number of empty spaces left on the board, if known
         if isinstance(state, int):
             if state > 1:
                 raise ValueError('if \'state\' is an integer, it must be lesser than 2, not ' + str(state))
@@ -234,21 +538,63 @@ class VictoryState():
             board = Board(state)
         else:
             board = state
+        self.empty = board.geometry.size - bin(board.player_mask | board.computer_mask).count('1')
         if self.win(board, True):
             self.state = 1
         elif self.win(board, False):
             self.state = -1
-        elif board.full():
+        elif self.empty == 0:
             self.state = 0
         else:
             self.state = -2
         return
+    @classmethod
+    def fromMove(cls, board: Board, col_i: int, row_i: int, previous = None):
+        '''Determines the victory condition of a board from the token just dropped at (col_i, row_i).
+                only lines through that token are checked
+                'previous' is the VictoryState from before the move, used to keep a running count of empty spaces'''
+        if not isinstance(board, Board):
+            raise TypeError('\'board\' must be a Board, not a ' + str(type(board)))
+        if not isinstance(previous, (VictoryState, type(None))):
+            raise TypeError('\'previous\' must be a VictoryState or None, not a ' + str(type(previous)))
+        if board.tokenAt(col_i, row_i) == 0:
+            raise ValueError('there is no token at (' + str(col_i) + ', ' + str(row_i) + ')')
+        return VictoryState._fromMove(board, col_i, row_i, previous)
+    @staticmethod
+    def _fromMove(board: Board, col_i: int, row_i: int, previous = None):
+        '''The kernel behind fromMove, without checking the arguments or that there is a token at (col_i, row_i).'''
+        geometry = board.geometry
+        result = VictoryState.__new__(VictoryState)
+        if previous is None or previous.empty is None:
+            result.empty = geometry.size - bin(board.player_mask | board.computer_mask).count('1')
+        else:
+            result.empty = previous.empty - 1
+        bit_i = col_i * geometry.stride + row_i
+        if board.player_mask >> bit_i & 1:
+            token = 1
+            mask = board.player_mask
+        else:
+            token = -1
+            mask = board.computer_mask
+        if geometry.connects(mask, bit_i):
+            result.state = token
+        elif result.empty == 0:
+            result.state = 0
+        else:
+            result.state = -2
+        return result
+    @staticmethod
+    def connects(mask: int, bit: int, geometry: Geometry = None) -> bool:
+        '''Tests whether the token at one bit of a side's mask is part of a winning line, using the geometry's table of lines through each space.'''
+        if geometry is None:
+            geometry = Geometry.standard
+        return geometry.connects(mask, bit.bit_length() - 1)
     def __eq__(self, other) -> bool:
         if not isinstance(other, VictoryState):
             raise TypeError('VictoryState instances must only be compared to other VictoryState instances, not ' + str(type(other)))
         return self.state == other.state
     def __repr__(self) -> str:
-        return 'VictoryState(' + self.state + ')'
+        return 'VictoryState(' + repr(self.state) + ')'
     def win(self, board: Board, player: bool = False) -> bool:
         '''Determines whether the player/computer has won.'''
         if not isinstance(board, Board):
@@ -256,17 +602,18 @@ class VictoryState():
         if not isinstance(player, bool):
             raise TypeError('\'player\' must be a boolean, not a ' + str(type(board)))
         if player:
-            target = BoardPos(1)
+            mask = board.player_mask
         else:
-            target = BoardPos(-1)
-        i = 0
-        while i < Board.width:
-            j = 0
-            while j < BoardColumn.height:
-                if self.search(board, i, j, target):
-                    return True
-                j += 1
-            i += 1
+            mask = board.computer_mask
+        length = board.geometry.length
+        for direction in board.geometry.directions:
+            line = mask
+            i = 1
+            while i < length and line:
+                line &= mask >> (direction * i)
+                i += 1
+            if line:
+                return True
         return False
     def search(self, board: Board, x: int, y: int, target: BoardPos) -> bool:
         '''Searches for a line of tokens matching the target on the board.
@@ -279,18 +626,12 @@ class VictoryState():
             raise TypeError('\'y\' must be an integer, not a ' + str(type(y)))
         if not isinstance(target, BoardPos):
             raise TypeError('\'target\' must be a BoardPos, not a ' + str(type(target)))
-        if not isinstance(VictoryState.length, int):
-            raise TypeError('\'VictoryState.length\' must be an integer, not a ' + str(type(Victorystate.length)))
-        if VictoryState.length > Board.width:
-            raise ValueError('\'VictoryState.length\' must be lesser than \'Board.width\' which is ' + str(Board.width) + ', not ' + str(VictoryState.length))
-        if VictoryState.length > BoardColumn.height:
-            raise ValueError('\'VictoryState.length\' must be lesser than \'BoardColumn.width\' which is ' + str(BoardColumn.height) + ', not ' + str(VictoryState.length))
         #(up-right, center-right, down-right, up-center, down-center, up-left, center-left, down-left)
         mods_x = (1,1,1,0,0,-1,-1,-1) #sequence of x modifiers (length should = mods_y length)
         mods_y = (1,0,-1,1,-1,1,0,-1) #sequence of y modifiers (length should = mods_x length
         i = 0
         while i < len(mods_x):
-            if self.line_search(board, x, y, target, mods_x[i], mods_y[i]):
+            if VictoryState._line(board, x, y, target.state, mods_x[i], mods_y[i], board.geometry.length):
                 return True
             i += 1 
         return False
@@ -313,98 +654,165 @@ class VictoryState():
             raise TypeError('\'length\' must be an integer, not a ' + str(type(length)))
         if length < 1:
             raise ValueError('\'length\' must be greater than 0, not ' + str(length))
-        try:
-            if board.columns[x].items[y] != target:
+        return VictoryState._line(board, x, y, target.state, mod_x, mod_y, length)
+    @staticmethod
+    def _line(board: Board, x: int, y: int, token: int, mod_x: int, mod_y: int, length: int) -> bool:
+        '''The kernel behind line_search, walking the line with a loop on the masks instead of checked recursive calls.'''
+        if token == 1:
+            mask = board.player_mask
+        elif token == -1:
+            mask = board.computer_mask
+        else:
+            mask = ~(board.player_mask | board.computer_mask) & board.geometry.full_mask
+        geometry = board.geometry
+        while length > 0:
+            if x < 0 or x >= geometry.width or y < 0 or y >= geometry.height or not mask >> (x * geometry.stride + y) & 1:
                 return False
-            elif length == 1:
-                return True
-            else:
-                return self.line_search(board, x + mod_x, y + mod_y, target, mod_x, mod_y, length - 1)
-        except IndexError:
-            return False
-        except:
-            raise
-assert VictoryState(1).state == 1
-assert err.expect('VictoryState(\'a\')', TypeError, global_variables={'VictoryState':VictoryState})
-assert err.expect('VictoryState(2)', ValueError, global_variables={'VictoryState':VictoryState})
-assert VictoryState(-2) == VictoryState(-2)
-assert err.expect('VictoryState(0)==0', TypeError, global_variables={'VictoryState':VictoryState})
-assert VictoryState(Board([[1] * 4])) == VictoryState(1)
-assert VictoryState(Board([[-1]] * 4)) == VictoryState(-1)
-assert VictoryState(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]])) == VictoryState(1)
-assert VictoryState(Board([[-1,-1,-1,1],[-1,-1,1],[-1,1],[1]])) == VictoryState(1)
-if __debug__:
-    x = Board()
-    i = 0
-    while i < Board.width:
-        while True:
-            try:
-                j = 1
-                if i % 2 == 0:
-                    while j < VictoryState.length:
-                        x.addToken(i,True)
-                        j += 1
-                j = 1
-                while j < VictoryState.length:
-                    x.addToken(i,False)
-                    j += 1
-                if i % 2 != 0:
-                    j = 1
-                    while j < VictoryState.length:
-                        x.addToken(i,True)
-                        j += 1
-            except:
-                break
-        i += 1
-assert VictoryState(x) == VictoryState(0)
-del x
-assert VictoryState(Board()) == VictoryState(-2)
+            x += mod_x
+            y += mod_y
+            length -= 1
+        return True
 
 class DecisionNode():
-    '''A single node of the game state tree.'''
-    def __init__(self, board: Board, player_turn: bool = False):
+    '''A single node of the game state tree.
+            children are only built when first visited through traverse or dependents, each on its own copy of the board
+            nodes given a TranspositionTable share it with their children, so a position reached by different move orders is built once'''
+    def __init__(self, board: Board, player_turn: bool = False, state: VictoryState = None, table: transposition.TranspositionTable = None):
         if not isinstance(board, Board):
             raise TypeError('\'board\' must be a Board, not a ' + str(type(board)))
         if not isinstance(player_turn, bool):
             raise TypeError('\'player_turn\' must be a boolean, not a ' + str(type(player_turn)))
+        if not isinstance(state, (VictoryState, type(None))):
+            raise TypeError('\'state\' must be a VictoryState or None, not a ' + str(type(state)))
+        if not isinstance(table, (transposition.TranspositionTable, type(None))):
+            raise TypeError('\'table\' must be a TranspositionTable or None, not a ' + str(type(table)))
         self.board = board
         self.player_turn = player_turn
-        self.state = VictoryState(board)
+        if state is None:
+            state = VictoryState(board)
+        self.state = state
+        self.table = table
+        self.children = {} #children built so far, keyed by column index
+        return
+    @staticmethod
+    def _make(board: Board, player_turn: bool, state: VictoryState, table: transposition.TranspositionTable):
+        '''Builds a node without checking the arguments, for children whose board and state traverse has just made.'''
+        result = DecisionNode.__new__(DecisionNode)
+        result.board = board
+        result.player_turn = player_turn
+        result.state = state
+        result.table = table
+        result.children = {}
+        return result
+    @property
+    def key(self) -> int:
+        '''Zobrist hash of this node's board and turn.'''
+        if self.player_turn:
+            return self.board.zobrist ^ self.board.geometry.zobrist_turn
+        return self.board.zobrist
+    @property
+    def dependents(self) -> dict:
+        '''Every child of this node keyed by the string of its column index, building any not yet visited.'''
         dependents = []
-        if self.state == VictoryState(-2):
+        if self.state.state == -2:
             i = 0
-            while i < Board.width:
-                try:
-                    dependent = DecisionNode(board.addToken(i, player_turn), not player_turn)
-                    dependents.append((str(i),dependent))
-                except Exception:
-                    pass
+            while i < self.board.geometry.width:
+                if self.board.heights[i] < self.board.geometry.height:
+                    dependents.append((str(i), self.traverse(i)))
                 i += 1
-        self.dependents = dict(dependents)
-        return
+        return dict(dependents)
     def __eq__(self, other) -> bool:
         if not isinstance(other, DecisionNode):
             raise TypeError('DecisionNode instances must only be compared to other DecisionNode instances or None, not ' + str(type(other)))
-        return self.board == other.board and self.player_turn == other.player_turn and self.state == other.state and self.dependents == other.dependents
+        #the children follow from the board and turn, so comparing them would only expand both trees
+        return self.board == other.board and self.player_turn == other.player_turn and self.state == other.state
+    def __hash__(self) -> int:
+        return self.key
     def __repr__(self) -> str:
         return 'DecisionNode(' + repr(self.board) + ',' + repr(self.player_turn) + ')'
-    def traverse(col_i: int):
+    def traverse(self, col_i: int):
+        '''Finds the child reached by dropping a token into one indexed column, building it if needed.'''
         if not isinstance(col_i, int):
             raise TypeError('\'col_i\' must be an integer, not a ' + str(type(col_i)))
         if col_i < 0:
             raise IndexError('\'col_i\' must be greater than -1, not ' + str(col_i))
-        if coll_i >= len(self.dependents):
-            raise IndexError('\'col_i\' must be lesser than \'len(self.dependents\' which is ' + str(len(self.dependents)) + ', not ' + str(col_i))
-        return self.dependents[col_i]
-assert DecisionNode(Board([[1,-1],[1,-1]])) == DecisionNode(Board([[1,-1],[1,-1]]))
-assert err.expect('DecisionNode(0)', TypeError, global_variables={'DecisionNode':DecisionNode})
-assert err.expect('DecisionNode(Board(),1)', TypeError, global_variables={'DecisionNode':DecisionNode,'Board':Board})
+        if col_i >= self.board.geometry.width:
+            raise IndexError('\'col_i\' must be lesser than ' + str(self.board.geometry.width) + ', not ' + str(col_i))
+        child = self.children.get(col_i)
+        if child is None:
+            if self.state.state != -2:
+                raise ValueError('cannot add token after the game has ended')
+            if self.board.heights[col_i] >= self.board.geometry.height:
+                raise Exception('cannot add token to full column')
+            board = Board._play(self.board.copy(), col_i, self.player_turn)
+            if self.table is not None:
+                key = board.zobrist
+                if not self.player_turn:
+                    key ^= board.geometry.zobrist_turn
+                child = self.table.get(key)
+                if child is not None and child.board == board and child.player_turn != self.player_turn:
+                    self.children[col_i] = child
+                    return child
+            child = DecisionNode._new(board, not self.player_turn, VictoryState._next(board, col_i, board.heights[col_i] - 1, self.state), self.table)
+            if self.table is not None:
+                self.table.put(key, child, child.state.empty)
+            self.children[col_i] = child
+        return child
+
+def packMoves(moves) -> bytes:
+    '''Packs a sequence of column indexes two to a byte, the earlier move in the low half, with an odd count padded by 15.
+            so the columns must be lesser than 15'''
+    if not isinstance(moves, (bytes, bytearray, list, tuple)):
+        raise TypeError('\'moves\' must be bytes or a list, not a ' + str(type(moves)))
+    result = bytearray((len(moves) + 1) // 2)
+    i = 0
+    for col_i in moves:
+        if not isinstance(col_i, int):
+            raise TypeError('\'moves\' must only hold integers, not a ' + str(type(col_i)))
+        if col_i < 0 or col_i > 14:
+            raise ValueError('\'moves\' must only hold columns from 0 to 14, not ' + str(col_i))
+        result[i >> 1] |= col_i << (4 * (i & 1))
+        i += 1
+    if i & 1:
+        result[-1] |= 0xF0
+    return bytes(result)
+
+def unpackMoves(data: bytes) -> bytes:
+    '''Unpacks moves packed by packMoves into bytes holding one column index each, as self-play records store them.'''
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise TypeError('\'data\' must be bytes, not a ' + str(type(data)))
+    result = bytearray(2 * len(data))
+    result[0::2] = bytes(byte & 0xF for byte in data)
+    result[1::2] = bytes(byte >> 4 for byte in data)
+    if result and result[-1] == 0xF:
+        del result[-1]
+    return bytes(result)
+
+def setChecked(checked: bool):
+    '''Chooses whether internal calls go through the validated entry points (addToken, fromMove, DecisionNode) or straight to the unchecked kernels.
+            Board._play, Board._unplay, VictoryState._next and DecisionNode._new are the names internal callers use, so switching costs nothing per call'''
+    global CHECKED
+    if not isinstance(checked, bool):
+        raise TypeError('\'checked\' must be a boolean, not a ' + str(type(checked)))
+    CHECKED = checked
+    if checked:
+        Board._play = Board.addToken
+        Board._unplay = Board.removeToken
+        VictoryState._next = VictoryState.fromMove
+        DecisionNode._new = DecisionNode
+    else:
+        Board._play = Board._place
+        Board._unplay = Board._lift
+        VictoryState._next = VictoryState._fromMove
+        DecisionNode._new = DecisionNode._make
+    return
+setChecked(CHECKED)
 
 class RootNode():
     '''The root node of the game state tree.'''
-    def __init__(self):
-        self.player = DecisionNode(Board(), True)
-        self.computer = DecisionNode(Board(), False)
+    def __init__(self, table: transposition.TranspositionTable = None, geometry: Geometry = None):
+        self.player = DecisionNode(Board([], geometry), True, None, table)
+        self.computer = DecisionNode(Board([], geometry), False, None, table)
         return
     def __eq__(self, other) -> bool:
         if not isinstance(other, RootNode):
@@ -419,7 +827,194 @@ class RootNode():
             return self.player
         else:
             return self.computer
-assert RootNode() == RootNode()
-assert repr(RootNode()) == 'RootNode()'
-assert RootNode().traverse(True) == RootNode().player
-assert RootNode().traverse(False) == RootNode().computer
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    import pickle
+    assert BoardPos().state == 0
+    assert err.expect('BoardPos(\'0\')', TypeError, global_variables={'BoardPos':BoardPos})
+    assert err.expect('BoardPos(2)', ValueError, global_variables={'BoardPos':BoardPos})
+    assert err.expect('BoardPos(-2)', ValueError, global_variables={'BoardPos':BoardPos})
+    assert BoardPos() == BoardPos()
+    assert err.expect('BoardPos() == 0', TypeError, global_variables={'BoardPos':BoardPos})
+    assert repr(BoardPos()) == 'BoardPos(0)'
+    assert str(BoardPos()) == BoardPos.empty_symbol
+    assert str(BoardPos(1)) == BoardPos.player_symbol
+    assert str(BoardPos(-1)) == BoardPos.computer_symbol
+    assert BoardPos().full() == False
+    assert BoardPos(1).full() == True
+    assert BoardPos(-1).full() == True
+    assert BoardPos().capture().state == -1
+    assert BoardPos().capture(True).state == 1
+    assert err.expect('BoardPos(1).capture()', Exception, global_variables={'BoardPos':BoardPos})
+    assert len(BoardColumn().items) == BoardColumn.height
+    assert BoardColumn().items == tuple([BoardPos()] * BoardColumn.height)
+    assert BoardColumn([1,1,1,-1]).items == (BoardPos(1),BoardPos(1),BoardPos(1),BoardPos(-1),BoardPos(),BoardPos())
+    assert err.expect('BoardColumn(0)', TypeError, global_variables={'BoardColumn':BoardColumn})
+    assert err.expect('BoardColumn(' + repr([0] * (BoardColumn.height + 1)) + ')', IndexError, global_variables={'BoardColumn':BoardColumn})
+    assert BoardColumn() == BoardColumn()
+    assert err.expect('BoardColumn() == 0', TypeError, global_variables={'BoardColumn':BoardColumn,'BoardPos':BoardPos})
+    assert BoardColumn() != BoardColumn([1])
+    assert repr(BoardColumn()) == 'BoardColumn(' + repr([BoardPos(0)] * BoardColumn.height).replace(' ','') + ')'
+    assert str(BoardColumn([1,-1,1])) == BoardPos.player_symbol + BoardPos.computer_symbol + BoardPos.player_symbol + BoardPos.empty_symbol + BoardPos.empty_symbol + BoardPos.empty_symbol
+    assert BoardColumn([1]).full() == False
+    assert BoardColumn([1,1,1,-1,-1,-1]).full() == True
+    assert BoardColumn().addToken() == BoardColumn([-1])
+    assert BoardColumn([-1,1]).addToken(True) == BoardColumn([-1,1,1])
+    assert err.expect('BoardColumn([1,1,1,-1,-1,-1]).addToken()', Exception, global_variables={'BoardColumn':BoardColumn,'BoardPos':BoardPos})
+    assert Board().columns == tuple([BoardColumn()] * Board.width)
+    assert Board([[1,1],[-1,-1]]).columns == (BoardColumn([1,1]),BoardColumn([-1,-1]),BoardColumn(),BoardColumn(),BoardColumn(),BoardColumn(),BoardColumn())
+    assert err.expect('Board(1)', TypeError, global_variables={'Board':Board})
+    assert err.expect('Board([1,-1])', TypeError, global_variables={'Board':Board,'BoardColumn':BoardColumn})
+    assert err.expect('Board([1,1,1,-1,-1,-1,1,-1])', IndexError, global_variables={'Board':Board})
+    assert Board() == Board()
+    assert Board([[1,1],[-1,-1]]) != Board()
+    assert err.expect('Board() == 0', TypeError, global_variables={'Board':Board})
+    assert repr(Board()) == 'Board(' + repr([BoardColumn()] * Board.width).replace(' ','') + ')'
+    assert str(Board([[1],[-1]])).endswith(Board.sep + BoardPos.player_symbol + Board.sep + BoardPos.computer_symbol + (Board.sep + BoardPos.empty_symbol) * (Board.width - 2) + Board.sep + '\n')
+    assert Board([[0,1]]).heights[0] == 2
+    assert Board([[1,-1]]).tokenAt(0,1) == -1
+    assert err.expect('Board().tokenAt(-1,0)', IndexError, global_variables={'Board':Board})
+    assert Board().full() == False
+    assert Board([[1]]).full() == False
+    assert Board([[1] * BoardColumn.height] * Board.width).full() == True
+    assert Board().addToken(0) == Board([[-1]])
+    assert Board([[-1]]).addToken(2,True) == Board([[-1],[],[1]])
+    assert Board([[1]]).copy() == Board([[1]])
+    assert hash(Board()) == 0
+    assert hash(Board([[1,-1],[-1]])) == hash(Board([[1],[-1]]).addToken(0))
+    assert hash(Board([[1],[-1]])) != hash(Board([[-1],[1]]))
+    assert len({Board([[1]]), Board([[1]]), Board([[-1]])}) == 2
+    assert Board().key() == Board.bottom_mask
+    assert Board.fromMasks(Board([[1,-1],[],[0,-1]]).player_mask, Board([[1,-1],[],[0,-1]]).computer_mask).heights == Board([[1,-1],[],[0,-1]]).heights
+    assert hash(Board.fromMasks(Board([[1,-1]]).player_mask, Board([[1,-1]]).computer_mask)) == hash(Board([[1,-1]]))
+    assert err.expect('Board.fromMasks(1, 1)', ValueError, global_variables={'Board':Board})
+    assert Board([[1,-1]]).key(True) == Board([[-1,1]]).key(False)
+    assert Board([[1,-1]]).key(True) != Board([[-1,1]]).key(True)
+    assert Board([[1,-1]]).key() < 1 << (Board.width * Board.stride)
+    x = Board([[1]])
+    assert x.copy().addToken(0) != x
+    del x
+    assert err.expect('Board([[1] * BoardColumn.height]).addToken(0)', Exception, global_variables={'Board':Board,'BoardColumn':BoardColumn})
+    x = Board([[1,-1],[],[-1]])
+    assert x.copy().addToken(1, True).removeToken(1) == x and hash(x.copy().addToken(0).removeToken(0)) == hash(x)
+    assert x.copy().removeToken(0) == Board([[1],[],[-1]]) and x.copy()._lift(2).heights == [2, 0, 0] + [0] * (Board.width - 3)
+    assert err.expect('Board().removeToken(0)', Exception, global_variables={'Board':Board})
+    assert err.expect('Board().removeToken(-1)', IndexError, global_variables={'Board':Board})
+    del x
+    x = Board.fromMoves('0012')
+    assert x.mirror() == Board.fromMoves('6654') and x.mirror().mirror() == x and x.mirror().zobrist == x.mirror_zobrist
+    assert x.copy().addToken(3).removeToken(0).mirror_zobrist == Board.fromMoves('0213').mirror().zobrist and Board.fromMoves('0123').mirror_zobrist == Board.fromMoves('6543').zobrist
+    assert x.canonicalKey(True)[0] == x.mirror().canonicalKey(True)[0] and x.canonicalKey(True)[1] != x.mirror().canonicalKey(True)[1]
+    assert Board.fromMoves('33').canonicalKey(False) == (Board.fromMoves('33').key(False), False)
+    assert Geometry.standard.mirror(Geometry.standard.full_mask) == Geometry.standard.full_mask and Geometry.standard.mirrorMove(Geometry.standard.mirrorMove(1)) == 1 == Geometry.standard.mirrorMove(5)
+    assert Board.fromMoves('014', True, Geometry.get(5, 4, 3)).mirror() == Board.fromMoves('430', True, Geometry.get(5, 4, 3))
+    del x
+    assert VictoryState(1).state == 1
+    assert err.expect('VictoryState(\'a\')', TypeError, global_variables={'VictoryState':VictoryState})
+    assert err.expect('VictoryState(2)', ValueError, global_variables={'VictoryState':VictoryState})
+    assert VictoryState(-2) == VictoryState(-2)
+    assert err.expect('VictoryState(0)==0', TypeError, global_variables={'VictoryState':VictoryState})
+    assert VictoryState(Board([[1] * 4])) == VictoryState(1)
+    assert VictoryState(Board([[-1]] * 4)) == VictoryState(-1)
+    assert VictoryState(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]])) == VictoryState(1)
+    assert VictoryState(Board([[-1,-1,-1,1],[-1,-1,1],[-1,1],[1]])) == VictoryState(1)
+    x = Board()
+    i = 0
+    while i < Board.width:
+        while True:
+            try:
+                j = 1
+                if i % 2 == 0:
+                    while j < VictoryState.length:
+                        x.addToken(i,True)
+                        j += 1
+                j = 1
+                while j < VictoryState.length:
+                    x.addToken(i,False)
+                    j += 1
+                if i % 2 != 0:
+                    j = 1
+                    while j < VictoryState.length:
+                        x.addToken(i,True)
+                        j += 1
+            except:
+                break
+        i += 1
+    assert VictoryState(x) == VictoryState(0)
+    del x
+    assert VictoryState(Board()) == VictoryState(-2)
+    assert VictoryState(Board()).empty == Board.width * BoardColumn.height
+    assert VictoryState.fromMove(Board([[1] * 4]), 0, 3) == VictoryState(1)
+    assert VictoryState.fromMove(Board([[1] * 3, [-1]]), 0, 2) == VictoryState(-2)
+    assert VictoryState.fromMove(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]]), 1, 1) == VictoryState(1)
+    assert VictoryState.fromMove(Board([[1],[-1]]), 1, 0, VictoryState(Board([[1]]))).empty == Board.width * BoardColumn.height - 2
+    assert err.expect('VictoryState.fromMove(Board(), 0, 0)', ValueError, global_variables={'VictoryState':VictoryState,'Board':Board})
+    assert repr(VictoryState(0)) == 'VictoryState(0)'
+    assert VictoryState.connects(Board([[],[1],[1],[1],[1]]).player_mask, 1 << (2 * Board.stride))
+    assert not VictoryState.connects(Board([[],[1],[1],[],[1]]).player_mask, 1 << (2 * Board.stride))
+    assert VictoryState._fromMove(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]]), 1, 1) == VictoryState.fromMove(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]]), 1, 1)
+    assert VictoryState().search(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1,1]]), 0, 0, BoardPos(1))
+    assert not VictoryState().search(Board([[1],[-1,1],[-1,-1,1],[-1,-1,-1]]), 0, 0, BoardPos(1))
+    assert Board()._place(2, True) == Board().addToken(2, True)
+    assert DecisionNode(Board([[1,-1],[1,-1]])) == DecisionNode(Board([[1,-1],[1,-1]]))
+    assert err.expect('DecisionNode(0)', TypeError, global_variables={'DecisionNode':DecisionNode})
+    assert err.expect('DecisionNode(Board(),1)', TypeError, global_variables={'DecisionNode':DecisionNode,'Board':Board})
+    assert DecisionNode(Board()).children == {}
+    assert DecisionNode(Board()).traverse(3) == DecisionNode(Board([[],[],[],[-1]]), True)
+    assert DecisionNode(Board()).traverse(3).board != DecisionNode(Board()).traverse(4).board
+    assert list(DecisionNode(Board()).dependents) == [str(i) for i in range(Board.width)]
+    assert DecisionNode(Board([[1] * 4])).dependents == {}
+    assert err.expect('DecisionNode(Board()).traverse(' + str(Board.width) + ')', IndexError, global_variables={'DecisionNode':DecisionNode,'Board':Board})
+    assert hash(DecisionNode(Board(), True)) != hash(DecisionNode(Board(), False))
+    x = DecisionNode(Board(), False, None, transposition.TranspositionTable())
+    assert x.traverse(0).traverse(1).traverse(2) is x.traverse(2).traverse(1).traverse(0)
+    assert x.traverse(0).traverse(1) is not x.traverse(1).traverse(0)
+    assert x.table.hits == 1
+    del x
+    assert err.expect('DecisionNode(Board([[1] * 4])).traverse(1)', ValueError, global_variables={'DecisionNode':DecisionNode,'Board':Board})
+    assert err.expect('DecisionNode(Board([[1,-1] * (BoardColumn.height // 2)])).traverse(0)', Exception, global_variables={'DecisionNode':DecisionNode,'Board':Board,'BoardColumn':BoardColumn})
+    checked = CHECKED
+    setChecked(True)
+    assert Board._play is Board.addToken and Board._unplay is Board.removeToken and DecisionNode(Board()).traverse(3) == DecisionNode(Board([[],[],[],[-1]]), True)
+    setChecked(False)
+    assert Board._play is Board._place and Board._unplay is Board._lift and DecisionNode(Board()).traverse(3) == DecisionNode(Board([[],[],[],[-1]]), True)
+    setChecked(checked)
+    del checked
+    assert RootNode() == RootNode()
+    assert repr(RootNode()) == 'RootNode()'
+    assert RootNode().traverse(True) == RootNode().player
+    assert RootNode().traverse(False) == RootNode().computer
+    x = Board.fromMoves('3342')
+    assert x == Board([[],[],[-1],[1,-1],[1]]) and Board.fromMoves([3,3,4,2]) == x and Board.fromMoves(b'\x03\x03\x04\x02') == x
+    assert len(x.toBytes()) == 10 and Board.fromBytes(x.toBytes()) == x
+    assert Board.fromKey(x.key(False), False) == x and Board.fromKey(Board().key()) == Board()
+    assert not Board([[0,1]]).gapless() and err.expect('Board([[0,1]]).toBytes()', ValueError, global_variables={'Board':Board})
+    assert err.expect('Board.fromKey(0)', ValueError, global_variables={'Board':Board})
+    assert err.expect('Board.fromMoves("3x")', ValueError, global_variables={'Board':Board})
+    assert {x:1}[Board.fromMoves('3342')] == 1
+    x = Board.fromMoves('01234567', False, Geometry.get(8, 7, 5))
+    assert Board.fromBytes(x.toBytes()) == x and Board.fromBytes(x.toBytes()).geometry is x.geometry
+    del x
+    assert packMoves([3,3,4]) == bytes((0x33, 0xF4)) and unpackMoves(packMoves([3,3,4])) == bytes((3,3,4))
+    assert unpackMoves(packMoves([])) == b'' and unpackMoves(packMoves([0,6])) == bytes((0,6))
+    assert err.expect('packMoves([15])', ValueError, global_variables={'packMoves':packMoves})
+    assert len(Geometry.standard.lines) == 69
+    assert Geometry.get(7, 6, 4) is Geometry.standard and Geometry.get(8, 7, 5) is Geometry.get(8, 7, 5)
+    assert max(len(item) for item in Geometry.standard.cell_lines) == 13
+    assert err.expect('Geometry(3, 3, 4)', ValueError, global_variables={'Geometry':Geometry})
+    assert pickle.loads(pickle.dumps(Geometry.get(8, 7, 5))) is Geometry.get(8, 7, 5)
+    x = Geometry.get(8, 7, 5)
+    assert Board([[1] * 4], x) != Board([[1] * 4])
+    assert VictoryState(Board([[1] * 4], x)) == VictoryState(-2) and VictoryState(Board([[1] * 5], x)) == VictoryState(1)
+    assert VictoryState.fromMove(Board([[1],[1],[1],[1],[1]], x), 4, 0) == VictoryState(1)
+    assert VictoryState(Board([], x)).empty == 56
+    assert list(RootNode(None, x).player.dependents) == [str(i) for i in range(8)]
+    assert RootNode(None, x).player.traverse(7).traverse(7).board == Board([[]] * 7 + [[1,-1]], x)
+    assert Board.fromMasks(Board([[1,-1]], x).player_mask, Board([[1,-1]], x).computer_mask, x) == Board([[1,-1]], x)
+    assert repr(Board([[1]], Geometry.get(2, 1, 2))) == 'Board([BoardColumn([BoardPos(1)]),BoardColumn([BoardPos(0)])],Geometry(2,1,2))'
+    assert err.expect('Board([BoardColumn()], Geometry.get(8, 7, 5))', ValueError, global_variables={'Board':Board,'BoardColumn':BoardColumn,'Geometry':Geometry})
+    del x
+
+if __name__ == '__main__':
+    selfcheck()
@@ -0,0 +1,249 @@
+import time
+import threading
+import concurrent.futures
+import numpy as np
+import game_state_tree as gtree
+import mcts
+from extended_debug import error_test as err
+
+class Batch():
+    '''The preallocated arrays of one batch of leaves: two masks per leaf, and the buffer they are decoded into.'''
+    def __init__(self, size: int, geometry: gtree.Geometry):
+        self.own = np.zeros(size, dtype = np.uint64) #mask of the side to move at each leaf
+        self.other = np.zeros(size, dtype = np.uint64) #mask of the other side
+        self.buffer = np.zeros((size, geometry.height, geometry.width), dtype = np.int8) #contiguous BoardPos states from the side to move, row 0 at the bottom
+        self.futures = [] #Future of each leaf added so far, in order
+        self.started = None #perf_counter time the first leaf was added
+        return
+    def __repr__(self) -> str:
+        return 'Batch(' + str(len(self.own)) + ',' + str(len(self.futures)) + ')'
+
+class LeafQueue():
+    '''Gathers leaf positions waiting for a learned evaluator and scores them in batches, with one call per batch.
+            evaluate_batch takes an (N, height, width) int8 array of BoardPos states from the side to move, 1 for its tokens and -1 for the other side's,
+            and returns N scores for the side to move between -1 and 1; the array is a view of a reused buffer, so copy it to keep it
+            adding a leaf writes just its two masks into preallocated arrays, and the batch is decoded into the buffer in one go before the call
+            a batch is scored when it is full, when flush is called, or once its first leaf has waited max_wait_ms in evaluate
+            larger batches and longer waits give the evaluator more leaves per call, at the cost of the time each leaf waits for its score
+            any number of threads, such as concurrent games, may share a queue'''
+    BATCH_SIZE = 64
+    MAX_WAIT_MS = 2.0
+    def __init__(self, evaluate_batch, batch_size: int = None, max_wait_ms: float = None, geometry: gtree.Geometry = None):
+        if batch_size is None:
+            batch_size = LeafQueue.BATCH_SIZE
+        if max_wait_ms is None:
+            max_wait_ms = LeafQueue.MAX_WAIT_MS
+        if geometry is None:
+            geometry = gtree.Geometry.standard
+        if not callable(evaluate_batch):
+            raise TypeError('\'evaluate_batch\' must be callable, not a ' + str(type(evaluate_batch)))
+        if not isinstance(batch_size, int):
+            raise TypeError('\'batch_size\' must be an integer, not a ' + str(type(batch_size)))
+        if not isinstance(max_wait_ms, (int, float)):
+            raise TypeError('\'max_wait_ms\' must be a number, not a ' + str(type(max_wait_ms)))
+        if not isinstance(geometry, gtree.Geometry):
+            raise TypeError('\'geometry\' must be a Geometry or None, not a ' + str(type(geometry)))
+        if batch_size < 1:
+            raise ValueError('\'batch_size\' must be greater than 0, not ' + str(batch_size))
+        if max_wait_ms < 0:
+            raise ValueError('\'max_wait_ms\' must not be negative, not ' + str(max_wait_ms))
+        if geometry.width * geometry.stride > 64:
+            raise ValueError('boards of ' + repr(geometry) + ' do not fit the 64-bit masks of a batch')
+        self.evaluate_batch = evaluate_batch
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.geometry = geometry
+        #bit index of each space, laid out like the buffer
+        self.bit_index = np.array([[col_i * geometry.stride + row_i for col_i in range(geometry.width)] for row_i in range(geometry.height)], dtype = np.int64)
+        self.lock = threading.Lock()
+        self.batch = Batch(batch_size, geometry) #batch being filled
+        self.spare = [] #batches already scored, ready to be filled again
+        self.batches = 0
+        self.leaves = 0
+        self.full_batches = 0 #batches scored because they were full rather than flushed early
+        self.evaluate_seconds = 0.0 #time spent decoding batches and in evaluate_batch
+        return
+    def __repr__(self) -> str:
+        return 'LeafQueue(' + repr(self.evaluate_batch) + ',' + repr(self.batch_size) + ',' + repr(self.max_wait_ms) + ',' + repr(self.geometry) + ')'
+    def submit(self, board: gtree.Board, player_turn: bool) -> concurrent.futures.Future:
+        '''Adds the side to move on a board to the batch, returning a Future of its score.
+                the batch is scored at once if this fills it; otherwise the score waits for a later flush'''
+        return self.add(board, player_turn)[0]
+    def add(self, board: gtree.Board, player_turn: bool) -> tuple:
+        '''Adds the side to move on a board to the batch, scoring the batch if this fills it, and returns (Future of the score, Batch it joined).'''
+        if board.geometry is not self.geometry:
+            raise ValueError('\'board\' must be of ' + repr(self.geometry) + ', not ' + repr(board.geometry))
+        future = concurrent.futures.Future()
+        with self.lock:
+            batch = self.batch
+            leaf_i = len(batch.futures)
+            if player_turn:
+                batch.own[leaf_i] = board.player_mask
+                batch.other[leaf_i] = board.computer_mask
+            else:
+                batch.own[leaf_i] = board.computer_mask
+                batch.other[leaf_i] = board.player_mask
+            if leaf_i == 0:
+                batch.started = time.perf_counter()
+            batch.futures.append(future)
+            full = leaf_i + 1 == self.batch_size
+            if full:
+                self.full_batches += 1
+                self.batch = self.spare.pop() if self.spare else Batch(self.batch_size, self.geometry)
+        if full:
+            self.run(batch)
+        return (future, batch)
+    def evaluate(self, board: gtree.Board, player_turn: bool) -> float:
+        '''Scores the side to move on a board as part of a batch, blocking until the batch is scored.
+                the batch is flushed by whichever waiting thread first finds it has waited max_wait_ms'''
+        future, batch = self.add(board, player_turn)
+        with self.lock:
+            started = batch.started
+        if not future.done():
+            try:
+                return future.result(max(0.0, started + self.max_wait_ms / 1000 - time.perf_counter()))
+            except concurrent.futures.TimeoutError:
+                self.flush(batch)
+        return future.result()
+    def flush(self, batch: Batch = None):
+        '''Scores the batch being filled, however few leaves it holds.
+                given a batch, only scores it if it is still being filled, as another thread may already have taken it'''
+        with self.lock:
+            if (batch is not None and batch is not self.batch) or not self.batch.futures:
+                return
+            batch = self.batch
+            self.batch = self.spare.pop() if self.spare else Batch(self.batch_size, self.geometry)
+        self.run(batch)
+        return
+    def run(self, batch: Batch):
+        '''Decodes a batch taken from the queue into its buffer, calls evaluate_batch once, and hands each leaf its score.'''
+        start = time.perf_counter()
+        count = len(batch.futures)
+        buffer = batch.buffer[:count]
+        #viewed as signed, a mask with its top bit set still gives the right bits, and the difference of two bits fits an int8
+        bit_index = self.bit_index[None]
+        own = batch.own[:count, None, None].view(np.int64)
+        other = batch.other[:count, None, None].view(np.int64)
+        np.subtract(np.right_shift(own, bit_index) & 1, np.right_shift(other, bit_index) & 1, out = buffer, casting = 'same_kind')
+        try:
+            scores = np.asarray(self.evaluate_batch(buffer), dtype = np.float64)
+            if scores.shape != (count,):
+                raise ValueError('evaluate_batch must return ' + str(count) + ' scores, not an array of shape ' + str(scores.shape))
+        except Exception as error:
+            for future in batch.futures:
+                future.set_exception(error)
+        else:
+            for future, score in zip(batch.futures, scores.tolist()):
+                future.set_result(score)
+        with self.lock:
+            self.batches += 1
+            self.leaves += count
+            self.evaluate_seconds += time.perf_counter() - start
+            batch.futures = []
+            batch.started = None
+            self.spare.append(batch)
+        return
+    def stats(self) -> dict:
+        '''Summarises the batches scored so far.'''
+        return {'batches':self.batches, 'leaves':self.leaves, 'mean_batch':round(self.leaves / self.batches, 3) if self.batches else 0.0, 'full_batches':self.full_batches, 'evaluate_seconds':round(self.evaluate_seconds, 6)}
+
+class BatchedMCTS(mcts.MCTS):
+    '''Monte Carlo tree search that scores new leaves with a LeafQueue instead of random playouts, counting each leaf as a playout.
+            each iteration selects up to batch_size leaves down different branches before any is scored:
+            every node on a selected path counts the visit at once, with no value yet, a virtual loss that steers the next selections elsewhere
+            the leaves are then scored in one batch and their values backed up'''
+    def __init__(self, queue: LeafQueue, exploration: float = None, seed: int = None):
+        if not isinstance(queue, LeafQueue):
+            raise TypeError('\'queue\' must be a LeafQueue, not a ' + str(type(queue)))
+        mcts.MCTS.__init__(self, exploration, seed)
+        self.queue = queue
+        return
+    def __repr__(self) -> str:
+        return 'BatchedMCTS(' + repr(self.queue) + ',' + repr(self.exploration) + ')'
+    def iterate(self, limit: int = None) -> int:
+        '''Selects and expands up to batch_size leaves, or limit if fewer, scores them in one batch and backs them up, returning the number of leaves.'''
+        size = self.queue.batch_size
+        if limit is not None:
+            size = min(size, limit)
+        leaves = []
+        for leaf_i in range(size):
+            current = self.root
+            while not current.untried and current.children:
+                current.visits += 1
+                current = current.select(self.exploration)
+            if current.untried:
+                current.visits += 1
+                col_i = current.untried.pop(int(self.rng.random() * len(current.untried)))
+                child = mcts.MCTSNode(current.node.traverse(col_i), current, col_i)
+                current.children.append(child)
+                current = child
+            current.visits += 1
+            node = current.node
+            if node.state.state == -2:
+                leaves.append((current, self.queue.submit(node.board, node.player_turn)))
+            elif node.state.state == 0:
+                leaves.append((current, 0.5))
+            else:
+                #the side that moved into a node that ends the game won it
+                leaves.append((current, 1.0))
+        self.queue.flush()
+        for current, reward in leaves:
+            if not isinstance(reward, float):
+                reward = (1 - reward.result()) / 2
+            while current is not None:
+                current.value += reward
+                reward = 1 - reward
+                current = current.parent
+        return len(leaves)
+
+def center_batch(array: np.ndarray) -> np.ndarray:
+    '''A stand-in for a learned evaluator: scores each board in a batch by how much nearer the center its side to move's tokens are than the other side's.'''
+    width = array.shape[2]
+    weights = (width - np.abs(2 * np.arange(width) - width + 1)).astype(np.float64)
+    return np.tanh(array.sum(axis = 1, dtype = np.float64) @ weights / 16)
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    seen = []
+    def record(array: np.ndarray) -> np.ndarray:
+        seen.append(array.copy())
+        return center_batch(array)
+    x = LeafQueue(record, 3, 1000.0)
+    y = [x.submit(gtree.Board.fromMoves('3'), False), x.submit(gtree.Board.fromMoves('3'), True)]
+    assert not y[0].done() and len(seen) == 0
+    y.append(x.submit(gtree.Board.fromMoves('01'), True))
+    assert all(future.done() for future in y) and len(seen) == 1 and seen[0].shape == (3, gtree.BoardColumn.height, gtree.Board.width)
+    assert seen[0][0, 0, 3] == -1 and seen[0][1, 0, 3] == 1 and seen[0][2, 0, 0] == 1 and seen[0][2, 0, 1] == -1 and seen[0].sum() == 0
+    assert y[0].result() == -y[1].result() < 0
+    z = x.submit(gtree.Board(), True)
+    x.flush()
+    assert z.result() == 0.0 and x.stats()['batches'] == 2 and x.stats()['leaves'] == 4 and x.stats()['full_batches'] == 1 and len(x.spare) == 1
+    del y, z
+    #threads standing for concurrent games fill one batch between them
+    y = []
+    z = [threading.Thread(target = lambda moves: y.append(x.evaluate(gtree.Board.fromMoves(moves), True)), args = (moves,)) for moves in ('3', '33', '334')]
+    for thread in z:
+        thread.start()
+    for thread in z:
+        thread.join()
+    assert len(y) == 3 and x.batches == 3 and len(seen) == 3
+    #a lone leaf is scored once it has waited max_wait_ms
+    x = LeafQueue(center_batch, 8, 5.0)
+    assert x.evaluate(gtree.Board.fromMoves('3'), True) > 0 and x.batches == 1 and x.full_batches == 0
+    x = LeafQueue(lambda array: np.zeros(2), 2, 0.0)
+    assert err.expect('x.evaluate(gtree.Board(), True)', ValueError, global_variables={'x':x, 'gtree':gtree})
+    x = BatchedMCTS(LeafQueue(center_batch, 16), None, 0)
+    y = x.search(gtree.DecisionNode(gtree.Board([[1,1,1]]), True), 400)
+    assert y.move == 0 and y.playouts == 400 and x.queue.stats()['mean_batch'] > 1
+    assert x.search(gtree.DecisionNode(gtree.Board([[-1,-1,-1],[1,1]]), True), 800).move == 0
+    assert x.search(gtree.DecisionNode(gtree.Board()), None, 20).playouts > 0
+    assert x.search(gtree.DecisionNode(gtree.Board()), None, 0).playouts == 16
+    assert x.search(gtree.DecisionNode(gtree.Board()), 10).playouts == 10 and x.root.visits == 10
+    assert err.expect('x.search(gtree.DecisionNode(gtree.Board()), 0)', ValueError, global_variables={'x':x, 'gtree':gtree})
+    del x, y, z, seen
+    assert err.expect('LeafQueue(center_batch, 0)', ValueError, global_variables={'LeafQueue':LeafQueue, 'center_batch':center_batch})
+    assert err.expect('LeafQueue(center_batch, 4, 1.0, gtree.Geometry.get(8, 8, 4))', ValueError, global_variables={'LeafQueue':LeafQueue, 'center_batch':center_batch, 'gtree':gtree})
+    assert err.expect('BatchedMCTS(center_batch)', TypeError, global_variables={'BatchedMCTS':BatchedMCTS, 'center_batch':center_batch})
+
+if __name__ == '__main__':
+    selfcheck()
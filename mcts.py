@@ -0,0 +1,177 @@
+import math
+import time
+import random
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+def playout(player_mask: int, computer_mask: int, heights: list, player_turn: bool, empty: int, rng: random.Random, geometry: gtree.Geometry = None) -> int:
+    '''Plays random tokens on a bare pair of masks until the game ends, returning the final VictoryState.state.
+            heights is changed in place, so pass a copy'''
+    if geometry is None:
+        geometry = gtree.Geometry.standard
+    stride = geometry.stride
+    height = geometry.height
+    connects = geometry.connects
+    open_columns = [col_i for col_i in range(geometry.width) if heights[col_i] < height]
+    while empty > 0:
+        col_i = open_columns[int(rng.random() * len(open_columns))]
+        bit_i = col_i * stride + heights[col_i]
+        bit = 1 << bit_i
+        heights[col_i] += 1
+        if heights[col_i] == height:
+            open_columns.remove(col_i)
+        empty -= 1
+        if player_turn:
+            player_mask |= bit
+            if connects(player_mask, bit_i):
+                return 1
+        else:
+            computer_mask |= bit
+            if connects(computer_mask, bit_i):
+                return -1
+        player_turn = not player_turn
+    return 0
+
+class MCTSNode():
+    '''Visit statistics for one DecisionNode in a Monte Carlo search tree.
+            value totals the rewards of the side that moved into this node: 1 per win, 0.5 per draw'''
+    def __init__(self, node: gtree.DecisionNode, parent = None, move: int = None):
+        self.node = node
+        self.parent = parent
+        self.move = move #column dropped into to reach this node from its parent
+        self.visits = 0
+        self.value = 0.0
+        self.children = [] #MCTSNodes already expanded
+        if node.state.state == -2:
+            self.untried = [col_i for col_i in range(node.board.geometry.width) if node.board.heights[col_i] < node.board.geometry.height] #columns not yet expanded
+        else:
+            self.untried = []
+        return
+    def __repr__(self) -> str:
+        return 'MCTSNode(' + repr(self.node) + ',' + repr(self.move) + ')'
+    def select(self, exploration: float):
+        '''Picks the child with the highest upper confidence bound (UCT).'''
+        log_visits = math.log(self.visits)
+        best = None
+        best_bound = None
+        for child in self.children:
+            bound = child.value / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if best is None or bound > best_bound:
+                best = child
+                best_bound = bound
+        return best
+
+class MCTSResult():
+    '''The outcome of a Monte Carlo tree search.'''
+    def __init__(self, move: int, visits: int, value: float, playouts: int, seconds: float):
+        self.move = move #column of the most visited child of the root
+        self.visits = visits #number of playouts through that move
+        self.value = value #mean reward of that move for the side to move, from 0 (loss) to 1 (win)
+        self.playouts = playouts
+        self.seconds = seconds
+        if seconds > 0:
+            self.playouts_per_second = playouts / seconds
+        else:
+            self.playouts_per_second = 0.0
+        return
+    def __repr__(self) -> str:
+        return 'MCTSResult(' + repr(self.move) + ',' + repr(self.visits) + ',' + repr(self.value) + ',' + repr(self.playouts) + ',' + repr(self.seconds) + ')'
+
+class MCTS():
+    '''Monte Carlo tree search with UCT selection, growing a DecisionNode tree one node per playout.
+            playouts run on bare masks, so they build no Board, VictoryState or DecisionNode objects
+            it is an anytime search: more playouts or more time give a stronger move'''
+    EXPLORATION = math.sqrt(2) #weight of the exploration term in UCT
+    CHECK_EVERY = 16 #number of playouts between checks of the clock
+    def __init__(self, exploration: float = None, seed: int = None):
+        if exploration is None:
+            exploration = MCTS.EXPLORATION
+        if not isinstance(exploration, (int, float)):
+            raise TypeError('\'exploration\' must be a number, not a ' + str(type(exploration)))
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.root = None
+        return
+    def __repr__(self) -> str:
+        return 'MCTS(' + repr(self.exploration) + ')'
+    def search(self, node: gtree.DecisionNode, playouts: int = None, time_ms: int = None) -> MCTSResult:
+        '''Runs playouts from a node until the playout count or time_ms runs out, whichever comes first.
+                at least one call of iterate always runs, so even a time_ms of 0 gives a move; the clock is checked about every CHECK_EVERY playouts
+                the statistics are kept if the same node is searched again'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if not isinstance(playouts, (int, type(None))):
+            raise TypeError('\'playouts\' must be an integer or None, not a ' + str(type(playouts)))
+        if not isinstance(time_ms, (int, float, type(None))):
+            raise TypeError('\'time_ms\' must be a number or None, not a ' + str(type(time_ms)))
+        if playouts is None and time_ms is None:
+            raise ValueError('either \'playouts\' or \'time_ms\' must be given')
+        if playouts is not None and playouts < 1:
+            raise ValueError('\'playouts\' must be greater than 0, not ' + str(playouts))
+        if node.state.state != -2:
+            raise ValueError('cannot search a node where the game has ended')
+        if self.root is None or self.root.node is not node:
+            self.root = MCTSNode(node)
+        start = time.perf_counter()
+        deadline = None
+        if time_ms is not None:
+            deadline = start + time_ms / 1000
+        count = 0
+        check = 1 #playout count at which the clock is next checked
+        while playouts is None or count < playouts:
+            if deadline is not None and count >= check:
+                if time.perf_counter() > deadline:
+                    break
+                check = count + MCTS.CHECK_EVERY
+            count += self.iterate(None if playouts is None else playouts - count)
+        best = max(self.root.children, key = lambda child: child.visits)
+        return MCTSResult(best.move, best.visits, best.value / best.visits, count, time.perf_counter() - start)
+    def iterate(self, limit: int = None) -> int:
+        '''Selects, expands, plays out and backs up once, returning the number of playouts run.
+                subclasses may run several playouts at once, but never more than limit'''
+        current = self.root
+        while not current.untried and current.children:
+            current = current.select(self.exploration)
+        if current.untried:
+            col_i = current.untried.pop(int(self.rng.random() * len(current.untried)))
+            child = MCTSNode(current.node.traverse(col_i), current, col_i)
+            current.children.append(child)
+            current = child
+        node = current.node
+        if node.state.state == -2:
+            state = node.state
+            if state.empty is None:
+                state = gtree.VictoryState(node.board)
+            result = playout(node.board.player_mask, node.board.computer_mask, list(node.board.heights), node.player_turn, state.empty, self.rng, node.board.geometry)
+        else:
+            result = node.state.state
+        while current is not None:
+            current.visits += 1
+            if result == 0:
+                current.value += 0.5
+            elif (result == 1) != current.node.player_turn:
+                #the side that moved into this node is the one not to move now
+                current.value += 1
+            current = current.parent
+        return 1
+
+def mcts_move(node: gtree.DecisionNode, playouts: int = None, time_ms: int = None, seed: int = None) -> int:
+    '''Finds a column for the side to move at a node by Monte Carlo tree search.'''
+    return MCTS(None, seed).search(node, playouts, time_ms).move
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert playout(gtree.Board([[1,1,1]]).player_mask, 0, [3] + [gtree.BoardColumn.height] * (gtree.Board.width - 1), True, 3, random.Random(0)) == 1
+    assert playout(0, 0, [gtree.BoardColumn.height] * gtree.Board.width, True, 0, random.Random(0)) == 0
+    x = MCTS(None, 0)
+    assert x.search(gtree.DecisionNode(gtree.Board([[1,1,1]]), True), 500).move == 0
+    assert x.search(gtree.DecisionNode(gtree.Board([[-1,-1,-1],[1,1]]), True), 2000).move == 0
+    assert x.search(gtree.DecisionNode(gtree.Board()), None, 20).playouts > 0
+    assert 0 < x.search(gtree.DecisionNode(gtree.Board()), None, 0).playouts <= MCTS.CHECK_EVERY
+    assert x.search(gtree.DecisionNode(gtree.Board([[],[],[],[],[1,1,1,1]], gtree.Geometry.get(8, 7, 5)), True), 500).move == 4
+    del x
+    assert err.expect('MCTS().search(gtree.DecisionNode(gtree.Board()), 0)', ValueError, global_variables={'MCTS':MCTS,'gtree':gtree})
+    assert err.expect('MCTS().search(gtree.DecisionNode(gtree.Board()))', ValueError, global_variables={'MCTS':MCTS,'gtree':gtree})
+
+if __name__ == '__main__':
+    selfcheck()
@@ -0,0 +1,201 @@
+import os
+import mmap
+import struct
+import argparse
+import tempfile
+import concurrent.futures
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+class OpeningBook():
+    '''Best moves for early positions, looked up by binary search in a memory-mapped file.
+            the file is a header followed by records sorted by key:
+                header = magic, board width, column height, line length, search depth, record count
+                record = Board.key of the side to move, best column, score for the side to move
+            books with the MIRRORED magic hold one record per mirror pair, under Board.canonicalKey and with the move as seen from that key
+            the file is never read into the heap, so processes mapping the same book share its pages'''
+    MAGIC = b'C4BK'
+    MIRRORED = b'C4BM' #magic of books keyed by canonical keys, which build writes
+    HEADER = struct.Struct('<4sBBBBQ') #magic, width, height, length, depth, count
+    RECORD = struct.Struct('<Qbb') #key, move, score
+    def __init__(self, path: str):
+        if not isinstance(path, str):
+            raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError('\'' + path + '\' is empty, not an opening book')
+        magic, width, height, length, self.depth, self.count = OpeningBook.HEADER.unpack_from(self.data, 0)
+        if magic not in (OpeningBook.MAGIC, OpeningBook.MIRRORED):
+            self.close()
+            raise ValueError('\'' + path + '\' is not an opening book')
+        try:
+            self.geometry = gtree.Geometry.get(width, height, length) #shape of the boards in this book
+        except ValueError:
+            self.close()
+            raise ValueError('\'' + path + '\' is a book for ' + str(width) + 'x' + str(height) + ' connect-' + str(length) + ', which is not a valid board')
+        if len(self.data) != OpeningBook.HEADER.size + self.count * OpeningBook.RECORD.size:
+            self.close()
+            raise ValueError('\'' + path + '\' is truncated')
+        self.mirrored = magic == OpeningBook.MIRRORED #whether records are keyed by canonical keys
+        return
+    def __repr__(self) -> str:
+        return 'OpeningBook(' + repr(self.path) + ')'
+    def __len__(self) -> int:
+        return self.count
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+    def close(self):
+        '''Unmaps and closes the file.'''
+        if not self.data.closed:
+            self.data.close()
+        self.file.close()
+        return
+    def find(self, key: int) -> tuple:
+        '''Finds the (move, score) stored for a key, or None if it is not in the book.'''
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move, score = OpeningBook.RECORD.unpack_from(self.data, OpeningBook.HEADER.size + middle * OpeningBook.RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                return (move, score)
+        return None
+    def lookup(self, node: gtree.DecisionNode) -> tuple:
+        '''Finds the (move, score) stored for the side to move at a node, or None if it is not in the book.
+                nodes on a board of another geometry are never in the book'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if node.board.geometry != self.geometry:
+            return None
+        if not self.mirrored:
+            return self.find(node.board.key(node.player_turn))
+        key, mirrored = node.board.canonicalKey(node.player_turn)
+        found = self.find(key)
+        if found is not None and mirrored:
+            return (self.geometry.mirrorMove(found[0]), found[1])
+        return found
+
+def positions(ply: int, geometry: gtree.Geometry = None):
+    '''Yields a node for each undecided position with up to ply tokens, once per canonical key, with the player to move.
+            of a position and its mirror image, only the first reached is yielded'''
+    if not isinstance(ply, int):
+        raise TypeError('\'ply\' must be an integer, not a ' + str(type(ply)))
+    layer = [gtree.DecisionNode(gtree.Board([], geometry), True)]
+    count = 0
+    while layer and count <= ply:
+        following = {}
+        for node in layer:
+            yield node
+            if count < ply:
+                for child in node.dependents.values():
+                    if child.state.state == -2:
+                        following.setdefault(child.board.canonicalKey(child.player_turn)[0], child)
+            node.children.clear()
+        layer = list(following.values())
+        count += 1
+    return
+
+book_searcher = None #Searcher kept by each process building a book
+
+def solve(board: gtree.Board, player_turn: bool, depth: int) -> tuple:
+    '''Searches one position for the book, returning (canonical key, move, score) with the move as seen from that key.'''
+    global book_searcher
+    import solver #imported here as solver imports this module to check its books
+    if book_searcher is None:
+        book_searcher = solver.Searcher()
+    result = book_searcher.search(gtree.DecisionNode(board, player_turn), depth)
+    key, mirrored = board.canonicalKey(player_turn)
+    if mirrored:
+        return (key, board.geometry.mirrorMove(result.move), result.score)
+    return (key, result.move, result.score)
+
+def build(path: str, ply: int, depth: int, workers: int = 1, geometry: gtree.Geometry = None) -> int:
+    '''Searches every position with up to ply tokens to depth tokens and writes the results to a book at path.
+            returns the number of records written'''
+    if not isinstance(path, str):
+        raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+    if not isinstance(depth, int):
+        raise TypeError('\'depth\' must be an integer, not a ' + str(type(depth)))
+    if not isinstance(workers, int):
+        raise TypeError('\'workers\' must be an integer, not a ' + str(type(workers)))
+    if depth < 1 or depth > 255:
+        raise ValueError('\'depth\' must be between 1 and 255, not ' + str(depth))
+    if workers < 1:
+        raise ValueError('\'workers\' must be greater than 0, not ' + str(workers))
+    if geometry is None:
+        geometry = gtree.Geometry.standard
+    if geometry.width * geometry.stride > 64:
+        raise ValueError('keys of a ' + str(geometry.width) + 'x' + str(geometry.height) + ' board do not fit the 64 bits stored for each record')
+    nodes = list(positions(ply, geometry))
+    boards = [node.board for node in nodes]
+    turns = [node.player_turn for node in nodes]
+    depths = [depth] * len(nodes)
+    if workers == 1:
+        records = list(map(solve, boards, turns, depths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            records = list(executor.map(solve, boards, turns, depths, chunksize = 64))
+    records.sort()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(OpeningBook.HEADER.pack(OpeningBook.MIRRORED, geometry.width, geometry.height, geometry.length, depth, len(records)))
+        for record in records:
+            file.write(OpeningBook.RECORD.pack(*record))
+    os.replace(temp_path, path)
+    return len(records)
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert [node.board for node in positions(1)] == [gtree.Board()] + [gtree.DecisionNode(gtree.Board(), True).traverse(i).board for i in range(gtree.Board.width // 2 + 1)]
+    #of the 49 positions after two tokens, only 3 then 3 is its own mirror image
+    assert len(list(positions(2))) == 1 + (gtree.Board.width + 1) // 2 + (gtree.Board.width ** 2 + 1) // 2
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'book.bin')
+        assert build(path, 2, 6, 1, gtree.Geometry.get(5, 4, 3)) == 1 + 3 + 13
+        with OpeningBook(path) as x:
+            assert x.mirrored and len(x) == 17
+            y = gtree.DecisionNode(gtree.Board([], x.geometry), True)
+            assert x.lookup(y.traverse(0).traverse(2)) == (3, 0) and x.lookup(y.traverse(4).traverse(2)) == (1, 0)
+            assert all(x.lookup(y.traverse(i).traverse(j))[1] == solve(y.traverse(i).traverse(j).board, True, 6)[2] for i in range(5) for j in range(5))
+            import solver
+            z = solver.Searcher(None, x).search(y.traverse(0).traverse(2), 4)
+            assert (z.move, z.score, z.depth, z.nodes, z.complete) == (3, 0, 4, 0, True)
+            z = solver.Searcher(None, x).search(y.traverse(0).traverse(2))
+            assert z.score == solver.Searcher().search(y.traverse(0).traverse(2)).score and z.depth > x.depth and z.complete and z.nodes > 0
+        del x, y
+    assert err.expect('OpeningBook(0)', TypeError, global_variables={'OpeningBook':OpeningBook})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Build or query an opening book.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    build_parser = commands.add_parser('build', help = 'search every early position and write the book')
+    build_parser.add_argument('path')
+    build_parser.add_argument('--ply', type = int, default = 4, help = 'most tokens on the board of a book position')
+    build_parser.add_argument('--depth', type = int, default = 8, help = 'search depth for each position')
+    build_parser.add_argument('--workers', type = int, default = 1, help = 'number of processes to search with')
+    build_parser.add_argument('--width', type = int, default = gtree.Geometry.standard.width, help = 'number of columns on the board')
+    build_parser.add_argument('--height', type = int, default = gtree.Geometry.standard.height, help = 'number of spaces in each column')
+    build_parser.add_argument('--length', type = int, default = gtree.Geometry.standard.length, help = 'number of tokens in a line needed to win')
+    query_parser = commands.add_parser('query', help = 'look up the position reached by a sequence of columns')
+    query_parser.add_argument('path')
+    query_parser.add_argument('moves', nargs = '?', default = '', help = 'columns played from the start, such as 3342')
+    args = parser.parse_args()
+    if args.command == 'build':
+        print(build(args.path, args.ply, args.depth, args.workers, gtree.Geometry.get(args.width, args.height, args.length)), 'positions written to', args.path)
+    else:
+        with OpeningBook(args.path) as book:
+            node = gtree.DecisionNode(gtree.Board([], book.geometry), True)
+            for move in args.moves:
+                node = node.traverse(int(move))
+            print(book.lookup(node))
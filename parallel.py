@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import concurrent.futures
+import game_state_tree as gtree
+import solver
+from extended_debug import error_test as err
+
+worker_searcher = None #Searcher kept by each worker process between tasks
+worker_search_id = None #id of the search the worker's table was filled by
+
+def score_move(board: gtree.Board, player_turn: bool, state: gtree.VictoryState, col_i: int, depth: int, deadline: float, search_id: int) -> tuple:
+    '''Scores one move for the side to move with a full window search of depth tokens, including the move itself.
+            runs in a worker process; deadline is a time.time() value or None
+            returns (score, nodes), with score None if the deadline passed'''
+    global worker_searcher, worker_search_id
+    if worker_searcher is None:
+        worker_searcher = solver.Searcher()
+    if worker_search_id != search_id:
+        #entries from other roots may be deeper than this search would reach, which would change its scores
+        worker_searcher.table.clear()
+        worker_search_id = search_id
+    child = gtree.Board._play(board.copy(), col_i, player_turn)
+    child_state = gtree.VictoryState._next(child, col_i, child.heights[col_i] - 1, state)
+    if child_state.state == 0:
+        return (0, 1)
+    elif child_state.state != -2:
+        return (child_state.empty + 1, 1)
+    elif depth == 1:
+        return (0, 1)
+    if deadline is None:
+        worker_searcher.deadline = None
+    else:
+        worker_searcher.deadline = time.perf_counter() + deadline - time.time()
+    worker_searcher.nodes = 0
+    bound = board.geometry.size + 1
+    try:
+        score = -worker_searcher.negamax(child, not player_turn, child_state.empty, depth - 1, -bound, bound)
+    except solver.SearchTimeout:
+        return (None, worker_searcher.nodes + 1)
+    return (score, worker_searcher.nodes + 1)
+
+class ParallelSearcher():
+    '''Splits each depth of an iterative deepening search across a pool of worker processes, one root move per task.
+            with a depth limit the result is the same as Searcher.search: the first move, in the same order, with the best score
+            with a time limit the depth reached depends on the machine, as it does for Searcher'''
+    def __init__(self, workers: int = None):
+        if not isinstance(workers, (int, type(None))):
+            raise TypeError('\'workers\' must be an integer or None, not a ' + str(type(workers)))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError('\'workers\' must be greater than 0, not ' + str(workers))
+        self.workers = workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers)
+        self.searches = 0
+        return
+    def __repr__(self) -> str:
+        return 'ParallelSearcher(' + repr(self.workers) + ')'
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+    def close(self):
+        '''Shuts down the worker processes.'''
+        self.executor.shutdown()
+        return
+    def search(self, node: gtree.DecisionNode, max_depth: int = None, time_ms: int = None) -> solver.SearchResult:
+        '''Searches deeper and deeper from a node until max_depth is reached, the result is decided, or time_ms runs out.'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if not isinstance(max_depth, (int, type(None))):
+            raise TypeError('\'max_depth\' must be an integer or None, not a ' + str(type(max_depth)))
+        if not isinstance(time_ms, (int, float, type(None))):
+            raise TypeError('\'time_ms\' must be a number or None, not a ' + str(type(time_ms)))
+        if node.state.state != -2:
+            raise ValueError('cannot search a node where the game has ended')
+        state = node.state
+        if state.empty is None:
+            state = gtree.VictoryState(node.board)
+        if max_depth is None or max_depth > state.empty:
+            max_depth = state.empty
+        if max_depth < 1:
+            raise ValueError('\'max_depth\' must be greater than 0, not ' + str(max_depth))
+        start = time.perf_counter()
+        deadline = None
+        if time_ms is not None:
+            deadline = time.time() + time_ms / 1000
+        self.searches += 1
+        search_id = (os.getpid(), id(self), self.searches)
+        nodes = 0
+        result = None
+        previous = None
+        depth = 1
+        while depth <= max_depth:
+            moves = solver.Searcher.moves(node.board, previous)
+            futures = [self.executor.submit(score_move, node.board, node.player_turn, state, col_i, depth, deadline, search_id) for col_i in moves]
+            scores = []
+            for future in futures:
+                score, count = future.result()
+                nodes += count
+                scores.append(score)
+            if None in scores:
+                if result is None and scores[0] is not None:
+                    result = solver.SearchResult(moves[0], scores[0], 0, nodes, time.perf_counter() - start, False)
+                break
+            best = scores.index(max(scores))
+            result = solver.SearchResult(moves[best], scores[best], depth, nodes, time.perf_counter() - start, depth == max_depth)
+            if scores[best] != 0:
+                result.complete = True
+                break
+            previous = moves[best]
+            depth += 1
+        if result is None:
+            result = solver.SearchResult(solver.Searcher.moves(node.board)[0], 0, 0, nodes, time.perf_counter() - start, False)
+        result.nodes = nodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+def parallel_best_move(node: gtree.DecisionNode, max_depth: int = None, time_ms: int = None, workers: int = None) -> int:
+    '''Finds the best column for the side to move at a node using a temporary pool of worker processes.'''
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(node, max_depth, time_ms).move
+
+def speedup(node: gtree.DecisionNode, max_depth: int, worker_counts: list) -> list:
+    '''Times a depth limited search of a node with a single process and then with each number of workers.
+            returns a list of dictionaries, the first for the single process search'''
+    if not isinstance(worker_counts, list):
+        raise TypeError('\'worker_counts\' must be a list, not a ' + str(type(worker_counts)))
+    single = solver.Searcher().search(node, max_depth)
+    report = [{'workers':0, 'move':single.move, 'score':single.score, 'nodes':single.nodes, 'seconds':single.seconds, 'speedup':1.0, 'matches':True}]
+    for workers in worker_counts:
+        with ParallelSearcher(workers) as searcher:
+            result = searcher.search(node, max_depth)
+        report.append({'workers':workers, 'move':result.move, 'score':result.score, 'nodes':result.nodes, 'seconds':result.seconds, 'speedup':single.seconds / result.seconds, 'matches':result == single})
+    return report
+
+def stream_batches(function, batches, args: tuple = (), workers: int = 1):
+    '''Yields every result of function(batch, *args) for each batch in turn, where function returns a list of results.
+            with more than one worker the batches run across worker processes and the results still come in order
+            only a few batches per worker are in flight at once, so inputs of any length stream in constant memory'''
+    if not isinstance(workers, int):
+        raise TypeError('\'workers\' must be an integer, not a ' + str(type(workers)))
+    if workers < 1:
+        raise ValueError('\'workers\' must be greater than 0, not ' + str(workers))
+    if workers == 1:
+        for batch in batches:
+            for result in function(batch, *args):
+                yield result
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = []
+        for batch in batches:
+            pending.append(executor.submit(function, batch, *args))
+            if len(pending) >= workers * 2:
+                for result in pending.pop(0).result():
+                    yield result
+        for future in pending:
+            for result in future.result():
+                yield result
+    return
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    with ParallelSearcher(2) as x:
+        for y in (gtree.DecisionNode(gtree.Board(), True), gtree.DecisionNode(gtree.Board.fromMoves('3342'), True), gtree.DecisionNode(gtree.Board([[-1,-1,-1],[1,1]]), True), gtree.DecisionNode(gtree.Board.fromMoves('33425'), False)):
+            first = x.search(y, 4)
+            second = solver.Searcher().search(y, 4)
+            assert (first.move, first.score) == (second.move, second.score)
+    del x, y, first, second
+    assert list(stream_batches(sorted, iter([[3, 1], [2], [5, 4], [0]]), (), 2)) == list(stream_batches(sorted, [[3, 1], [2], [5, 4], [0]])) == [1, 3, 2, 4, 5, 0]
+    assert err.expect('ParallelSearcher(0)', ValueError, global_variables={'ParallelSearcher':ParallelSearcher})
+
+if __name__ == '__main__':
+    #usage: python parallel.py [depth] [workers ...]
+    depth = 8
+    worker_counts = [1, 2, 4]
+    if len(sys.argv) > 1:
+        depth = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        worker_counts = [int(arg) for arg in sys.argv[2:]]
+    for line in speedup(gtree.RootNode().traverse(False), depth, worker_counts):
+        print(line)
@@ -0,0 +1,287 @@
+import os
+import zlib
+import random
+import struct
+import argparse
+import tempfile
+import game_state_tree as gtree
+import solver
+import parallel
+from extended_debug import error_test as err
+
+class RandomPolicy():
+    '''Drops each token into a random column that has room.'''
+    def __repr__(self) -> str:
+        return 'RandomPolicy()'
+    def __eq__(self, other) -> bool:
+        return type(self) == type(other)
+    def choose(self, board: gtree.Board, player_turn: bool, state: gtree.VictoryState, rng: random.Random) -> int:
+        '''Picks a column for the side to move.'''
+        return rng.choice([col_i for col_i in range(board.geometry.width) if board.heights[col_i] < board.geometry.height])
+
+class SearchPolicy():
+    '''Drops each token where a depth limited search says, or into a random column with chance epsilon.
+            each game gets a fresh Searcher, so with no time limit a game only depends on its seed'''
+    def __init__(self, depth: int = 4, epsilon: float = 0.0, time_ms: int = None):
+        if not isinstance(depth, int):
+            raise TypeError('\'depth\' must be an integer, not a ' + str(type(depth)))
+        if not isinstance(epsilon, (int, float)):
+            raise TypeError('\'epsilon\' must be a number, not a ' + str(type(epsilon)))
+        if depth < 1:
+            raise ValueError('\'depth\' must be greater than 0, not ' + str(depth))
+        if epsilon < 0 or epsilon > 1:
+            raise ValueError('\'epsilon\' must be between 0 and 1, not ' + str(epsilon))
+        self.depth = depth
+        self.epsilon = epsilon
+        self.time_ms = time_ms
+        self.searcher = None
+        return
+    def __repr__(self) -> str:
+        return 'SearchPolicy(' + repr(self.depth) + ',' + repr(self.epsilon) + ',' + repr(self.time_ms) + ')'
+    def __eq__(self, other) -> bool:
+        return type(self) == type(other) and (self.depth, self.epsilon, self.time_ms) == (other.depth, other.epsilon, other.time_ms)
+    def __getstate__(self) -> dict:
+        #the searcher's table stays behind when the policy is sent to a worker
+        state = dict(self.__dict__)
+        state['searcher'] = None
+        return state
+    def reset(self):
+        '''Forgets everything searched, ready for a new game.'''
+        self.searcher = solver.Searcher()
+        return
+    def choose(self, board: gtree.Board, player_turn: bool, state: gtree.VictoryState, rng: random.Random) -> int:
+        '''Picks a column for the side to move.'''
+        if self.epsilon and rng.random() < self.epsilon:
+            return RandomPolicy().choose(board, player_turn, state, rng)
+        if self.searcher is None:
+            self.reset()
+        return self.searcher.search(gtree.DecisionNode(board, player_turn, state), self.depth, self.time_ms).move
+
+POLICIES = {'random':RandomPolicy, 'search':SearchPolicy} #policy classes by name, for the command line
+
+class GameRecord():
+    '''One finished self-play game.
+            moves holds the column of every token dropped, one byte each, starting with the first player'''
+    def __init__(self, game_i: int, player_first: bool, moves: bytes, result: int):
+        self.game_i = game_i #index of the game in the whole run, which decides its seed and shard
+        self.player_first = player_first #whether the player dropped the first token
+        self.moves = moves
+        self.result = result #final VictoryState.state
+        return
+    def __repr__(self) -> str:
+        return 'GameRecord(' + repr(self.game_i) + ',' + repr(self.player_first) + ',' + repr(self.moves) + ',' + repr(self.result) + ')'
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameRecord):
+            raise TypeError('GameRecord instances must only be compared to other GameRecord instances, not ' + str(type(other)))
+        return (self.game_i, self.player_first, self.moves, self.result) == (other.game_i, other.player_first, other.moves, other.result)
+    def nodes(self):
+        '''Yields the DecisionNode before each move, paired with the move made there.'''
+        node = gtree.DecisionNode(gtree.Board(), self.player_first)
+        for move in self.moves:
+            yield (node, move)
+            node = node.traverse(move)
+        return
+
+def play(game_i: int, seed: int, player_policy, computer_policy) -> GameRecord:
+    '''Plays one game between two policies; the player goes first in even numbered games.'''
+    rng = random.Random(str(seed) + ':' + str(game_i))
+    for policy in (player_policy, computer_policy):
+        if hasattr(policy, 'reset'):
+            policy.reset()
+    player_turn = game_i % 2 == 0
+    player_first = player_turn
+    board = gtree.Board()
+    state = gtree.VictoryState(board)
+    moves = bytearray()
+    while state.state == -2:
+        if player_turn:
+            col_i = player_policy.choose(board, player_turn, state, rng)
+        else:
+            col_i = computer_policy.choose(board, player_turn, state, rng)
+        board.addToken(col_i, player_turn)
+        state = gtree.VictoryState.fromMove(board, col_i, board.heights[col_i] - 1, state)
+        moves.append(col_i)
+        player_turn = not player_turn
+    return GameRecord(game_i, player_first, bytes(moves), state.state)
+
+def play_many(game_indexes: list, seed: int, player_policy, computer_policy) -> list:
+    '''Plays a list of games in one worker task.'''
+    return [play(game_i, seed, player_policy, computer_policy) for game_i in game_indexes]
+
+def generate(games: int, seed: int = 0, player_policy = None, computer_policy = None, workers: int = 1, shard: int = 0, shards: int = 1, start: int = 0, batch: int = 64):
+    '''Yields the games of one shard in order of game index, playing them across worker processes.
+            the run is games long; this shard plays every game_i from start with game_i % shards == shard
+            runs of any length stream in constant memory, as parallel.stream_batches plays them'''
+    if not isinstance(games, int):
+        raise TypeError('\'games\' must be an integer, not a ' + str(type(games)))
+    if not isinstance(workers, int):
+        raise TypeError('\'workers\' must be an integer, not a ' + str(type(workers)))
+    if not isinstance(shard, int) or not isinstance(shards, int):
+        raise TypeError('\'shard\' and \'shards\' must be integers')
+    if shards < 1 or shard < 0 or shard >= shards:
+        raise ValueError('\'shard\' must be between 0 and \'shards\' - 1, not ' + str(shard) + ' of ' + str(shards))
+    if workers < 1:
+        raise ValueError('\'workers\' must be greater than 0, not ' + str(workers))
+    if player_policy is None:
+        player_policy = RandomPolicy()
+    if computer_policy is None:
+        computer_policy = RandomPolicy()
+    first = start + (shard - start) % shards
+    indexes = range(first, games, shards)
+    batches = (list(indexes[i:i + batch]) for i in range(0, len(indexes), batch))
+    for record in parallel.stream_batches(play_many, batches, (seed, player_policy, computer_policy), workers):
+        yield record
+    return
+
+class GameFile():
+    '''An append-only file of self-play games written in checksummed chunks.
+            chunk = header (magic, number of games, payload length, crc32 of payload) + payload
+            payload = for each game: game index, player first, result, number of moves, then one byte per move
+            opening a file drops any chunk left half written by a crash, so writing can resume after the last whole chunk'''
+    MAGIC = b'C4SP'
+    CHUNK = struct.Struct('<4sIII') #magic, games, payload length, crc32
+    GAME = struct.Struct('<Q?bB') #game index, player first, result, number of moves
+    def __init__(self, path: str):
+        if not isinstance(path, str):
+            raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+        self.path = path
+        self.games = 0 #number of whole games in the file
+        self.last = None #index of the last whole game in the file
+        end = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                for offset, records in GameFile.chunks(file):
+                    self.games += len(records)
+                    if records:
+                        self.last = records[-1].game_i
+                    end = offset
+        self.file = open(path, 'ab')
+        self.file.truncate(end)
+        return
+    def __repr__(self) -> str:
+        return 'GameFile(' + repr(self.path) + ')'
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+    def close(self):
+        self.file.close()
+        return
+    @staticmethod
+    def chunks(file):
+        '''Yields (end offset, list of GameRecords) for each whole chunk in an open file, stopping at the first broken one.'''
+        offset = 0
+        while True:
+            header = file.read(GameFile.CHUNK.size)
+            if len(header) < GameFile.CHUNK.size:
+                return
+            magic, count, length, crc = GameFile.CHUNK.unpack(header)
+            payload = file.read(length)
+            if magic != GameFile.MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            records = []
+            position = 0
+            while len(records) < count:
+                game_i, player_first, result, moves = GameFile.GAME.unpack_from(payload, position)
+                position += GameFile.GAME.size
+                records.append(GameRecord(game_i, player_first, payload[position:position + moves], result))
+                position += moves
+            offset += GameFile.CHUNK.size + length
+            yield (offset, records)
+    def write(self, records: list):
+        '''Appends one chunk of games and flushes it to disk.'''
+        if not isinstance(records, list):
+            raise TypeError('\'records\' must be a list, not a ' + str(type(records)))
+        payload = bytearray()
+        for record in records:
+            payload += GameFile.GAME.pack(record.game_i, record.player_first, record.result, len(record.moves))
+            payload += record.moves
+        self.file.write(GameFile.CHUNK.pack(GameFile.MAGIC, len(records), len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.games += len(records)
+        if records:
+            self.last = records[-1].game_i
+        return
+
+def read(path: str):
+    '''Yields every whole game in a self-play file, one chunk in memory at a time.'''
+    with open(path, 'rb') as file:
+        for offset, records in GameFile.chunks(file):
+            for record in records:
+                yield record
+    return
+
+def run(path: str, games: int, seed: int = 0, player_policy = None, computer_policy = None, workers: int = 1, shard: int = 0, shards: int = 1, chunk: int = 1024) -> int:
+    '''Plays one shard of a run into a file, carrying on after the last game already in it.
+            returns the number of games added'''
+    if not isinstance(chunk, int):
+        raise TypeError('\'chunk\' must be an integer, not a ' + str(type(chunk)))
+    if chunk < 1:
+        raise ValueError('\'chunk\' must be greater than 0, not ' + str(chunk))
+    added = 0
+    with GameFile(path) as game_file:
+        start = 0
+        if game_file.last is not None:
+            start = game_file.last + 1
+        records = []
+        for record in generate(games, seed, player_policy, computer_policy, workers, shard, shards, start):
+            records.append(record)
+            if len(records) >= chunk:
+                game_file.write(records)
+                added += len(records)
+                records = []
+        if records:
+            game_file.write(records)
+            added += len(records)
+    return added
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert [record.game_i for record in generate(7, 0, None, None, 1, 1, 3)] == [1, 4]
+    assert [record.game_i for record in generate(9, 0, None, None, 1, 1, 3, 5)] == [7]
+    assert list(generate(3, 5)) == list(generate(3, 5, RandomPolicy(), RandomPolicy(), 1, 0, 1, 0, 1))
+    x = gtree.Board([[1,1,1,1],[],[-1,-1,-1,-1]], gtree.Geometry.get(4, 4, 3))
+    assert {RandomPolicy().choose(x, True, None, random.Random(seed)) for seed in range(20)} == {1, 3}
+    del x
+    assert play(0, 0, RandomPolicy(), RandomPolicy()).player_first and not play(1, 0, RandomPolicy(), RandomPolicy()).player_first
+    assert play(2, 0, SearchPolicy(2), RandomPolicy()) == play(2, 0, SearchPolicy(2), RandomPolicy())
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'games.bin')
+        assert run(path, 10, 3, None, None, 1, 0, 1, 4) == 10
+        with open(path, 'ab') as file:
+            file.write(GameFile.MAGIC + b'torn chunk')
+        assert run(path, 25, 3, None, None, 1, 0, 1, 4) == 15
+        x = list(read(path))
+        assert [record.game_i for record in x] == list(range(25)) and x == list(generate(25, 3))
+        with GameFile(path) as y:
+            assert y.games == 25 and y.last == 24
+        assert run(path, 25, 3) == 0
+    del x, y
+    assert err.expect('SearchPolicy(0)', ValueError, global_variables={'SearchPolicy':SearchPolicy})
+    assert err.expect('list(generate(5, 0, None, None, 1, 3, 3))', ValueError, global_variables={'generate':generate})
+    assert err.expect('run("games.bin", 5, 0, None, None, 1, 0, 1, 0)', ValueError, global_variables={'run':run})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generate self-play games into a resumable file.')
+    parser.add_argument('path')
+    parser.add_argument('--games', type = int, required = True, help = 'number of games in the whole run, across all shards')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--player', choices = POLICIES, default = 'random', help = 'policy of the player')
+    parser.add_argument('--computer', choices = POLICIES, default = 'random', help = 'policy of the computer')
+    parser.add_argument('--depth', type = int, default = 4, help = 'search depth of search policies')
+    parser.add_argument('--epsilon', type = float, default = 0.1, help = 'chance of a random move for search policies')
+    parser.add_argument('--workers', type = int, default = os.cpu_count() or 1)
+    parser.add_argument('--shard', type = int, default = 0)
+    parser.add_argument('--shards', type = int, default = 1)
+    parser.add_argument('--chunk', type = int, default = 1024, help = 'games per chunk written')
+    args = parser.parse_args()
+    policies = []
+    for name in (args.player, args.computer):
+        if name == 'search':
+            policies.append(SearchPolicy(args.depth, args.epsilon))
+        else:
+            policies.append(POLICIES[name]())
+    print(run(args.path, args.games, args.seed, policies[0], policies[1], args.workers, args.shard, args.shards, args.chunk), 'games added to', args.path)
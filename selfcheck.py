@@ -0,0 +1,40 @@
+import sys
+import importlib
+import traceback
+import benchmark
+
+MODULES = ('game_state_tree', 'transposition', 'solved_cache', 'evaluation', 'endgame', 'solver', 'opening_book', 'parallel', 'batch_victory', 'self_play', 'mcts', 'leaf_batch', 'benchmark', 'text_ui', 'server', 'batch') #modules with a selfcheck(), in dependency order
+IMPORT_BUDGET = 0.2 #seconds a fresh interpreter may take to import text_ui and everything it needs, compiling included
+
+def main() -> bool:
+    '''Runs the selfcheck() of every module and checks the import budget, printing what happened.
+            returns whether everything passed'''
+    if not __debug__:
+        print('assertions are disabled by -O, so the self-checks cannot run')
+        return False
+    passed = True
+    for name in MODULES:
+        try:
+            module = importlib.import_module(name)
+        except ImportError as error:
+            #only modules with optional dependencies, such as batch_victory and NumPy, may be skipped
+            print(name + ': skipped, ' + str(error))
+            continue
+        try:
+            module.selfcheck()
+        except AssertionError:
+            passed = False
+            traceback.print_exc()
+            print(name + ': FAILED')
+            continue
+        print(name + ': ok')
+    seconds = benchmark.import_seconds('text_ui')
+    if seconds > IMPORT_BUDGET:
+        passed = False
+        print('import: FAILED, text_ui took ' + str(round(seconds * 1000)) + ' ms, over the budget of ' + str(round(IMPORT_BUDGET * 1000)) + ' ms')
+    else:
+        print('import: ok, text_ui took ' + str(round(seconds * 1000)) + ' ms')
+    return passed
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
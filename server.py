@@ -0,0 +1,258 @@
+import time
+import asyncio
+import argparse
+import collections
+import concurrent.futures
+import game_state_tree as gtree
+import text_ui
+from extended_debug import error_test as err
+
+class Stats(text_ui.Command):
+    KEYWORD = 'stats'
+    DESC = 'show how many sessions and commands the server has handled and how quickly'
+    MIN_ARGS = 0
+    MAX_ARGS = 0
+    def __init__(self):
+        text_ui.Command.__init__(self, Stats.KEYWORD, Stats.DESC, Stats.MIN_ARGS, Stats.MAX_ARGS)
+        return
+    def __repr__(self) -> str:
+        return 'Stats()'
+    def run(self, server) -> dict:
+        return server.stats()
+
+def think(command: text_ui.Compute, node: gtree.DecisionNode) -> gtree.DecisionNode:
+    '''Runs a Compute command, in a worker process so a long search never holds up other sessions.'''
+    return command.run(node)
+
+class Session():
+    '''One connection's game.'''
+    def __init__(self, session_i: int):
+        self.session_i = session_i
+        self.node = None #DecisionNode of the game in progress, or None before the first start
+        self.commands = 0
+        return
+    def __repr__(self) -> str:
+        return 'Session(' + repr(self.session_i) + ')'
+
+class GameServer():
+    '''Serves games of connect-4 to many connections at once, one game per connection, over a line protocol.
+            each line is a text_ui command, such as 'start y' or 'drop 3', or 'stats'
+            each reply is any number of lines followed by a line of 'ok' or 'error: ' and what went wrong
+            commands never prompt for input: a start must say who goes first and a drop which column
+            the computer answers each drop by itself, searching for up to time_ms milliseconds in the executor
+            a connection sending nothing for timeout seconds is closed'''
+    OK = 'ok' #last line of a reply to a command that worked
+    ERROR = 'error: ' #start of the last line of a reply to a command that did not
+    GREETING = 'connect-4 server, type help for the commands' #first line sent to each connection
+    LATENCIES = 1024 #number of recent command latencies kept for the stats
+    def __init__(self, time_ms: int = None, timeout: float = 300.0, workers: int = None, executor: concurrent.futures.Executor = None):
+        if not isinstance(time_ms, (int, type(None))):
+            raise TypeError('\'time_ms\' must be an integer or None, not a ' + str(type(time_ms)))
+        if not isinstance(timeout, (int, float)):
+            raise TypeError('\'timeout\' must be a number, not a ' + str(type(timeout)))
+        if not isinstance(executor, (concurrent.futures.Executor, type(None))):
+            raise TypeError('\'executor\' must be an Executor or None, not a ' + str(type(executor)))
+        if time_ms is None:
+            time_ms = text_ui.Compute.TIME_MS
+        if timeout <= 0:
+            raise ValueError('\'timeout\' must be greater than 0, not ' + str(timeout))
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        self.time_ms = time_ms #longest the computer may think about a move
+        self.timeout = timeout
+        self.executor = executor
+        self.known = {command_class.KEYWORD:command_class for command_class in (text_ui.Close, text_ui.Help, text_ui.Start, text_ui.Insert, text_ui.Compute, Stats)} #commands served
+        self.started = time.time()
+        self.sessions = 0
+        self.open_sessions = 0
+        self.commands = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.moves = 0 #moves the computer has made
+        self.think_seconds = 0.0
+        self.latencies = collections.deque(maxlen = GameServer.LATENCIES) #seconds taken by recent commands, including any computer move
+        return
+    def __repr__(self) -> str:
+        return 'GameServer(' + repr(self.time_ms) + ',' + repr(self.timeout) + ')'
+    async def start(self, host: str = '127.0.0.1', port: int = 0, path: str = None) -> asyncio.AbstractServer:
+        '''Starts listening on a TCP port, or on a Unix socket if path is given.'''
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+    def close(self):
+        '''Stops the executor, once the servers using this have been closed.'''
+        self.executor.shutdown(cancel_futures = True)
+        return
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        '''Runs one connection's session until it closes, sends close, or times out.'''
+        self.sessions += 1
+        self.open_sessions += 1
+        session = Session(self.sessions)
+        try:
+            writer.write((GameServer.GREETING + '\n' + GameServer.OK + '\n').encode())
+            await writer.drain()
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    writer.write((GameServer.ERROR + 'timed out after ' + str(self.timeout) + ' seconds without a command\n').encode())
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                start = time.perf_counter()
+                try:
+                    lines = await self.execute(session, line.decode(errors = 'replace'))
+                    lines.append(GameServer.OK)
+                    done = False
+                except SystemExit:
+                    lines = [GameServer.OK]
+                    done = True
+                except Exception as error:
+                    self.errors += 1
+                    lines = [GameServer.ERROR + str(error)]
+                    done = False
+                self.commands += 1
+                session.commands += 1
+                self.latencies.append(time.perf_counter() - start)
+                writer.write(('\n'.join(lines) + '\n').encode())
+                await writer.drain()
+                if done:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.open_sessions -= 1
+            writer.close()
+        return
+    async def execute(self, session: Session, line: str) -> list:
+        '''Carries out one line of the protocol for a session, returning the lines of the reply before the final ok.
+                raises SystemExit for close, and any other exception for a command that failed'''
+        command = text_ui.parse(line, self.known)
+        if isinstance(command, text_ui.Close):
+            command.run()
+        elif isinstance(command, text_ui.Help):
+            return text_ui.Help.text(self.known).splitlines()
+        elif isinstance(command, Stats):
+            return [name + ': ' + str(value) for name, value in command.run(self).items()]
+        text_ui.check(session.node, command)
+        if isinstance(command, text_ui.Start):
+            session.node = command.run()
+            if not session.node.player_turn:
+                await self.computerMove(session, text_ui.Compute(self.time_ms))
+        elif isinstance(command, text_ui.Insert):
+            session.node = command.run(session.node)
+            if session.node.state.state == -2:
+                await self.computerMove(session, text_ui.Compute(self.time_ms))
+        else:
+            await self.computerMove(session, text_ui.Compute(min(command.time_ms, self.time_ms)))
+        return self.describe(session)
+    async def computerMove(self, session: Session, command: text_ui.Compute):
+        '''Lets the computer move in a session's game, searching in the executor.'''
+        start = time.perf_counter()
+        session.node = await asyncio.get_running_loop().run_in_executor(self.executor, think, command, session.node)
+        self.think_seconds += time.perf_counter() - start
+        self.moves += 1
+        return
+    @staticmethod
+    def describe(session: Session) -> list:
+        '''Draws a session's board and says whose turn it is or how the game ended.'''
+        lines = str(session.node.board).splitlines()
+        state = session.node.state.state
+        if state == 1:
+            lines.append('you win')
+        elif state == -1:
+            lines.append('the computer wins')
+        elif state == 0:
+            lines.append('draw')
+        else:
+            lines.append('your turn')
+        return lines
+    def stats(self) -> dict:
+        '''Summarises the sessions, commands and latency the server has seen.'''
+        uptime = time.time() - self.started
+        latencies = sorted(self.latencies)
+        result = {'uptime_seconds':round(uptime, 3), 'sessions':self.sessions, 'open_sessions':self.open_sessions, 'timeouts':self.timeouts, 'commands':self.commands, 'errors':self.errors, 'commands_per_second':round(self.commands / uptime, 3) if uptime else 0.0, 'computer_moves':self.moves, 'mean_think_ms':round(1000 * self.think_seconds / self.moves, 3) if self.moves else 0.0}
+        if latencies:
+            result['mean_latency_ms'] = round(1000 * sum(latencies) / len(latencies), 3)
+            result['p50_latency_ms'] = round(1000 * latencies[len(latencies) // 2], 3)
+            result['p95_latency_ms'] = round(1000 * latencies[min(len(latencies) - 1, len(latencies) * 95 // 100)], 3)
+            result['max_latency_ms'] = round(1000 * latencies[-1], 3)
+        return result
+
+async def serve_forever(host: str, port: int, path: str, time_ms: int, timeout: float, workers: int):
+    '''Runs a GameServer until interrupted.'''
+    game_server = GameServer(time_ms, timeout, workers)
+    listener = await game_server.start(host, port, path)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        game_server.close()
+    return
+
+async def exchange(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, line: str = None) -> list:
+    '''Sends one line, if given, and reads the reply up to and including its ok or error line, as a client would.'''
+    if line is not None:
+        writer.write((line + '\n').encode())
+        await writer.drain()
+    lines = []
+    while True:
+        reply = (await reader.readline()).decode().rstrip('\n')
+        lines.append(reply)
+        if reply == GameServer.OK or reply.startswith(GameServer.ERROR) or not reply:
+            return lines
+
+async def check_server():
+    '''Plays through the protocol on two connections at once.'''
+    game_server = GameServer(50, 0.3, None, concurrent.futures.ThreadPoolExecutor(1))
+    listener = await game_server.start()
+    port = listener.sockets[0].getsockname()[1]
+    first = await asyncio.open_connection('127.0.0.1', port)
+    second = await asyncio.open_connection('127.0.0.1', port)
+    assert (await exchange(*first))[-1] == GameServer.OK
+    assert (await exchange(*second))[-1] == GameServer.OK
+    assert (await exchange(*first, 'drop 3'))[-1].startswith(GameServer.ERROR)
+    assert (await exchange(*first, 'start'))[-1].startswith(GameServer.ERROR)
+    assert (await exchange(*first, 'start y'))[-2:] == ['your turn', GameServer.OK]
+    reply = await exchange(*second, 'start n')
+    assert reply[-2:] == ['your turn', GameServer.OK] and reply[-3].count(gtree.BoardPos.computer_symbol) == 1
+    reply = await exchange(*first, 'drop 3')
+    assert reply[-1] == GameServer.OK and ''.join(reply).count(gtree.BoardPos.player_symbol) == 1 and ''.join(reply).count(gtree.BoardPos.computer_symbol) == 1
+    assert (await exchange(*first, 'drop 9'))[-1] == GameServer.ERROR + text_ui.Insert.RANGE_ERROR
+    assert (await exchange(*first, 'drop 3 4'))[-1].startswith(GameServer.ERROR)
+    assert (await exchange(*first, 'think'))[-1] == GameServer.ERROR + 'it is your turn'
+    reply = await exchange(*second, 'help')
+    assert 'stats: ' + Stats.DESC in reply and not any(line.startswith(text_ui.Ponder.KEYWORD) for line in reply)
+    reply = await exchange(*second, 'stats')
+    assert 'sessions: 2' in reply and 'computer_moves: 2' in reply
+    assert await exchange(*second, 'close') == [GameServer.OK]
+    assert (await exchange(*first))[-1].startswith(GameServer.ERROR + 'timed out')
+    assert game_server.timeouts == 1 and game_server.open_sessions == 0
+    for reader, writer in (first, second):
+        writer.close()
+    listener.close()
+    await listener.wait_closed()
+    game_server.close()
+    return
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert repr(Stats()) == 'Stats()'
+    assert err.expect('GameServer(None, 0)', ValueError, global_variables={'GameServer':GameServer})
+    asyncio.run(check_server())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve games of connect-4 to many connections at once over a line protocol.')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 4444)
+    parser.add_argument('--unix', metavar = 'PATH', help = 'listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--time-ms', type = int, default = text_ui.Compute.TIME_MS, help = 'longest the computer may think about a move')
+    parser.add_argument('--timeout', type = float, default = 300.0, help = 'seconds a connection may send nothing before it is closed')
+    parser.add_argument('--workers', type = int, help = 'processes searching for computer moves, one per CPU by default')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args.host, args.port, args.unix, args.time_ms, args.timeout, args.workers))
+    except KeyboardInterrupt:
+        pass
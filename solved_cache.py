@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import game_state_tree as gtree
+from extended_debug import error_test as err
+
+class SolvedCache():
+    '''A persistent map from positions to search results, kept in an SQLite file shared by every process that opens it.
+            entries are (depth, score, flag, move) as stored by Searcher, keyed by the board's geometry and its canonical key from the side to move
+            a position and its mirror image share an entry, whose move is stored as seen from the position with the smaller key
+            writes are held in memory and written in one transaction by flush, which a Searcher calls after each search
+            the database is in WAL mode, so many local processes can read while one writes
+            when a flush leaves more than max_entries, the shallowest least recently used entries are evicted'''
+    FLUSH_EVERY = 1024 #number of pending writes that makes put flush on its own
+    EVICT_TO = 0.9 #fraction of max_entries left after evicting, so each eviction makes room for many flushes
+    TIMEOUT = 30.0 #seconds to wait for another process's write to finish
+    def __init__(self, path: str, max_entries: int = 1 << 22, min_depth: int = 8):
+        if not isinstance(path, str):
+            raise TypeError('\'path\' must be a string, not a ' + str(type(path)))
+        if not isinstance(max_entries, int):
+            raise TypeError('\'max_entries\' must be an integer, not a ' + str(type(max_entries)))
+        if not isinstance(min_depth, int):
+            raise TypeError('\'min_depth\' must be an integer, not a ' + str(type(min_depth)))
+        if max_entries < 1:
+            raise ValueError('\'max_entries\' must be greater than 0, not ' + str(max_entries))
+        self.path = path
+        self.max_entries = max_entries
+        self.min_depth = min_depth #shallowest search worth reading or writing, as shallower ones are quicker to redo than to look up
+        self.open()
+        return
+    def open(self):
+        '''Connects to the database, creating it if needed.'''
+        #a Ponderer searches in its own thread, but never at the same time as the thread that made the connection
+        self.connection = sqlite3.connect(self.path, timeout = SolvedCache.TIMEOUT, check_same_thread = False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS positions (key BLOB PRIMARY KEY, depth INTEGER, score INTEGER, flag INTEGER, move INTEGER, used REAL) WITHOUT ROWID')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS positions_eviction ON positions (depth, used)')
+        self.pending = {} #key -> entry not yet written
+        self.touched = set() #keys read since the last flush, whose use time is updated then
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        return
+    def __repr__(self) -> str:
+        return 'SolvedCache(' + repr(self.path) + ',' + repr(self.max_entries) + ',' + repr(self.min_depth) + ')'
+    def __len__(self) -> int:
+        self.flush()
+        return self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+    def __getstate__(self) -> dict:
+        #connections cannot be sent to other processes, so a copy reopens the file instead
+        self.flush()
+        return {'path':self.path, 'max_entries':self.max_entries, 'min_depth':self.min_depth}
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.open()
+        return
+    def close(self):
+        '''Writes anything pending and closes the database.'''
+        self.flush()
+        self.connection.close()
+        return
+    @staticmethod
+    def key(board: gtree.Board, player_turn: bool) -> tuple:
+        '''Makes the key of a position and whether it is its mirror image's, or (None, False) for a board with gaps, which has no unique key.
+                boards with colours and turn both swapped share a key, as they have the same score for the side to move'''
+        if not board.gapless():
+            return (None, False)
+        geometry = board.geometry
+        key, mirrored = board.canonicalKey(player_turn)
+        return (bytes((geometry.width, geometry.height, geometry.length)) + key.to_bytes(geometry.key_bytes, 'little'), mirrored)
+    def get(self, board: gtree.Board, player_turn: bool) -> tuple:
+        '''Finds the (depth, score, flag, move) stored for the side to move on a board, or None.'''
+        key, mirrored = SolvedCache.key(board, player_turn)
+        if key is None:
+            return None
+        entry = self.pending.get(key)
+        if entry is None:
+            row = self.connection.execute('SELECT depth, score, flag, move FROM positions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry = tuple(row)
+            self.touched.add(key)
+        self.hits += 1
+        if mirrored:
+            return entry[:3] + (board.geometry.mirrorMove(entry[3]),)
+        return entry
+    def put(self, board: gtree.Board, player_turn: bool, depth: int, score: int, flag: int, move: int):
+        '''Stores a search result for the side to move on a board, unless a deeper one is already pending.
+                the database keeps whichever of the old and new entries is deeper when they are flushed'''
+        key, mirrored = SolvedCache.key(board, player_turn)
+        if key is None:
+            return
+        if mirrored:
+            move = board.geometry.mirrorMove(move)
+        old = self.pending.get(key)
+        if old is None or old[0] <= depth:
+            self.pending[key] = (depth, score, flag, move)
+        if len(self.pending) >= SolvedCache.FLUSH_EVERY:
+            self.flush()
+        return
+    def flush(self):
+        '''Writes every pending entry in one transaction, evicting old entries if the cache is over max_entries.'''
+        if not self.pending and not self.touched:
+            return
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('INSERT INTO positions (key, depth, score, flag, move, used) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET depth = excluded.depth, score = excluded.score, flag = excluded.flag, move = excluded.move, used = excluded.used WHERE excluded.depth >= positions.depth', [(key,) + entry + (now,) for key, entry in self.pending.items()])
+            self.connection.executemany('UPDATE positions SET used = ? WHERE key = ?', [(now, key) for key in self.touched])
+            self.writes += len(self.pending)
+            if self.pending:
+                count = self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+                if count > self.max_entries:
+                    excess = count - int(self.max_entries * SolvedCache.EVICT_TO)
+                    self.connection.execute('DELETE FROM positions WHERE key IN (SELECT key FROM positions ORDER BY depth, used LIMIT ?)', (excess,))
+                    self.evictions += excess
+        self.pending.clear()
+        self.touched.clear()
+        return
+    def clear(self):
+        '''Removes every entry, from the file as well as memory.'''
+        self.pending.clear()
+        self.touched.clear()
+        with self.connection:
+            self.connection.execute('DELETE FROM positions')
+        return
+    def stats(self) -> dict:
+        '''Summarises how this process has used the cache.'''
+        lookups = self.hits + self.misses
+        return {'entries':len(self), 'max_entries':self.max_entries, 'min_depth':self.min_depth, 'hits':self.hits, 'misses':self.misses, 'hit_rate':self.hits / lookups if lookups else 0.0, 'writes':self.writes, 'evictions':self.evictions}
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    import pickle
+    import solver
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.db')
+        x = SolvedCache(path, 3, 1)
+        assert x.get(gtree.Board(), True) is None
+        x.put(gtree.Board(), True, 5, 0, 0, 3)
+        x.put(gtree.Board(), True, 2, 1, 0, 2)
+        assert x.get(gtree.Board(), True) == (5, 0, 0, 3)
+        x.flush()
+        y = SolvedCache(path, 3, 1)
+        assert y.get(gtree.Board(), True) == (5, 0, 0, 3)
+        assert y.get(gtree.Board.fromMoves('3'), False) is None
+        y.put(gtree.Board(), True, 4, 1, 0, 2)
+        y.flush()
+        assert x.get(gtree.Board(), True) == (5, 0, 0, 3)
+        assert SolvedCache.key(gtree.Board([[1]]), True) == SolvedCache.key(gtree.Board([[-1]]), False)
+        assert SolvedCache.key(gtree.Board([[0, 1]]), True) == (None, False)
+        for moves in ('0', '1', '2', '3'):
+            x.put(gtree.Board.fromMoves(moves), False, int(moves), 0, 0, 0)
+        x.flush()
+        assert len(x) == 2 and x.get(gtree.Board.fromMoves('0'), False) is None and x.get(gtree.Board(), True) is not None and x.evictions == 3
+        assert pickle.loads(pickle.dumps(x)).get(gtree.Board.fromMoves('3'), False) == (3, 0, 0, 0)
+        x.clear()
+        assert len(x) == 0
+        x.put(gtree.Board.fromMoves('0'), False, 9, 3, 0, 1)
+        assert SolvedCache.key(gtree.Board.fromMoves('0'), False)[0] == SolvedCache.key(gtree.Board.fromMoves('6'), False)[0]
+        assert x.get(gtree.Board.fromMoves('6'), False) == (9, 3, 0, 5)
+        node = gtree.DecisionNode(gtree.Board([[-1,-1,-1],[1,1]]), True)
+        first = solver.Searcher(None, None, x).search(node, 6)
+        assert len(x) > 0
+        second = solver.Searcher(None, None, SolvedCache(path, 3, 1)).search(node, 6)
+        assert second == first and second.nodes < first.nodes
+        x.close()
+        y.close()
+    del x, y
+    assert err.expect('SolvedCache("cache.db", 0)', ValueError, global_variables={'SolvedCache':SolvedCache})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Inspect or empty a solved-position cache.')
+    parser.add_argument('path')
+    parser.add_argument('command', choices = ('stats', 'clear'))
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        print('\'' + args.path + '\' does not exist')
+        sys.exit(1)
+    with SolvedCache(args.path) as cache:
+        if args.command == 'clear':
+            cache.clear()
+        print(cache.stats())
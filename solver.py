@@ -0,0 +1,527 @@
+import os
+import time
+import io
+import tempfile
+import threading
+import tracemalloc
+import game_state_tree as gtree
+import transposition
+import opening_book
+import solved_cache
+import evaluation
+import endgame
+from extended_debug import error_test as err
+
+class SearchTimeout(Exception):
+    '''Raised inside a search when its time budget runs out.'''
+    pass
+
+class SearchResult():
+    '''The outcome of a search from one DecisionNode.
+            score is from the point of view of the side to move:
+                positive = win, larger the sooner it comes (1 + empty spaces left after the winning token)
+                0 = draw, or undecided within the depth searched
+                between -1 and 1 exclusive = undecided, as scored by the searcher's evaluator, if it had one
+                negative = loss, smaller the sooner it comes'''
+    def __init__(self, move: int, score: int, depth: int, nodes: int, seconds: float, complete: bool):
+        self.move = move #column index of the best move found
+        self.score = score #score of that move
+        self.depth = depth #deepest fully searched depth
+        self.nodes = nodes #number of positions visited
+        self.seconds = seconds #wall clock time taken
+        self.complete = complete #whether every depth asked for was searched before the time ran out
+        self.stats = None #SearchStats of the searcher that found this, if it had any
+        return
+    def __repr__(self) -> str:
+        return 'SearchResult(' + repr(self.move) + ',' + repr(self.score) + ',' + repr(self.depth) + ',' + repr(self.nodes) + ',' + repr(self.seconds) + ',' + repr(self.complete) + ')'
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SearchResult):
+            raise TypeError('SearchResult instances must only be compared to other SearchResult instances, not ' + str(type(other)))
+        return self.move == other.move and self.score == other.score and self.depth == other.depth
+
+class SearchStats():
+    '''Counters and timings of the searches a Searcher runs while this is attached to it.
+            a Searcher with no SearchStats only tests that its stats are None, so leaving them off costs next to nothing
+            profile runs each search under cProfile and memory traces its allocations with tracemalloc, both of which slow it down
+            progress, if given, is called with these stats about every progress_seconds while a search runs'''
+    def __init__(self, profile: bool = False, memory: bool = False, progress = None, progress_seconds: float = 1.0):
+        if not isinstance(profile, bool):
+            raise TypeError('\'profile\' must be a boolean, not a ' + str(type(profile)))
+        if not isinstance(memory, bool):
+            raise TypeError('\'memory\' must be a boolean, not a ' + str(type(memory)))
+        if progress is not None and not callable(progress):
+            raise TypeError('\'progress\' must be callable or None, not a ' + str(type(progress)))
+        self.profile = profile
+        self.memory = memory
+        self.progress = progress
+        self.progress_seconds = progress_seconds
+        self.reset()
+        return
+    def __repr__(self) -> str:
+        return 'SearchStats(' + repr(self.profile) + ',' + repr(self.memory) + ')'
+    def reset(self):
+        '''Zeroes every counter and timing.'''
+        self.searches = 0
+        self.nodes = 0 #positions negamax was called on
+        self.interior = 0 #positions whose children were tried
+        self.children = 0 #children tried, each with a check for a win
+        self.table_hits = 0 #positions found in the transposition table
+        self.table_cutoffs = 0 #positions answered by the table without trying any children
+        self.cache_hits = 0 #positions found in the SolvedCache
+        self.tablebase_hits = 0 #positions answered by the Tablebase
+        self.cutoffs = 0 #beta cutoffs
+        self.first_cutoffs = 0 #beta cutoffs by the first child tried, a measure of move ordering
+        self.depths = [] #(depth, nodes, seconds) of each depth finished by iterative deepening
+        self.seconds = 0.0
+        self.peak_bytes = 0 #largest memory traced during a search, if tracing memory
+        self.last_progress = 0.0
+        self.profiler = None #cProfile.Profile of the searches, if profiling
+        return
+    def branching(self) -> float:
+        '''Average number of children tried per position that tried any.'''
+        if not self.interior:
+            return 0.0
+        return self.children / self.interior
+    def effective_branching(self) -> float:
+        '''Ratio of the nodes of the last two depths finished, which is how much each extra depth costs.'''
+        if len(self.depths) < 2 or not self.depths[-2][1]:
+            return 0.0
+        return self.depths[-1][1] / self.depths[-2][1]
+    def to_dict(self) -> dict:
+        '''Summarises the counters, ready to be written as JSON.'''
+        return {'searches':self.searches, 'nodes':self.nodes, 'children':self.children, 'branching':round(self.branching(), 3), 'effective_branching':round(self.effective_branching(), 3), 'table_hits':self.table_hits, 'table_cutoffs':self.table_cutoffs, 'cache_hits':self.cache_hits, 'tablebase_hits':self.tablebase_hits, 'cutoffs':self.cutoffs, 'first_cutoff_rate':round(self.first_cutoffs / self.cutoffs, 3) if self.cutoffs else 0.0, 'nodes_per_second':round(self.nodes / self.seconds) if self.seconds else 0, 'seconds':round(self.seconds, 6), 'depths':[{'depth':depth, 'nodes':nodes, 'seconds':round(seconds, 6)} for depth, nodes, seconds in self.depths], 'peak_bytes':self.peak_bytes}
+    def report(self, count: int = 20) -> str:
+        '''Lists the count functions the searches spent the most time in, if profiling.'''
+        if self.profiler is None:
+            return ''
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream = output).sort_stats('cumulative').print_stats(count)
+        return output.getvalue()
+    def begin(self):
+        '''Starts the hooks for one search.'''
+        self.searches += 1
+        self.depths = []
+        self.last_progress = time.perf_counter()
+        if self.memory:
+            self.tracing = tracemalloc.is_tracing() #whether something else was already tracing, which must be left running
+            if not self.tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if self.profile:
+            if self.profiler is None:
+                import cProfile #imported here as it is slow to import and only needed when profiling
+                self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return
+    def end(self, seconds: float):
+        '''Stops the hooks of one search.'''
+        if self.profile:
+            self.profiler.disable()
+        if self.memory:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+            if not self.tracing:
+                tracemalloc.stop()
+        self.seconds += seconds
+        return
+    def tick(self):
+        '''Calls progress if progress_seconds have passed since it was last called.'''
+        now = time.perf_counter()
+        if now - self.last_progress >= self.progress_seconds:
+            self.last_progress = now
+            self.progress(self)
+        return
+
+class Searcher():
+    '''Negamax search with alpha-beta pruning, center-first move ordering, a transposition table and iterative deepening.
+            a position and its mirror image share one entry in the table
+            a SolvedCache, if given, is read for positions the table misses and written with every result at least its min_depth deep
+            a SearchStats, if given, counts what each search does; it is also kept on each SearchResult
+            a ThreatEvaluator, if given, scores the undecided positions at the depth limit instead of calling them 0,
+                so a shallow search still prefers good positions; only decided scores are written to the cache then
+            a Tablebase, if given, answers any position it holds, at the root or deeper, without searching it'''
+    EXACT = 0 #stored score is exact
+    LOWER = 1 #stored score is a lower bound (the search failed high)
+    UPPER = 2 #stored score is an upper bound (the search failed low)
+    CHECK_EVERY = 256 #number of nodes between checks of the clock
+    ORDER = gtree.Geometry.standard.order #column indexes of the standard board, center first; each board's own are in its geometry
+    def __init__(self, table: transposition.TranspositionTable = None, book: opening_book.OpeningBook = None, cache: solved_cache.SolvedCache = None, stats: SearchStats = None, evaluator: evaluation.ThreatEvaluator = None, tablebase: endgame.Tablebase = None):
+        if not isinstance(table, (transposition.TranspositionTable, type(None))):
+            raise TypeError('\'table\' must be a TranspositionTable or None, not a ' + str(type(table)))
+        if not isinstance(book, (opening_book.OpeningBook, type(None))):
+            raise TypeError('\'book\' must be an OpeningBook or None, not a ' + str(type(book)))
+        if not isinstance(cache, (solved_cache.SolvedCache, type(None))):
+            raise TypeError('\'cache\' must be a SolvedCache or None, not a ' + str(type(cache)))
+        if not isinstance(stats, (SearchStats, type(None))):
+            raise TypeError('\'stats\' must be a SearchStats or None, not a ' + str(type(stats)))
+        if not isinstance(evaluator, (evaluation.ThreatEvaluator, type(None))):
+            raise TypeError('\'evaluator\' must be a ThreatEvaluator or None, not a ' + str(type(evaluator)))
+        if not isinstance(tablebase, (endgame.Tablebase, type(None))):
+            raise TypeError('\'tablebase\' must be a Tablebase or None, not a ' + str(type(tablebase)))
+        if table is None:
+            table = transposition.TranspositionTable()
+        self.table = table
+        self.book = book #opening book checked before searching
+        self.cache = cache #persistent results shared with other processes
+        self.stats = stats
+        self.evaluator = evaluator
+        self.tablebase = tablebase #exact results of endgame positions
+        self.nodes = 0
+        self.deadline = None
+        self.root_first = None #column searched first at the root, from the book
+        self.stopping = False #set by stop, from any thread, to end the search running now as if its time had run out
+        return
+    def __repr__(self) -> str:
+        return 'Searcher(' + repr(self.table) + ',' + repr(self.book) + ',' + repr(self.cache) + ')'
+    def search(self, node: gtree.DecisionNode, max_depth: int = None, time_ms: int = None) -> SearchResult:
+        '''Searches deeper and deeper from a node until max_depth is reached, the result is decided, or time_ms runs out.
+                max_depth defaults to the number of empty spaces, which solves the position
+                the best move of the deepest finished depth is returned, or the best so far at depth 1 if even that did not finish'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if not isinstance(max_depth, (int, type(None))):
+            raise TypeError('\'max_depth\' must be an integer or None, not a ' + str(type(max_depth)))
+        if not isinstance(time_ms, (int, float, type(None))):
+            raise TypeError('\'time_ms\' must be a number or None, not a ' + str(type(time_ms)))
+        if node.state.state != -2:
+            raise ValueError('cannot search a node where the game has ended')
+        state = node.state
+        if state.empty is None:
+            state = gtree.VictoryState(node.board)
+        if max_depth is None or max_depth > state.empty:
+            max_depth = state.empty
+        if max_depth < 1:
+            raise ValueError('\'max_depth\' must be greater than 0, not ' + str(max_depth))
+        start = time.perf_counter()
+        self.root_first = None
+        if self.book is not None:
+            found = self.book.lookup(node)
+            if found is not None:
+                #a book searched less deeply than asked only answers for certain with a decided score; otherwise its move is searched first
+                if self.book.depth >= max_depth or found[1] >= 1 or found[1] <= -1:
+                    return SearchResult(found[0], found[1], min(self.book.depth, max_depth), 0, time.perf_counter() - start, True)
+                self.root_first = found[0]
+        if self.tablebase is not None:
+            found = self.tablebase.probe(node.board, node.player_turn, state.empty)
+            if found is not None:
+                return SearchResult(found[0], found[1], state.empty, 0, time.perf_counter() - start, True)
+        if time_ms is None:
+            self.deadline = None
+        else:
+            self.deadline = start + time_ms / 1000
+        self.nodes = 0
+        self.root_move = None
+        self.root_score = None
+        result = None
+        depth = 1
+        stats = self.stats
+        if stats is not None:
+            stats.begin()
+        if self.cache is not None:
+            entry = self.cache.get(node.board, node.player_turn)
+            if entry is not None and entry[2] == Searcher.EXACT and (entry[0] >= max_depth or Searcher.decided(entry[1], state.empty, entry[0])):
+                result = SearchResult(entry[3], entry[1], entry[0], 0, time.perf_counter() - start, True)
+                depth = max_depth + 1
+        try:
+            while depth <= max_depth:
+                depth_start = time.perf_counter()
+                depth_nodes = self.nodes
+                if self.evaluator is not None:
+                    #a search that timed out leaves the evaluator part way through its moves
+                    self.evaluator.reset(node.board)
+                try:
+                    score = self.negamax(node.board.copy(), node.player_turn, state.empty, depth, -node.board.geometry.size - 1, node.board.geometry.size + 1, True)
+                except SearchTimeout:
+                    break
+                if stats is not None:
+                    stats.depths.append((depth, self.nodes - depth_nodes, time.perf_counter() - depth_start))
+                result = SearchResult(self.root_move, score, depth, self.nodes, time.perf_counter() - start, depth == max_depth)
+                if Searcher.decided(score, state.empty, depth):
+                    result.complete = True
+                    break
+                depth += 1
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+            if stats is not None:
+                stats.end(time.perf_counter() - start)
+                stats.nodes += self.nodes
+        if result is None:
+            if self.root_move is None:
+                self.root_move = self.moves(node.board, self.root_first)[0]
+                self.root_score = 0
+            result = SearchResult(self.root_move, self.root_score, 0, self.nodes, time.perf_counter() - start, False)
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        result.stats = stats
+        return result
+    def stop(self):
+        '''Makes a search running in another thread return its best result so far within CHECK_EVERY nodes.
+                every later search stops at once too, until stopping is set back to False'''
+        self.stopping = True
+        return
+    @staticmethod
+    def decided(score: int, empty: int, depth: int) -> bool:
+        '''Says whether a score found searching depth tokens from a position with empty spaces left is its final one.
+                a win or loss beyond the depth searched can only come from a deeper entry in a table kept from other searches,
+                and a quicker win may still hide behind the undecided scores at the depth limit, so the search must go on'''
+        return (score >= 1 or score <= -1) and abs(score) > empty - depth
+    @staticmethod
+    def moves(board: gtree.Board, first: int = None) -> list:
+        '''Lists the playable columns of a board, center first, with one chosen column moved to the front.'''
+        result = []
+        if first is not None:
+            result.append(first)
+        height = board.geometry.height
+        for col_i in board.geometry.order:
+            if col_i != first and board.heights[col_i] < height:
+                result.append(col_i)
+        return result
+    def negamax(self, board: gtree.Board, player_turn: bool, empty: int, depth: int, alpha: int, beta: int, root: bool = False) -> int:
+        '''Scores a board with empty spaces left for the side to move, searching depth more tokens.
+                each move is made and unmade on the board itself, so it is back as it was on return
+                the board is left part way through a search when SearchTimeout is raised, so pass a copy'''
+        self.nodes += 1
+        if self.nodes % Searcher.CHECK_EVERY == 0 and (self.stopping or self.deadline is not None and time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None and stats.progress is not None and self.nodes % Searcher.CHECK_EVERY == 0:
+            stats.tick()
+        tablebase = self.tablebase
+        if tablebase is not None and not root and empty <= tablebase.max_empty:
+            found = tablebase.probe(board, player_turn, empty)
+            if found is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                return found[1]
+        alpha_original = alpha
+        geometry = board.geometry
+        #a position and its mirror image share an entry, stored with its move as seen from the one with the smaller hash
+        key = board.zobrist
+        mirrored = board.mirror_zobrist < key
+        if mirrored:
+            key = board.mirror_zobrist
+        if player_turn:
+            key ^= geometry.zobrist_turn
+        entry = self.table.get(key)
+        if entry is not None and mirrored:
+            entry = entry[:3] + (geometry.mirrorMove(entry[3]),)
+        if entry is None and self.cache is not None and depth >= self.cache.min_depth:
+            entry = self.cache.get(board, player_turn)
+            if entry is not None:
+                self.table.put(key, entry[:3] + (geometry.mirrorMove(entry[3]),) if mirrored else entry, entry[0])
+                if stats is not None:
+                    stats.cache_hits += 1
+        first = None
+        if root:
+            first = self.root_first
+        if entry is not None:
+            if stats is not None:
+                stats.table_hits += 1
+            entry_depth, entry_score, entry_flag, first = entry
+            if not root and entry_depth >= depth:
+                if entry_flag == Searcher.EXACT:
+                    if stats is not None:
+                        stats.table_cutoffs += 1
+                    return entry_score
+                elif entry_flag == Searcher.LOWER and entry_score > alpha:
+                    alpha = entry_score
+                elif entry_flag == Searcher.UPPER and entry_score < beta:
+                    beta = entry_score
+                if alpha >= beta:
+                    if stats is not None:
+                        stats.table_cutoffs += 1
+                    return entry_score
+        best_score = None
+        best_move = None
+        moves = self.moves(board, first)
+        if stats is not None:
+            stats.interior += 1
+        evaluator = self.evaluator
+        for col_i in moves:
+            if stats is not None:
+                stats.children += 1
+            bit_i = col_i * geometry.stride + board.heights[col_i]
+            gtree.Board._play(board, col_i, player_turn)
+            if geometry.connects(board.player_mask if player_turn else board.computer_mask, bit_i):
+                #a win with empty - 1 spaces left scores one more than that
+                score = empty
+            elif empty == 1:
+                score = 0
+            elif evaluator is None:
+                if depth > 1:
+                    score = -self.negamax(board, not player_turn, empty - 1, depth - 1, -beta, -alpha)
+                else:
+                    score = 0
+            else:
+                evaluator.play(bit_i, player_turn)
+                if depth > 1:
+                    score = -self.negamax(board, not player_turn, empty - 1, depth - 1, -beta, -alpha)
+                else:
+                    score = -evaluator.evaluate(not player_turn)
+                evaluator.unplay(bit_i, player_turn)
+            gtree.Board._unplay(board, col_i)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_move = col_i
+                if root:
+                    self.root_move = col_i
+                    self.root_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if stats is not None:
+                    stats.cutoffs += 1
+                    if col_i == moves[0]:
+                        stats.first_cutoffs += 1
+                break
+        if best_score <= alpha_original:
+            flag = Searcher.UPPER
+        elif best_score >= beta:
+            flag = Searcher.LOWER
+        else:
+            flag = Searcher.EXACT
+        self.table.put(key, (depth, best_score, flag, geometry.mirrorMove(best_move) if mirrored else best_move), depth)
+        if self.cache is not None and depth >= self.cache.min_depth and (evaluator is None or best_score >= 1 or best_score <= -1):
+            self.cache.put(board, player_turn, depth, best_score, flag, best_move)
+        return best_score
+
+class Ponderer():
+    '''Searches the position the human is thinking about in a background thread, so the computer's next search starts from a warm table.
+            searching the human's position orders their likely replies first, and alpha-beta spends most of its nodes on those,
+            storing results for the positions the computer will face in the table the computer's own search then reads
+            the thread only runs while the main one waits, such as on input(), and is stopped before the computer searches
+            the table is shared as a whole; entries for replies the human did not play age out under its replacement policy'''
+    def __init__(self, searcher: Searcher = None):
+        if not isinstance(searcher, (Searcher, type(None))):
+            raise TypeError('\'searcher\' must be a Searcher or None, not a ' + str(type(searcher)))
+        if searcher is None:
+            searcher = Searcher()
+        self.searcher = searcher #used for both the pondering and the computer's moves, so they share its table
+        self.node = None #DecisionNode being pondered, or last pondered
+        self.thread = None
+        self.result = None #SearchResult of the last pondering, once stopped
+        self.pondered_nodes = 0 #nodes searched in the background over every pondering
+        self.pondered_seconds = 0.0
+        return
+    def __repr__(self) -> str:
+        return 'Ponderer(' + repr(self.searcher) + ')'
+    def start(self, node: gtree.DecisionNode, max_depth: int = None):
+        '''Starts pondering a node where the human is to move, stopping any earlier pondering first.
+                the search goes on until it reaches max_depth, solves the node, or is stopped'''
+        if not isinstance(node, gtree.DecisionNode):
+            raise TypeError('\'node\' must be a DecisionNode, not a ' + str(type(node)))
+        if node.state.state != -2:
+            raise ValueError('cannot ponder a node where the game has ended')
+        self.stop()
+        self.node = node
+        self.thread = threading.Thread(target = self.ponder, args = (node, max_depth), daemon = True)
+        self.thread.start()
+        return
+    def ponder(self, node: gtree.DecisionNode, max_depth: int):
+        '''Runs in the background thread.'''
+        result = self.searcher.search(node, max_depth)
+        self.pondered_nodes += result.nodes
+        self.pondered_seconds += result.seconds
+        self.result = result
+        return
+    def pondering(self) -> bool:
+        '''Whether the background search is still running.'''
+        return self.thread is not None and self.thread.is_alive()
+    def wait(self, timeout: float = None) -> bool:
+        '''Waits for the background search to finish by itself, for up to timeout seconds, returning whether it has.'''
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return not self.pondering()
+    def stop(self) -> SearchResult:
+        '''Stops the background search, if any, and returns the result of the last pondering.'''
+        if self.thread is not None:
+            self.searcher.stop()
+            self.thread.join()
+            self.thread = None
+            self.searcher.stopping = False
+        return self.result
+    def reply(self, node: gtree.DecisionNode, max_depth: int = None, time_ms: int = None) -> SearchResult:
+        '''Stops pondering and searches for the computer's move at a node, one of the pondered node's children.
+                the pondered node keeps only the child that was played, so the human's other replies can be freed'''
+        self.stop()
+        if self.node is not None:
+            self.node.children = {col_i:child for col_i, child in self.node.children.items() if child is node}
+            self.node = None
+        return self.searcher.search(node, max_depth, time_ms)
+
+def best_move(node: gtree.DecisionNode, max_depth: int = None, time_ms: int = None, table: transposition.TranspositionTable = None, book: opening_book.OpeningBook = None, cache: solved_cache.SolvedCache = None, evaluator: evaluation.ThreatEvaluator = None, tablebase: endgame.Tablebase = None) -> int:
+    '''Finds the best column for the side to move at a node, within max_depth tokens and time_ms milliseconds.
+            the book, if given, is checked before searching, and the cache before and during it
+            the evaluator, if given, scores the positions at the depth limit, and the tablebase answers the endgame positions it holds'''
+    return Searcher(table, book, cache, None, evaluator, tablebase).search(node, max_depth, time_ms).move
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    x = Searcher()
+    assert Searcher.ORDER == (3, 2, 4, 1, 5, 0, 6)
+    assert x.search(gtree.DecisionNode(gtree.Board([[1,1,1]]), True)).move == 0
+    assert x.search(gtree.DecisionNode(gtree.Board([[1,1,1]]), True)).score == gtree.Board.width * gtree.BoardColumn.height - 4 + 1
+    assert x.search(gtree.DecisionNode(gtree.Board([[1,1,1],[-1,-1,-1]]), False)).move == 1
+    assert x.search(gtree.DecisionNode(gtree.Board([[-1,-1,-1],[1,1]]), True), 4).move == 0
+    assert x.search(gtree.DecisionNode(gtree.Board([[],[1],[1],[1]]), False), 3).score < 0
+    assert x.search(gtree.DecisionNode(gtree.Board()), 4).complete
+    assert not x.search(gtree.DecisionNode(gtree.Board()), None, 0).complete
+    del x
+    assert err.expect('Searcher().search(gtree.DecisionNode(gtree.Board([[1] * 4])))', ValueError, global_variables={'Searcher':Searcher,'gtree':gtree})
+    assert best_move(gtree.DecisionNode(gtree.Board([[],[1,1,1]]), True), 2) == 1
+    x = SearchStats()
+    y = Searcher(None, None, None, x).search(gtree.RootNode().traverse(True), 6)
+    assert y.stats is x and x.nodes == y.nodes and [item[0] for item in x.depths] == [1, 2, 3, 4, 5, 6] and sum(item[1] for item in x.depths) == y.nodes
+    assert x.children > x.interior > 0 and 1 < x.branching() <= gtree.Board.width and x.cutoffs >= x.first_cutoffs > 0 and x.table_hits > 0
+    assert Searcher().search(gtree.RootNode().traverse(True), 6).nodes == y.nodes
+    y = []
+    x = SearchStats(True, True, y.append, 0.0)
+    Searcher(None, None, None, x).search(gtree.RootNode().traverse(True), 6)
+    assert y and y[0] is x and x.peak_bytes > 0 and 'negamax' in x.report()
+    assert not tracemalloc.is_tracing()
+    del x, y
+    assert best_move(gtree.DecisionNode(gtree.Board([[],[],[1,1]], gtree.Geometry.get(5, 4, 3)), True)) == 2
+    assert Searcher().search(gtree.DecisionNode(gtree.Board([], gtree.Geometry.get(3, 3, 3)), True)).complete
+    x = Searcher(None, None, None, None, evaluation.ThreatEvaluator())
+    y = x.search(gtree.DecisionNode(gtree.Board([[1],[1],[],[],[],[],[-1,-1]]), True), 2)
+    assert 0 < y.score < 1 and y.complete and x.search(gtree.DecisionNode(gtree.Board([[-1],[-1],[],[],[],[],[1,1]]), False), 2) == y
+    assert Searcher().search(gtree.DecisionNode(gtree.Board([[1],[1],[],[],[],[],[-1,-1]]), True), 2).score == 0
+    del x, y
+    assert best_move(gtree.DecisionNode(gtree.Board([[1,1,1]]), True), 3, None, None, None, None, evaluation.ThreatEvaluator()) == 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'endgame.tb')
+        y = gtree.DecisionNode(gtree.Board.fromMoves('14666020363353610306345042'), True)
+        endgame.build(path, 14, y)
+        with endgame.Tablebase(path) as z:
+            x = SearchStats()
+            first = Searcher(None, None, None, x, None, z).search(y)
+            second = Searcher().search(y)
+            assert (first.move, first.score) == (second.move, second.score) and first.nodes < second.nodes and x.tablebase_hits > 0
+            assert Searcher(None, None, None, None, None, z).search(y.traverse(2).traverse(2)).nodes == 0
+    del x, y, z, first, second
+    #a Searcher kept across positions holds table entries deeper than its next search, which must not change its scores
+    import random
+    x = Searcher()
+    z = random.Random(3)
+    for game_i in range(3):
+        y = gtree.DecisionNode(gtree.Board([], gtree.Geometry.get(4, 4, 3)), True)
+        while y.state.state == -2:
+            assert x.search(y).score == Searcher().search(y).score
+            y = y.traverse(z.choice([col_i for col_i in range(y.board.geometry.width) if y.board.heights[col_i] < y.board.geometry.height]))
+    assert Searcher.decided(3, 10, 8) and not Searcher.decided(2, 10, 8) and not Searcher.decided(0, 0, 0) and Searcher.decided(-3, 10, 8)
+    del x, y, z
+    x = Ponderer()
+    y = gtree.RootNode().traverse(True).traverse(3).traverse(3)
+    x.start(y, 7)
+    assert x.wait(60) and x.result.depth == 7 and x.pondered_nodes == x.result.nodes
+    z = y.traverse(2)
+    assert x.reply(z, 6).nodes < Searcher().search(z, 6).nodes and list(y.children) == [2]
+    x.start(gtree.RootNode().traverse(True))
+    assert x.pondering()
+    assert not x.stop().complete and not x.pondering() and not x.searcher.stopping
+    del x, y, z
+    assert err.expect('Ponderer().start(gtree.DecisionNode(gtree.Board([[1] * 4])))', ValueError, global_variables={'Ponderer':Ponderer,'gtree':gtree})
+
+if __name__ == '__main__':
+    selfcheck()
@@ -1,4 +1,9 @@
+import os
 import game_state_tree as gtree
+import solver
+import evaluation
+import opening_book
+import endgame
 import extended_debug.error_test as err
 
 class Command():
@@ -33,19 +38,12 @@ class Command():
         return type(self) == type(other) and self.keyword == other.keyword and self.desc == other.desc and self.min_args == other.min_args and self.max_args == other.max_args
     def run(self, *args, **kw_args):
         raise NotImplementedError('Subclasses should override this function')
+    @classmethod
+    def fromArgs(cls, args: list):
+        '''Makes a command of this class from its words after the keyword, already checked against MIN_ARGS and MAX_ARGS.
+                subclasses taking arguments should override this function'''
+        return cls()
     
-assert Command('fg', 'description', 0, 0) == Command('fg', 'description', 0, 0)
-assert err.expect('Command(1, "description", 0, 0)', TypeError, global_variables={'Command':Command})
-assert err.expect('Command("fg", 1, 0, 0,)', TypeError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", "0", 0)', TypeError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", 0, "0")', TypeError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", -1, 0)', ValueError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", 0, -1)', ValueError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", 2, 1)', ValueError, global_variables={'Command':Command})
-assert repr(Command('fg', 'description', 1, 1)) == 'Command(\'fg\',\'description\',1,1)'
-assert str(Command('fg', 'description', 0, 1)) == 'fg' + Command.SEP + 'description'
-assert err.expect('Command("fg", "description", 0, 0) == "fg"', TypeError, global_variables={'Command':Command})
-assert err.expect('Command("fg", "description", 0, 0).run()', NotImplementedError, global_variables={'Command':Command})
 
 class Close(Command):
     KEYWORD = 'close'
@@ -60,10 +58,6 @@ class Close(Command):
     def run(self):
         raise SystemExit
 
-assert repr(Close()) == 'Close()'
-assert err.expect('Close().run()', SystemExit, global_variables={'Close':Close, 'Command':Command})
-assert str(Close()) == Close.KEYWORD + Command.SEP + Close.DESC
-
 class Help(Command):
     KEYWORD = 'help'
     DESC = 'display this help message'
@@ -75,14 +69,18 @@ class Help(Command):
     def __repr__(self) -> str:
         return 'Help()'
     def run(self):
-        class_list = Command.__subclasses__()
-        output = ''
-        for instance in class_list:
-            output += str(instance) + '\n'
+        output = Help.text()
         print(output)
         return output
-assert repr(Help()) == 'Help()'
-assert str(Help()) == Help.KEYWORD + Command.SEP + Help.DESC
+    @staticmethod
+    def text(known: dict = None) -> str:
+        '''Lists the keyword and description of every kind of command, or only of those in known, which maps keywords to command classes as for parse.'''
+        if known is None:
+            known = commands()
+        output = ''
+        for command_class in known.values():
+            output += command_class.KEYWORD + Command.SEP + command_class.DESC + '\n'
+        return output
 
 class Start(Command):
     KEYWORD = 'start'
@@ -93,7 +91,7 @@ class Start(Command):
     NO = 'n'
     PROMPT_PREFIX = 'Would you like to go first ('
     PROMPT_JOIN = '/'
-    PROMT_SUFFIX = ')?'
+    PROMPT_SUFFIX = ')?'
     RECOG_ERROR = 'Response not cognised! Try again.'
     def __init__(self, player_first: bool = None):
         if not isinstance(player_first, (bool, type(None))):
@@ -105,6 +103,15 @@ class Start(Command):
         return 'Start(' + str(self.player_first) + ')'
     def __eq__(self, other) -> bool:
         return Command.__eq__(self, other) and self.player_first == other.player_first
+    @classmethod
+    def fromArgs(cls, args: list):
+        if not args:
+            return cls()
+        if args[0] == Start.YES:
+            return cls(True)
+        elif args[0] == Start.NO:
+            return cls(False)
+        raise ValueError(Start.RECOG_ERROR)
     def run(self) -> gtree.DecisionNode:
         if self.player_first == None:
             while True:
@@ -117,20 +124,16 @@ class Start(Command):
                     break
                 else:
                     print(Start.RECOG_ERROR)
+        if Compute.ponderer is not None:
+            Compute.ponderer.stop()
         return gtree.RootNode().traverse(self.player_first)
-assert repr(Start()) == 'Start(None)'
-assert repr(Start(True)) == 'Start(True)'
-assert repr(Start(False)) == 'Start(False)'
-assert Start() == Start()
-assert Start(True).run() == gtree.RootNode().traverse(True)
-assert Start(False).run() == gtree.RootNode().traverse(False)
 
 class Insert(Command):
     KEYWORD = 'drop'
     DESC = 'drop one of your tokens into the board'
     MIN_ARGS = 0
     MAX_ARGS = 1
-    PROMPT = 'Which column would you like to drop your token into (0 left-most, ' + str(gtree.Board.wdith) + ' right-most)?'
+    PROMPT = 'Which column would you like to drop your token into (0 left-most, ' + str(gtree.Board.width - 1) + ' right-most)?'
     RECOG_ERROR = 'Response not recognised as whole number! Try again.'
     RANGE_ERROR = 'You drop the token on the floor; there\'s no column there!'
     def __init__(self, col_i: int = None):
@@ -143,6 +146,14 @@ class Insert(Command):
         return 'Insert(' + str(self.col_i) + ')'
     def __eq__(self, other) -> bool:
         return Command.__eq__(self, other) and self.col_i == other.col_i
+    @classmethod
+    def fromArgs(cls, args: list):
+        if not args:
+            return cls()
+        try:
+            return cls(int(args[0]))
+        except ValueError:
+            raise ValueError(Insert.RECOG_ERROR)
     def run(self, state: gtree.DecisionNode) -> gtree.DecisionNode:
         if not isinstance(state, gtree.DecisionNode):
             raise TypeError('\'state\' must be a DecisionNode, not a ' + str(type(state)))
@@ -157,7 +168,211 @@ class Insert(Command):
                 except ValueError:
                     print(Insert.RECOG_ERROR)
         try:
-            self.state = self.state.traverse(self.col_i)
+            state = state.traverse(self.col_i)
         except IndexError:
             print(Insert.RANGE_ERROR)
-        return self.state
+        return state
+
+class Compute(Command):
+    KEYWORD = 'think'
+    DESC = 'let the computer drop one of its tokens, thinking for up to the given number of milliseconds'
+    MIN_ARGS = 0
+    MAX_ARGS = 1
+    TIME_MS = 1000 #default thinking time in milliseconds
+    RECOG_ERROR = 'Thinking time not recognised as whole number of milliseconds!'
+    BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin') #opening book used if the file exists
+    book = None #opening book shared by every Compute once opened
+    TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'endgame.tb') #endgame tablebase used if the file exists
+    tablebase = None #endgame tablebase shared by every Compute once opened
+    ponderer = None #Ponderer thinking during the human's turn, or None if pondering is off
+    def __init__(self, time_ms: int = None):
+        if not isinstance(time_ms, (int, type(None))):
+            raise TypeError('\'time_ms\' must be an integer or None, not a ' + str(type(time_ms)))
+        Command.__init__(self, Compute.KEYWORD, Compute.DESC, Compute.MIN_ARGS, Compute.MAX_ARGS)
+        if time_ms is None:
+            time_ms = Compute.TIME_MS
+        self.time_ms = time_ms
+        return
+    def __repr__(self) -> str:
+        return 'Compute(' + str(self.time_ms) + ')'
+    def __eq__(self, other) -> bool:
+        return Command.__eq__(self, other) and self.time_ms == other.time_ms
+    @classmethod
+    def fromArgs(cls, args: list):
+        if not args:
+            return cls()
+        try:
+            return cls(int(args[0]))
+        except ValueError:
+            raise ValueError(Compute.RECOG_ERROR)
+    def run(self, state: gtree.DecisionNode) -> gtree.DecisionNode:
+        if not isinstance(state, gtree.DecisionNode):
+            raise TypeError('\'state\' must be a DecisionNode, not a ' + str(type(state)))
+        if state.player_turn:
+            raise ValueError('\'state.player_turn\' must be False, not ' + str(state.player_turn))
+        if Compute.book is None and os.path.exists(Compute.BOOK_PATH):
+            Compute.book = opening_book.OpeningBook(Compute.BOOK_PATH)
+        if Compute.tablebase is None and os.path.exists(Compute.TABLEBASE_PATH):
+            Compute.tablebase = endgame.Tablebase(Compute.TABLEBASE_PATH)
+        if Compute.ponderer is None:
+            return state.traverse(solver.best_move(state, None, self.time_ms, None, Compute.book, None, evaluation.ThreatEvaluator(), Compute.tablebase))
+        Compute.ponderer.searcher.book = Compute.book
+        Compute.ponderer.searcher.tablebase = Compute.tablebase
+        state = state.traverse(Compute.ponderer.reply(state, None, self.time_ms).move)
+        if state.state.state == -2:
+            Compute.ponderer.start(state)
+        return state
+
+class Ponder(Command):
+    KEYWORD = 'ponder'
+    DESC = 'turn on or off the computer thinking during your turn, which makes it stronger for the same thinking time'
+    MIN_ARGS = 1
+    MAX_ARGS = 1
+    ON = 'on'
+    OFF = 'off'
+    RECOG_ERROR = 'Say ' + KEYWORD + ' ' + ON + ' or ' + KEYWORD + ' ' + OFF + '.'
+    def __init__(self, on: bool):
+        if not isinstance(on, bool):
+            raise TypeError('\'on\' must be a boolean, not a ' + str(type(on)))
+        Command.__init__(self, Ponder.KEYWORD, Ponder.DESC, Ponder.MIN_ARGS, Ponder.MAX_ARGS)
+        self.on = on
+        return
+    def __repr__(self) -> str:
+        return 'Ponder(' + str(self.on) + ')'
+    def __eq__(self, other) -> bool:
+        return Command.__eq__(self, other) and self.on == other.on
+    @classmethod
+    def fromArgs(cls, args: list):
+        if args[0] == Ponder.ON:
+            return cls(True)
+        elif args[0] == Ponder.OFF:
+            return cls(False)
+        raise ValueError(Ponder.RECOG_ERROR)
+    def run(self):
+        '''Turns pondering on or off; it starts after the computer's next move.'''
+        if self.on:
+            if Compute.ponderer is None:
+                Compute.ponderer = solver.Ponderer(solver.Searcher(None, None, None, None, evaluation.ThreatEvaluator()))
+        elif Compute.ponderer is not None:
+            Compute.ponderer.stop()
+            Compute.ponderer = None
+        return
+
+UNKNOWN_ERROR = 'Command not recognised! Try one of:' #start of the message parse gives for an unknown keyword, followed by the known ones
+
+def commands() -> dict:
+    '''Maps the keyword of every kind of command to its class, including any defined outside this module.'''
+    return {command_class.KEYWORD:command_class for command_class in Command.__subclasses__()}
+
+def parse(line: str, known: dict = None) -> Command:
+    '''Makes the command a line of text asks for: its keyword followed by its arguments, separated by spaces.
+            known maps keywords to command classes, defaulting to every subclass of Command
+            raises ValueError for an unknown keyword, the wrong number of arguments, or arguments that are not recognised'''
+    if not isinstance(line, str):
+        raise TypeError('\'line\' must be a string, not a ' + str(type(line)))
+    if known is None:
+        known = commands()
+    words = line.split()
+    if not words:
+        raise ValueError(UNKNOWN_ERROR + ''.join(sorted(' ' + keyword for keyword in known)))
+    command_class = known.get(words[0].lower())
+    if command_class is None:
+        raise ValueError(UNKNOWN_ERROR + ''.join(sorted(' ' + keyword for keyword in known)))
+    args = words[1:]
+    if len(args) < command_class.MIN_ARGS or len(args) > command_class.MAX_ARGS:
+        raise ValueError('\'' + command_class.KEYWORD + '\' takes from ' + str(command_class.MIN_ARGS) + ' to ' + str(command_class.MAX_ARGS) + ' arguments, not ' + str(len(args)))
+    return command_class.fromArgs(args)
+
+def check(node: gtree.DecisionNode, command: Command):
+    '''Checks that a Start, Insert or Compute command can be run on a game without prompting or printing, raising ValueError saying why not.
+            node is the game so far, or None before any start'''
+    if not isinstance(node, (gtree.DecisionNode, type(None))):
+        raise TypeError('\'node\' must be a DecisionNode or None, not a ' + str(type(node)))
+    if isinstance(command, Start):
+        if command.player_first is None:
+            raise ValueError('say who goes first: ' + Start.KEYWORD + ' ' + Start.YES + ' or ' + Start.KEYWORD + ' ' + Start.NO)
+        return
+    if not isinstance(command, (Insert, Compute)):
+        raise ValueError('\'' + command.keyword + '\' is not a move in a game')
+    if node is None:
+        raise ValueError('no game yet, use ' + Start.KEYWORD + ' first')
+    if node.state.state != -2:
+        raise ValueError('the game is over, use ' + Start.KEYWORD + ' to play again')
+    if isinstance(command, Compute):
+        if node.player_turn:
+            raise ValueError('it is your turn')
+        return
+    if command.col_i is None:
+        raise ValueError('say which column: ' + Insert.KEYWORD + ' 0 to ' + Insert.KEYWORD + ' ' + str(node.board.geometry.width - 1))
+    if not node.player_turn:
+        raise ValueError('it is not your turn')
+    if command.col_i < 0 or command.col_i >= node.board.geometry.width:
+        raise ValueError(Insert.RANGE_ERROR)
+    if node.board.heights[command.col_i] >= node.board.geometry.height:
+        raise ValueError('that column is full')
+    return
+
+def apply(node: gtree.DecisionNode, command: Command) -> gtree.DecisionNode:
+    '''Runs a Start, Insert or Compute command on a game, after check, returning the game after it.'''
+    check(node, command)
+    if isinstance(command, Start):
+        return command.run()
+    return command.run(node)
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert Command('fg', 'description', 0, 0) == Command('fg', 'description', 0, 0)
+    assert err.expect('Command(1, "description", 0, 0)', TypeError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", 1, 0, 0,)', TypeError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", "0", 0)', TypeError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", 0, "0")', TypeError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", -1, 0)', ValueError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", 0, -1)', ValueError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", 2, 1)', ValueError, global_variables={'Command':Command})
+    assert repr(Command('fg', 'description', 1, 1)) == 'Command(\'fg\',\'description\',1,1)'
+    assert str(Command('fg', 'description', 0, 1)) == 'fg' + Command.SEP + 'description'
+    assert err.expect('Command("fg", "description", 0, 0) == "fg"', TypeError, global_variables={'Command':Command})
+    assert err.expect('Command("fg", "description", 0, 0).run()', NotImplementedError, global_variables={'Command':Command})
+    assert repr(Close()) == 'Close()'
+    assert err.expect('Close().run()', SystemExit, global_variables={'Close':Close, 'Command':Command})
+    assert str(Close()) == Close.KEYWORD + Command.SEP + Close.DESC
+    assert repr(Help()) == 'Help()'
+    assert str(Help()) == Help.KEYWORD + Command.SEP + Help.DESC
+    assert repr(Start()) == 'Start(None)'
+    assert repr(Start(True)) == 'Start(True)'
+    assert repr(Start(False)) == 'Start(False)'
+    assert Start() == Start()
+    assert Start(True).run() == gtree.RootNode().traverse(True)
+    assert Start(False).run() == gtree.RootNode().traverse(False)
+    assert repr(Insert(3)) == 'Insert(3)'
+    assert Insert(3).run(gtree.RootNode().traverse(True)) == gtree.RootNode().traverse(True).traverse(3)
+    assert repr(Compute()) == 'Compute(' + str(Compute.TIME_MS) + ')'
+    assert Compute(50) == Compute(50)
+    assert Compute(50).run(gtree.DecisionNode(gtree.Board([[-1,-1,-1]]))).state == gtree.VictoryState(-1)
+    assert err.expect('Compute().run(gtree.RootNode().traverse(True))', ValueError, global_variables={'Compute':Compute,'gtree':gtree})
+    assert parse('ponder on') == Ponder(True) and err.expect('parse("ponder")', ValueError, global_variables={'parse':parse})
+    Ponder(True).run()
+    x = Compute(50).run(gtree.RootNode().traverse(False))
+    assert x.player_turn and Compute.ponderer.pondering()
+    x = Compute(50).run(Insert(3).run(x))
+    assert Compute.ponderer.pondered_nodes > 0
+    Ponder(False).run()
+    assert Compute.ponderer is None
+    del x
+    assert Help.text().startswith(Close.KEYWORD + Command.SEP + Close.DESC + '\n')
+    assert Help.text({Help.KEYWORD:Help}) == str(Help()) + '\n'
+    assert parse('drop 3') == Insert(3) and parse('START y') == Start(True) and parse('think') == Compute() and parse(' close ') == Close()
+    assert err.expect('parse("drop 3 4")', ValueError, global_variables={'parse':parse})
+    assert err.expect('parse("drop x")', ValueError, global_variables={'parse':parse})
+    assert err.expect('parse("start maybe")', ValueError, global_variables={'parse':parse})
+    assert err.expect('parse("jump")', ValueError, global_variables={'parse':parse})
+    assert err.expect('parse("")', ValueError, global_variables={'parse':parse})
+    assert apply(apply(None, Start(True)), Insert(3)) == gtree.RootNode().traverse(True).traverse(3)
+    assert err.expect('apply(None, Start())', ValueError, global_variables={'apply':apply,'Start':Start})
+    assert err.expect('apply(None, Insert(3))', ValueError, global_variables={'apply':apply,'Insert':Insert})
+    assert err.expect('apply(gtree.RootNode().traverse(True), Insert(-1))', ValueError, global_variables={'apply':apply,'Insert':Insert,'gtree':gtree})
+    assert err.expect('apply(gtree.DecisionNode(gtree.Board([[1,-1] * 3]), True), Insert(0))', ValueError, global_variables={'apply':apply,'Insert':Insert,'gtree':gtree})
+    assert err.expect('apply(gtree.RootNode().traverse(True), Compute())', ValueError, global_variables={'apply':apply,'Compute':Compute,'gtree':gtree})
+
+if __name__ == '__main__':
+    selfcheck()
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from extended_debug import error_test as err
+
+class TranspositionTable():
+    '''A bounded map from position hashes to stored values, each stored with a depth.
+            'depth' policy: when full, the shallowest of the PROBES least recently used entries is replaced,
+                unless the new entry is shallower than all of them, in which case it is not stored
+            'lru' policy: when full, the least recently used entry is replaced'''
+    POLICIES = ('depth', 'lru') #names of the replacement policies
+    PROBES = 4 #number of least recently used entries the depth policy chooses between
+    ENTRY_BYTES = 160 #rough size of one entry's key, depth and bookkeeping, not counting the stored value
+    def __init__(self, max_entries: int = 1 << 20, policy: str = 'depth', max_bytes: int = None):
+        if not isinstance(max_entries, int):
+            raise TypeError('\'max_entries\' must be an integer, not a ' + str(type(max_entries)))
+        if not isinstance(policy, str):
+            raise TypeError('\'policy\' must be a string, not a ' + str(type(policy)))
+        if not isinstance(max_bytes, (int, type(None))):
+            raise TypeError('\'max_bytes\' must be an integer or None, not a ' + str(type(max_bytes)))
+        if policy not in TranspositionTable.POLICIES:
+            raise ValueError('\'policy\' must be one of ' + repr(TranspositionTable.POLICIES) + ', not ' + repr(policy))
+        if max_bytes is not None:
+            max_entries = min(max_entries, max_bytes // TranspositionTable.ENTRY_BYTES)
+        if max_entries < 1:
+            raise ValueError('the table must have room for at least 1 entry, not ' + str(max_entries))
+        self.max_entries = max_entries
+        self.policy = policy
+        self.entries = OrderedDict() #key -> (depth, value), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        return
+    def __repr__(self) -> str:
+        return 'TranspositionTable(' + repr(self.max_entries) + ',' + repr(self.policy) + ')'
+    def __len__(self) -> int:
+        return len(self.entries)
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+    def get(self, key: int, default = None):
+        '''Finds the value stored for a key, counting the hit or miss.'''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+    def depth(self, key: int) -> int:
+        '''Finds the depth stored with a key, or -1 if it is not stored.'''
+        entry = self.entries.get(key)
+        if entry is None:
+            return -1
+        return entry[0]
+    def put(self, key: int, value, depth: int = 0) -> bool:
+        '''Stores a value for a key, replacing an older entry if the table is full.
+                returns whether the value was stored'''
+        if not isinstance(depth, int):
+            raise TypeError('\'depth\' must be an integer, not a ' + str(type(depth)))
+        if key in self.entries:
+            self.entries[key] = (depth, value)
+            self.entries.move_to_end(key)
+            self.stores += 1
+            return True
+        if len(self.entries) >= self.max_entries:
+            if self.policy == 'lru':
+                self.entries.popitem(last = False)
+            else:
+                victim = None
+                victim_depth = None
+                i = 0
+                for old_key, old_entry in self.entries.items():
+                    if i >= TranspositionTable.PROBES:
+                        break
+                    if victim is None or old_entry[0] < victim_depth:
+                        victim = old_key
+                        victim_depth = old_entry[0]
+                    i += 1
+                if victim_depth > depth:
+                    return False
+                del self.entries[victim]
+            self.evictions += 1
+        self.entries[key] = (depth, value)
+        self.stores += 1
+        return True
+    def clear(self):
+        '''Removes every entry and resets the counters.'''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        return
+    def stats(self) -> dict:
+        '''Summarises how the table has been used.'''
+        lookups = self.hits + self.misses
+        return {'entries':len(self.entries), 'max_entries':self.max_entries, 'policy':self.policy, 'hits':self.hits, 'misses':self.misses, 'hit_rate':self.hits / lookups if lookups else 0.0, 'stores':self.stores, 'evictions':self.evictions}
+
+def selfcheck():
+    '''Runs the self-test assertions of this module; they are skipped when Python runs with -O.'''
+    assert err.expect('TranspositionTable(policy="fifo")', ValueError, global_variables={'TranspositionTable':TranspositionTable})
+    assert err.expect('TranspositionTable(0)', ValueError, global_variables={'TranspositionTable':TranspositionTable})
+    assert TranspositionTable(max_bytes = TranspositionTable.ENTRY_BYTES * 3).max_entries == 3
+    x = TranspositionTable(2, 'lru')
+    x.put(1, 'a')
+    x.put(2, 'b')
+    assert x.get(1) == 'a'
+    x.put(3, 'c')
+    assert 2 not in x and 1 in x and 3 in x
+    assert x.get(2) is None
+    assert (x.hits, x.misses, x.evictions) == (1, 1, 1)
+    x = TranspositionTable(2, 'depth')
+    x.put(1, 'a', 5)
+    x.put(2, 'b', 1)
+    assert x.put(3, 'c', 2)
+    assert 2 not in x and 1 in x and 3 in x
+    assert not x.put(4, 'd', 0)
+    assert 4 not in x and x.depth(1) == 5
+    del x
+
+if __name__ == '__main__':
+    selfcheck()